@@ -3,7 +3,7 @@ import os
 from logging.config import fileConfig
 from dotenv import load_dotenv
 
-from sqlalchemy import pool
+from sqlalchemy import pool, text
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from dotenv import load_dotenv
@@ -32,6 +32,8 @@ from userapp.core.models.tables import (
 )
 from userapp.core.models.views import JoinedProjectView, UserSubmitNodesView  # Import views if needed
 
+from userapp.migrations import include_object
+
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -40,17 +42,6 @@ target_metadata = Base.metadata
 # ... etc.
 
 
-def include_object(object, name, type_, reflected, compare_to):
-    """
-    Custom: Should you include this table in autogenerate?
-    """
-    # Exclude views from autogenerate
-    if type_ == "table" and hasattr(object, 'info'):
-        if object.info.get('is_view'):
-            return False
-    return True
-
-
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -76,7 +67,12 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object, compare_type=True)
+    # Objects needing an extension the database doesn't have are skipped by the migrations, and by autogenerate
+    installed_extensions = set(connection.execute(text("SELECT extname FROM pg_extension")).scalars())
+    # Ends the transaction the query began, the migrations' autocommit blocks need begin_transaction's own
+    connection.commit()
+
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object(installed_extensions), compare_type=True)
 
     with context.begin_transaction():
         context.run_migrations()
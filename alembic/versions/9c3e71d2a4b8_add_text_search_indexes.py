@@ -0,0 +1,113 @@
+"""Add text search indexes
+
+Revision ID: 9c3e71d2a4b8
+Revises: f2ec55925c4c
+Create Date: 2026-10-17 10:12:41.208315
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e71d2a4b8'
+down_revision: Union[str, Sequence[str], None] = 'f2ec55925c4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Commonly searched text columns, see userapp.core.models.tables.search_indexes
+SEARCH_COLUMNS = {
+    'users': ['name', 'netid', 'username', 'email1'],
+    'projects': ['name', 'accounting_group'],
+    'groups': ['name'],
+}
+
+
+def has_pg_trgm() -> bool:
+    return op.get_bind().execute(
+        sa.text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+    ).scalar()
+
+
+def drop_invalid_index(index_name: str, table_name: str) -> None:
+    """Drops the index if a concurrent build of it failed, leaving it INVALID, so that it is built again"""
+
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"),
+        {"index_name": index_name},
+    ).scalar()
+
+    if invalid:
+        logger.warning(f"Dropping {index_name}, left invalid by an interrupted build")
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+
+
+def create_search_index(index_name: str, table_name: str, columns: list, **kwargs) -> None:
+    drop_invalid_index(index_name, table_name)
+    op.create_index(index_name, table_name, columns, unique=False, postgresql_concurrently=True, if_not_exists=True, **kwargs)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # Substring matches (like/ilike) can only use a trigram index. pg_trgm ships with Postgres contrib, where it
+    # is missing the migration carries on without those indexes and the filters keep working as sequential scans.
+    # The models mark those indexes with requires_extension so autogenerate skips them too.
+    trigram = has_pg_trgm()
+    if not trigram:
+        logger.warning("pg_trgm is not available, skipping the trigram indexes")
+
+    # Built concurrently so writes to users and the other tables carry on while they are, which can't be done
+    # in a transaction. A build that fails part way leaves an INVALID index behind, which if_not_exists would
+    # skip, so those are dropped and built again when the migration is rerun.
+    with op.get_context().autocommit_block():
+        if trigram:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+        for table_name, column_names in SEARCH_COLUMNS.items():
+            for column_name in column_names:
+                if trigram:
+                    create_search_index(
+                        f'ix_{table_name}_{column_name}_trgm', table_name, [column_name],
+                        postgresql_using='gin', postgresql_ops={column_name: 'gin_trgm_ops'},
+                    )
+
+                # Case-sensitive prefix matches (startswith)
+                create_search_index(
+                    f'ix_{table_name}_{column_name}_pattern', table_name, [column_name],
+                    postgresql_ops={column_name: 'text_pattern_ops'},
+                )
+
+                # Case-insensitive prefix matches (istartswith)
+                create_search_index(
+                    f'ix_{table_name}_{column_name}_lower_pattern', table_name,
+                    [sa.func.lower(sa.column(column_name)).label(f'{column_name}_lower')],
+                    postgresql_ops={f'{column_name}_lower': 'text_pattern_ops'},
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    with op.get_context().autocommit_block():
+        for table_name, column_names in SEARCH_COLUMNS.items():
+            for column_name in column_names:
+                op.drop_index(
+                    f'ix_{table_name}_{column_name}_lower_pattern', table_name=table_name,
+                    postgresql_concurrently=True, if_exists=True,
+                )
+                op.drop_index(
+                    f'ix_{table_name}_{column_name}_pattern', table_name=table_name,
+                    postgresql_concurrently=True, if_exists=True,
+                )
+                op.drop_index(
+                    f'ix_{table_name}_{column_name}_trgm', table_name=table_name,
+                    postgresql_concurrently=True, if_exists=True,
+                )
+
+    # The extension is left installed, other database objects may have come to rely on it
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long importing the app takes, and which modules the time goes to.
+
+Imports the module in a fresh interpreter under `python -X importtime`, which reports each module's own import
+time and that of everything it imported, and prints the total and the modules costing the most. Interpreter
+startup isn't counted. Exits with 1 when the fastest import exceeds IMPORT_TIME_BUDGET seconds, so it can
+gate a CI job run on a quiet machine. userapp/api/tests/test_startup.py checks the budget too, but only when
+IMPORT_TIME_BUDGET is set, as wall-clock limits make the regular suite flaky on loaded machines.
+
+Usage:
+  python -m benchmarks.import_time
+  python -m benchmarks.import_time --runs 5 --top 30
+  IMPORT_TIME_BUDGET=1.5 python -m benchmarks.import_time
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# userapp.main reads its settings on import
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Seconds importing userapp.main may take
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "2.5"))
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$", re.MULTILINE)
+
+
+def import_times(module: str = "userapp.main") -> dict[str, tuple[float, float]]:
+    """Seconds each module took to import, on its own and with its imports, in a fresh interpreter"""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1]}")
+
+    return {
+        name: (int(self_us) / 1_000_000, int(cumulative_us) / 1_000_000)
+        for self_us, cumulative_us, name in _IMPORT_TIME.findall(result.stderr)
+    }
+
+
+def import_time(module: str = "userapp.main", runs: int = 3) -> float:
+    """The fastest of runs imports of module, in seconds"""
+
+    return min(import_times(module)[module][1] for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="userapp.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    fastest = min(runs, key=lambda times: times[args.module][1])
+    total = fastest[args.module][1]
+
+    print(f"import {args.module}: {total * 1000:.0f} ms (fastest of {args.runs}, budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)")
+
+    print("\nSlowest modules, own time / with their imports")
+    slowest = sorted(fastest.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (own, cumulative) in slowest:
+        print(f"  {own * 1000:8.1f} ms {cumulative * 1000:8.1f} ms  {name}")
+
+    if total > IMPORT_TIME_BUDGET:
+        sys.exit(f"\nimport {args.module} is over the {IMPORT_TIME_BUDGET}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark: FastAPI's response model path against userapp.api.serialization.
+
+Builds a page of users shaped like /users?page_size=500 (each with projects, groups, notes and a submit
+node, as loaded by user_load_profile) in memory, so no database is needed, and times turning it into
+JSON bytes both ways.
+
+Usage:
+  python -m benchmarks.serialization
+  python -m benchmarks.serialization --users 500 --repeat 20
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+
+from userapp.api.serialization import serialize_rows
+from userapp.core.models.enum import EntityManagerEnum, RoleEnum
+from userapp.core.models.tables import User, Note
+from userapp.core.models.views import JoinedProjectView, UserGroupView, UserSubmitNodesView
+from userapp.core.schemas.users import UserGetFull
+
+
+def build_users(count: int) -> list[User]:
+    now = datetime(2025, 1, 1)
+
+    users = []
+    for i in range(count):
+        user = User(
+            id=i, name=f"User {i}", username=f"user{i}", netid=f"user{i}", email1=f"user{i}@wisc.edu",
+            email2=f"user{i}@cs.wisc.edu", phone1="608-555-0100", is_admin=False, active=True, date=now,
+            unix_uid=20000 + i, created_at=now, updated_at=now,
+        )
+        staff = User(id=count + i, name=f"Staff {i}", netid=f"staff{i}", email1=f"staff{i}@wisc.edu", active=True)
+
+        user.projects = [
+            JoinedProjectView(
+                id=i, project_id=p, project_name=f"Project {p}", project_status="ACTIVE",
+                project_accounting_group=f"Project{p}", managed_by=EntityManagerEnum.APPLICATION, role=RoleEnum.MEMBER,
+                is_primary=p == 0, created_at=now, updated_at=now, name=user.name, netid=user.netid,
+                email1=user.email1, email2=user.email2, active=True,
+                staff1_user=staff, staff2_user=None,
+            )
+            for p in range(3)
+        ]
+        user.groups = [
+            UserGroupView(
+                group_id=g, user_id=i, managed_by=EntityManagerEnum.APPLICATION, created_at=now, updated_at=now,
+                name=f"group{g}", unix_gid=30000 + g, has_groupdir=True, point_of_contact_user=staff,
+            )
+            for g in range(3)
+        ]
+        user.notes = [
+            Note(id=i * 2 + n, note=f"Note {n}", ticket="123456", date=now, author=staff)
+            for n in range(2)
+        ]
+        user.submit_nodes = [
+            UserSubmitNodesView(user_id=i, submit_node_id=1, submit_node_name="ap2001", disk_quota=100)
+        ]
+        user.user_forms = []
+
+        users.append(user)
+
+    return users
+
+
+def time_ms(function, repeat: int) -> float:
+    function()  # Warm up
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    users = build_users(args.users)
+
+    # The same response field FastAPI builds for a route returning list[UserGetFull]
+    response_field = APIRoute("/users", endpoint=lambda: None, response_model=list[UserGetFull]).response_field
+
+    def response_model_path() -> bytes:
+        value, errors = response_field.validate(users, {}, loc=("response",))
+        assert not errors, errors
+        return response_field.serialize_json(value, by_alias=True)
+
+    def serialize_rows_path() -> bytes:
+        return serialize_rows(list[UserGetFull], users)
+
+    assert response_model_path() == serialize_rows_path(), "Both paths should produce the same JSON"
+
+    response_model_ms = time_ms(response_model_path, args.repeat)
+    serialize_rows_ms = time_ms(serialize_rows_path, args.repeat)
+
+    print(f"{args.users} users, median of {args.repeat} runs")
+    print(f"  response model  {response_model_ms:8.1f} ms")
+    print(f"  serialize_rows  {serialize_rows_ms:8.1f} ms  ({response_model_ms / serialize_rows_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
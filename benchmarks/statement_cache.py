@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Prepared statement cache benchmark: connect_engine's direct mode against its PgBouncer modes.
+
+Runs the queries of /users, /projects and /groups (the page, its count and the selectin loads of their
+relationships) through userapp.api.util.list_endpoint with one connection per mode:
+
+  direct            statements named by asyncpg and kept, 100 per connection
+  pgbouncer         unnamed statements, parsed and planned on every execution
+  pgbouncer cached  uniquely named statements kept by SQLAlchemy, needs PgBouncer 1.21+
+
+Needs the database settings of the app (DB_URL or DB_HOST, DB_USER, ...). The pgbouncer modes connect to
+--pgbouncer-url if given, otherwise straight to the database, which still shows the cost of re-preparing.
+
+Usage:
+  python -m benchmarks.statement_cache
+  python -m benchmarks.statement_cache --page-size 50 --repeat 200 --pgbouncer-url postgresql://...:6432/userapp
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from fastapi import Response
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from userapp.api.load_options import get_user_load_options, parse_user_embeds, project_load_profile, group_load_profile
+from userapp.api.util import list_endpoint
+from userapp.core.models.tables import User, Project, Group
+from userapp.db import connect_engine
+
+load_dotenv()
+
+LIST_ENDPOINTS = {
+    "/users": (User, get_user_load_options(parse_user_embeds(None))),
+    "/projects": (Project, project_load_profile.options),
+    "/groups": (Group, group_load_profile.options),
+}
+
+
+def db_url() -> str:
+    return os.environ.get("DB_URL") or (
+        f"postgresql+asyncpg://{os.environ['DB_USER']}:{os.environ['DB_PASSWORD']}"
+        f"@{os.environ['DB_HOST']}:{os.environ.get('DB_PORT', '5432')}/{os.environ['DB_NAME']}"
+    )
+
+
+async def time_mode(url: str, page_size: int, repeat: int, **engine_kwargs) -> dict[str, float]:
+    """Median milliseconds of each list endpoint, on a single warmed up connection"""
+
+    engine = await connect_engine(url, pool_size=1, max_overflow=0, **engine_kwargs)
+    async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def list_page(model, load_options):
+        async with async_session_maker() as session:
+            async with session.begin():
+                await list_endpoint(session, model, Response(), [], 0, page_size, load_options=load_options)
+
+    timings = {}
+    try:
+        for path, (model, load_options) in LIST_ENDPOINTS.items():
+            await list_page(model, load_options)  # Warm up
+
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await list_page(model, load_options)
+                samples.append((time.perf_counter() - start) * 1000)
+
+            timings[path] = statistics.median(samples)
+    finally:
+        await engine.dispose()
+
+    return timings
+
+
+async def run(args) -> None:
+    direct_url = db_url()
+    pgbouncer_url = args.pgbouncer_url or direct_url
+
+    modes = {
+        "direct": await time_mode(direct_url, args.page_size, args.repeat),
+        "pgbouncer": await time_mode(pgbouncer_url, args.page_size, args.repeat, pgbouncer=True),
+        "pgbouncer cached": await time_mode(pgbouncer_url, args.page_size, args.repeat, pgbouncer=True, statement_cache_size=100),
+    }
+
+    print(f"page_size={args.page_size}, median of {args.repeat} runs (ms)")
+    print(f"  {'':18}" + "".join(f"{path:>12}" for path in LIST_ENDPOINTS))
+    for mode, timings in modes.items():
+        print(f"  {mode:18}" + "".join(f"{timings[path]:12.2f}" for path in LIST_ENDPOINTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--pgbouncer-url", default=None)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
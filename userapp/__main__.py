@@ -0,0 +1,45 @@
+"""
+Commands of the app, run from the repository root:
+
+  python -m userapp migrate    Upgrade the database to the latest migration
+  python -m userapp serve      Serve the app, see userapp/server.py for its SERVER_ settings
+"""
+
+import argparse
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+
+def migrate(args) -> None:
+    from userapp.migrations import get_db_url, migrate
+
+    asyncio.run(migrate(get_db_url()))
+
+
+def serve(args) -> None:
+    from userapp.server import serve
+
+    serve()
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    parser = argparse.ArgumentParser(prog="python -m userapp", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Upgrade the database to the latest migration, waiting for any other process migrating it")
+    migrate_parser.set_defaults(handler=migrate)
+
+    serve_parser = commands.add_parser("serve", help="Serve the app with SERVER_WORKERS worker processes")
+    serve_parser.set_defaults(handler=serve)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#
+# Read-through response cache
+#
+# List and get one endpoints can keep their loaded results in a process-wide LRU, keyed by the route,
+# its normalised query parameters and the caller's role. Every entry records the tables it was read
+# from (views are resolved to their base_tables) and is dropped as soon as an ORM session of this process
+# commits a write to one of them. Writes made any other way (other workers or services, migrations, raw SQL)
+# are only seen once the entry expires, so the cache is off unless RESPONSE_CACHE_TTL is set, and should be
+# left off when more than one process serves the app.
+#
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Hashable, Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import DeclarativeBase, Session
+from starlette.requests import Request
+
+from userapp.api.relationship_filters import get_relationship_filters
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "0"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+# Key of the tables a session has written, kept in session.info until the session commits or rolls back
+_WRITTEN_TABLES = "response_cache_written_tables"
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    tables: frozenset[str]
+    expires_at: float
+
+
+class ResponseCache:
+    """Bounded LRU of loaded responses, an entry expires after ttl seconds or when one of its tables is written"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, _CacheEntry] = OrderedDict()
+
+        # Bumped on every invalidation, a response loaded across a write is not stored as it may already be stale
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: Hashable, tables: frozenset[str], value: Any, generation: int, ttl: float | None = None) -> None:
+        """Stores the value unless a write was committed since generation was read
+
+        ttl can shorten how long this entry is kept, it is never kept longer than the cache's ttl.
+        """
+
+        if not self.enabled or generation != self.generation:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        self._entries[key] = _CacheEntry(value=value, tables=tables, expires_at=time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        """Drops every entry read from one of the tables"""
+
+        tables = set(tables)
+        self.generation += 1
+
+        for key in [key for key, entry in self._entries.items() if entry.tables & tables]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def response_cache_key(request: Request, role: str) -> tuple:
+    """Key of the request's response, the same for any ordering of its query parameters"""
+
+    return (
+        request.method,
+        request.scope["route"].path,
+        tuple(sorted((name, str(value)) for name, value in request.path_params.items())),
+        tuple(sorted(request.query_params.multi_items())),
+        role,
+    )
+
+
+def _base_tables(table) -> set[str]:
+    return set(table.info.get("base_tables", [table.name]))
+
+
+@lru_cache()
+def cache_tables(model: type[DeclarativeBase]) -> frozenset[str]:
+    """The tables a response of the model is read from, its own, those of its relationships and of its relationship filters"""
+
+    mapper = inspect(model)
+
+    tables = _base_tables(mapper.local_table)
+    for relationship in mapper.relationships:
+        tables |= _base_tables(relationship.mapper.local_table)
+        if relationship.secondary is not None:
+            tables |= _base_tables(relationship.secondary)
+
+    for relationship_filter in get_relationship_filters(model).values():
+        tables |= _base_tables(relationship_filter.remote_key.table)
+
+    return frozenset(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    written_tables = session.info.setdefault(_WRITTEN_TABLES, set())
+
+    for instance in [*session.new, *session.dirty, *session.deleted]:
+        mapper = inspect(instance).mapper
+        written_tables.add(mapper.local_table.name)
+
+        # Association rows are written for collection changes
+        written_tables.update(
+            relationship.secondary.name for relationship in mapper.relationships
+            if relationship.secondary is not None and not relationship.viewonly
+        )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        written_tables = orm_execute_state.session.info.setdefault(_WRITTEN_TABLES, set())
+        written_tables.add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_tables(session):
+    written_tables = session.info.pop(_WRITTEN_TABLES, None)
+    if written_tables:
+        response_cache.invalidate(written_tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop(_WRITTEN_TABLES, None)
@@ -0,0 +1,142 @@
+#
+# Per request SQL instrumentation
+#
+# Every statement sent to the database is counted against the request that ran it, found through a context
+# variable set by ServerTimingMiddleware. The response gets a Server-Timing header:
+#
+#   Server-Timing: db;dur=12.4;desc="7 queries", serialize;dur=3.1, total;dur=18.0
+#
+# db is the time spent in statements, serialize the time from the end of the last statement to the response
+# (mostly turning rows into JSON) and total the time until the response started. A request running the same
+# statement more than QUERY_REPEAT_THRESHOLD times, usually a relationship loaded one row at a time, is
+# logged with the statements it repeated.
+#
+
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Times one statement may run in a request before the request is logged as N+1, 0 disables the check
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "10"))
+
+# Length statements are cut to in the N+1 warning
+LOGGED_STATEMENT_LENGTH = 300
+
+
+def _route_path(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", scope["path"])
+
+
+@dataclass
+class RequestMetrics:
+    """Statements run by one request and the time they took"""
+
+    scope: Scope | None = None
+    start: float = field(default_factory=time.perf_counter)
+    statements: Counter = field(default_factory=Counter)
+    db_seconds: float = 0.0
+    last_statement_end: float | None = None
+
+    @property
+    def route(self) -> str | None:
+        return _route_path(self.scope) if self.scope is not None else None
+
+    @property
+    def statement_count(self) -> int:
+        return sum(self.statements.values())
+
+    def server_timing(self) -> str:
+        now = time.perf_counter()
+
+        timings = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.statement_count} queries"']
+        if self.last_statement_end is not None:
+            timings.append(f"serialize;dur={(now - self.last_statement_end) * 1000:.1f}")
+        timings.append(f"total;dur={(now - self.start) * 1000:.1f}")
+
+        return ", ".join(timings)
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """The statements run more than threshold times, most repeated first"""
+
+        return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+
+_request_metrics: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+def get_request_metrics() -> RequestMetrics | None:
+    """The metrics of the request being handled, None outside of a request"""
+
+    return _request_metrics.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    # Also read by the slow query log
+    context.statement_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    metrics = _request_metrics.get()
+    statement_start = getattr(context, "statement_start", None)
+    if metrics is None or statement_start is None:
+        return
+
+    end = time.perf_counter()
+    metrics.db_seconds += end - statement_start
+    metrics.last_statement_end = end
+    metrics.statements[statement] += 1
+
+
+class ServerTimingMiddleware:
+    """Adds the Server-Timing header to every response and logs requests that look like N+1 queries"""
+
+    def __init__(self, app: ASGIApp, repeat_threshold: int = QUERY_REPEAT_THRESHOLD):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(scope=scope)
+        token = _request_metrics.set(metrics)
+
+        async def send_with_server_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", metrics.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _request_metrics.reset(token)
+
+        if self.repeat_threshold:
+            self._log_repeated_statements(scope, metrics)
+
+    def _log_repeated_statements(self, scope: Scope, metrics: RequestMetrics) -> None:
+        repeated_statements = metrics.repeated_statements(self.repeat_threshold)
+        if not repeated_statements:
+            return
+
+        statements = "\n".join(
+            f"  {count}x {' '.join(statement.split())[:LOGGED_STATEMENT_LENGTH]}" for statement, count in repeated_statements
+        )
+        logger.warning(
+            f"{scope['method']} {metrics.route} ran {metrics.statement_count} statements, "
+            f"some more than {self.repeat_threshold} times:\n{statements}"
+        )
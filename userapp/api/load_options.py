@@ -1,13 +1,153 @@
-from sqlalchemy.orm import selectinload
-
-from userapp.core.models.tables import User as UserTable, Note as NoteTable
-from userapp.core.models.views import JoinedProjectView as JoinedProjectViewTable, UserGroupView as UserGroupViewTable
-
-user_load_options = [
-    selectinload(UserTable.notes).joinedload(NoteTable.author),
-    selectinload(UserTable.groups).selectinload(UserGroupViewTable.point_of_contact_user),
-    selectinload(UserTable.projects).selectinload(JoinedProjectViewTable.staff1_user),
-    selectinload(UserTable.projects).selectinload(JoinedProjectViewTable.staff2_user),
-    selectinload(UserTable.user_forms),
-    selectinload(UserTable.submit_nodes)
-]
+#
+# Named loading profiles
+#
+# Relationships are lazy="raise" on the models so nothing is loaded unless a route asks for it.
+# Each route loads its response with one of the profiles below, max_statements is the most
+# statements the profile may take to load a page and is enforced by test_load_options.py.
+#
+
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+from sqlalchemy.orm import selectinload, joinedload, noload
+
+from userapp.core.models.tables import User as UserTable, Note as NoteTable, Group as GroupTable, \
+    Project as ProjectTable, BaseForm as BaseFormTable, UserForm as UserFormTable, Token as TokenTable
+from userapp.core.models.views import JoinedProjectView as JoinedProjectViewTable, UserGroupView as UserGroupViewTable, \
+    UserApplicationView as UserApplicationViewTable
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    name: str
+    options: list = field(default_factory=list)
+    max_statements: int = 1
+
+
+# Loader options for each relationship a client can embed in a user response
+user_embed_load_options = {
+    "notes": [
+        selectinload(UserTable.notes).joinedload(NoteTable.author),
+    ],
+    "groups": [
+        selectinload(UserTable.groups).selectinload(UserGroupViewTable.point_of_contact_user),
+    ],
+    "projects": [
+        selectinload(UserTable.projects).selectinload(JoinedProjectViewTable.staff1_user),
+        selectinload(UserTable.projects).selectinload(JoinedProjectViewTable.staff2_user),
+    ],
+    "user_forms": [
+        selectinload(UserTable.user_forms),
+    ],
+    "submit_nodes": [
+        selectinload(UserTable.submit_nodes),
+    ],
+}
+
+# UserGetFull
+user_load_profile = LoadProfile(
+    name="user",
+    options=[option for options in user_embed_load_options.values() for option in options],
+    max_statements=9,
+)
+
+# GroupGet
+group_load_profile = LoadProfile(
+    name="group",
+    options=[selectinload(GroupTable.point_of_contact_user)],
+    max_statements=2,
+)
+
+# ProjectGet
+project_load_profile = LoadProfile(
+    name="project",
+    options=[selectinload(ProjectTable.staff1_user), selectinload(ProjectTable.staff2_user)],
+    max_statements=3,
+)
+
+# JoinedProjectView, a user's projects or a project's users
+joined_project_load_profile = LoadProfile(
+    name="joined_project",
+    options=[selectinload(JoinedProjectViewTable.staff1_user), selectinload(JoinedProjectViewTable.staff2_user)],
+    max_statements=3,
+)
+
+# UserGroupView
+user_group_load_profile = LoadProfile(
+    name="user_group",
+    options=[selectinload(UserGroupViewTable.point_of_contact_user)],
+    max_statements=2,
+)
+
+# NoteGetFull
+note_load_profile = LoadProfile(
+    name="note",
+    options=[joinedload(NoteTable.author), selectinload(NoteTable.users)],
+    max_statements=2,
+)
+
+# BaseFormGet
+base_form_load_profile = LoadProfile(
+    name="base_form",
+    options=[selectinload(BaseFormTable.created_by_user), selectinload(BaseFormTable.updated_by_user)],
+    max_statements=3,
+)
+
+# UserApplicationViewFull
+user_application_load_profile = LoadProfile(
+    name="user_application",
+    options=[
+        selectinload(UserApplicationViewTable.created_by_user),
+        selectinload(UserApplicationViewTable.updated_by_user),
+        selectinload(UserApplicationViewTable.pi_user),
+    ],
+    max_statements=4,
+)
+
+# A user form with the applicant and their submit nodes, used when the form is submitted or accepted
+user_form_load_profile = LoadProfile(
+    name="user_form",
+    options=[
+        selectinload(UserFormTable.base_form).selectinload(BaseFormTable.created_by_user).selectinload(UserTable.submit_nodes),
+    ],
+    max_statements=4,
+)
+
+# TokenGet, also used to check a token's permissions
+token_load_profile = LoadProfile(
+    name="token",
+    options=[selectinload(TokenTable.permissions)],
+    max_statements=2,
+)
+
+
+def parse_user_embeds(embed: str | None) -> list[str]:
+    """Returns the relationships requested in embed=projects,groups, every relationship if embed was not given"""
+
+    if embed is None:
+        return [*user_embed_load_options.keys()]
+
+    embeds = [name.strip() for name in embed.split(",") if name.strip()]
+
+    unknown_embeds = [name for name in embeds if name not in user_embed_load_options]
+    if unknown_embeds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot embed {unknown_embeds}, valid options are {[*user_embed_load_options.keys()]}"
+        )
+
+    return embeds
+
+
+def get_user_load_options(embeds: list[str]) -> list:
+    """Returns the loader options for the embedded relationships, the rest are not loaded at all"""
+
+    load_options = []
+    for name, options in user_embed_load_options.items():
+        if name in embeds:
+            load_options.extend(options)
+        else:
+            # Left empty rather than raising, UserGetFull reads every relationship before they are excluded
+            load_options.append(noload(getattr(UserTable, name)))
+
+    return load_options
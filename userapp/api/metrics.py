@@ -0,0 +1,332 @@
+#
+# Metrics
+#
+# Counters, gauges and histograms kept in process and rendered in the Prometheus text format by GET /metrics.
+# MetricsMiddleware records every request against the path of the route that served it, so /users/12 and
+# /users/13 are one series.
+#
+# Each worker process keeps its metrics in memory. When `python -m userapp serve` runs more than one it sets
+# METRICS_MULTIPROC_DIR, and the workers share their metrics through a file each in it, see MultiprocessMetrics,
+# so whichever worker answers /metrics reports the totals of all of them.
+#
+
+import asyncio
+import glob
+import json
+import math
+import os
+import time
+from typing import Callable, Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Route label of requests that matched no route, so unknown paths don't each get a series
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+        name = f"{name}{{{label_text}}}"
+
+    if math.isinf(value):
+        return f"{name} {'+Inf' if value > 0 else '-Inf'}"
+
+    return f"{name} {value!r}" if isinstance(value, float) else f"{name} {value}"
+
+
+class Metric:
+    """A named metric with a value per combination of its labels"""
+
+    type = "untyped"
+    # Whether the values of a worker that has stopped still count in the merge of the workers' metrics
+    outlives_process = True
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        for key, value in self.values.items():
+            yield self.name, self._labels(key), value
+
+    def state(self) -> list:
+        """The values in a form json can write, see merge"""
+
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, state: list) -> None:
+        """Adds the values of another worker's state"""
+
+        for key, value in state:
+            key = tuple(key)
+            self.values[key] = self.values.get(key, 0) + value
+
+    def empty(self) -> "Metric":
+        """A metric like this one without any values"""
+
+        return type(self)(self.name, self.documentation, self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [_format_sample(name, labels, value) for name, labels, value in self.samples()]
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """For counters kept elsewhere, such as the pool's checkouts"""
+
+        self.values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+    # The requests and connections of a stopped worker are gone with it
+    outlives_process = False
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        # How the values of the workers are merged, "sum" or "max"
+        self.aggregate = aggregate
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def merge(self, state: list) -> None:
+        if self.aggregate == "sum":
+            super().merge(state)
+            return
+
+        for key, value in state:
+            key = tuple(key)
+            self.values[key] = max(self.values.get(key, value), value)
+
+    def empty(self) -> "Gauge":
+        return Gauge(self.name, self.documentation, self.labelnames, self.aggregate)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label key, the observations in each bucket (not cumulative), their sum and count
+        self.observations: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        bucket_counts, totals = self.observations.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket_counts[i] += 1
+                break
+        else:
+            bucket_counts[-1] += 1
+
+        totals[0] += value
+        totals[1] += 1
+
+    def state(self) -> list:
+        return [[list(key), bucket_counts, totals] for key, (bucket_counts, totals) in self.observations.items()]
+
+    def merge(self, state: list) -> None:
+        for key, bucket_counts, (total, count) in state:
+            own_counts, own_totals = self.observations.setdefault(tuple(key), ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            for i, bucket_count in enumerate(bucket_counts):
+                own_counts[i] += bucket_count
+
+            own_totals[0] += total
+            own_totals[1] += count
+
+    def empty(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        for key, (bucket_counts, (total, count)) in self.observations.items():
+            labels = self._labels(key)
+
+            cumulative = 0
+            for bound, bucket_count in zip([*self.buckets, math.inf], bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                yield f"{self.name}_bucket", {**labels, "le": le}, cumulative
+
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def render(metrics: Iterable[Metric]) -> str:
+    """metrics in the Prometheus text format"""
+
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra_metrics: Iterable[Metric] = ()) -> str:
+        """All the metrics, and extra_metrics collected at scrape time, in the Prometheus text format"""
+
+        return render([*self.metrics, *extra_metrics])
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class MultiprocessMetrics:
+    """Shares the metrics of the workers of `python -m userapp serve` through files in a directory
+
+    Each worker writes its metrics to {directory}/{pid}.json every METRICS_SHARE_INTERVAL seconds, before it
+    answers /metrics and when it stops. collect merges the files: counters and histograms are summed over every
+    worker that has run, so they don't drop when one stops, and gauges over the workers still running.
+    """
+
+    def __init__(self, directory: str, pid: int | None = None):
+        self.directory = directory
+        self.pid = pid or os.getpid()
+
+    def write(self, metrics: Iterable[Metric]) -> None:
+        path = os.path.join(self.directory, f"{self.pid}.json")
+
+        # Written aside and renamed, so that no worker reads half a file
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({metric.name: metric.state() for metric in metrics}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self, metrics: Iterable[Metric]) -> list[Metric]:
+        """metrics merged across the workers, from the files they last wrote"""
+
+        merged = {metric.name: metric.empty() for metric in metrics}
+
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            with open(path) as f:
+                states = json.load(f)
+
+            running = _is_running(int(os.path.basename(path).removesuffix(".json")))
+            for name, state in states.items():
+                metric = merged.get(name)
+                if metric is not None and (running or metric.outlives_process):
+                    metric.merge(state)
+
+        return list(merged.values())
+
+
+async def share_metrics(multiprocess: MultiprocessMetrics, worker_metrics: Callable[[], Iterable[Metric]], interval: float) -> None:
+    """Writes this worker's metrics every interval seconds, until cancelled"""
+
+    while True:
+        multiprocess.write(worker_metrics())
+        await asyncio.sleep(interval)
+
+
+registry = MetricsRegistry()
+
+requests_total = registry.register(Counter(
+    "userapp_http_requests_total", "Requests served", ("method", "route", "status")
+))
+request_duration = registry.register(Histogram(
+    "userapp_http_request_duration_seconds", "Time from receiving a request to sending the last of its response",
+    ("method", "route"),
+))
+response_size = registry.register(Histogram(
+    "userapp_http_response_size_bytes", "Size of response bodies", ("method", "route"), buckets=SIZE_BUCKETS
+))
+requests_in_flight = registry.register(Gauge(
+    "userapp_http_requests_in_flight", "Requests being served", ("method",)
+))
+commit_duration = registry.register(Histogram(
+    "userapp_db_commit_duration_seconds", "Time taken to commit a request's session"
+))
+
+
+def _route_path(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """Records the latency, status and response size of every request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        body_size = 0
+
+        async def send_recording_size(message: Message) -> None:
+            nonlocal status, body_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_recording_size)
+        finally:
+            requests_in_flight.dec(method=method)
+
+            route = _route_path(scope)
+            requests_total.inc(method=method, route=route, status=status)
+            request_duration.observe(time.perf_counter() - start, method=method, route=route)
+            response_size.observe(body_size, method=method, route=route)
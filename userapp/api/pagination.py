@@ -0,0 +1,117 @@
+#
+# Keyset (cursor) pagination helpers
+#
+# A cursor is the sort key of the last row on a page, base64 encoded so clients treat it as opaque.
+# The next page seeks past that key instead of using OFFSET, so page cost does not grow with depth.
+#
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from enum import Enum
+
+from fastapi import HTTPException
+from sqlalchemy import Column, and_, or_, false, inspect, literal
+from sqlalchemy.orm import DeclarativeBase
+
+
+def get_keyset_columns(model: type[DeclarativeBase], order_by_keys: list[tuple[Column, str]]) -> list[tuple[Column, str]]:
+    """Returns the (column, direction) keys to seek on, the requested ordering followed by the primary key as a tiebreaker"""
+
+    keys = [*order_by_keys]
+    ordered_column_names = {column.name for column, _ in keys}
+
+    for column in model.__table__.primary_key.columns:
+        if column.name not in ordered_column_names:
+            keys.append((column, "asc"))
+
+    return keys
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _decode_value(column: Column, value):
+    if value is None:
+        return None
+
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+
+    return python_type(value)
+
+
+def get_keyset_values(model: type[DeclarativeBase], keys: list[tuple[Column, str]], db_item) -> list:
+    """Returns the keyset values of an ORM row"""
+
+    mapper = inspect(model)
+    return [getattr(db_item, mapper.get_property_by_column(column).key) for column, _ in keys]
+
+
+def encode_cursor(keys: list[tuple[Column, str]], values: list) -> str:
+    """Encodes the keyset values of a row into an opaque cursor"""
+
+    payload = json.dumps(
+        {"k": [column.name for column, _ in keys], "v": [_encode_value(value) for value in values]},
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: list[tuple[Column, str]]) -> list:
+    """Decodes a cursor back into keyset values, raising a 400 if it was not issued for these keys"""
+
+    try:
+        padded_cursor = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded_cursor.encode()))
+
+        if payload["k"] != [column.name for column, _ in keys]:
+            raise ValueError("Cursor keys do not match the requested ordering")
+
+        return [_decode_value(column, value) for (column, _), value in zip(keys, payload["v"], strict=True)]
+
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor, cursors are only valid with the ordering they were issued for")
+
+
+def _after(column: Column, direction: str, value):
+    """Rows strictly after value in this column, following Postgres' default NULLS LAST for asc and NULLS FIRST for desc"""
+
+    if value is None:
+        return false() if direction == "asc" else column.is_not(None)
+
+    # Bind as a literal of the column type, SQLAlchemy refuses to compare booleans with < and >
+    value = literal(value, column.type)
+    if direction == "asc":
+        return or_(column > value, column.is_(None))
+
+    return column < value
+
+
+def _equal(column: Column, value):
+    return column.is_(None) if value is None else column == literal(value, column.type)
+
+
+def keyset_where_expression(keys: list[tuple[Column, str]], values: list):
+    """Returns the where expression selecting every row after the keyset values
+
+    Expands to (k1 after v1) OR (k1 = v1 AND k2 after v2) OR ... so that mixed asc/desc orderings are supported
+    """
+
+    expressions = []
+    for i, (column, direction) in enumerate(keys):
+        expressions.append(and_(
+            *[_equal(c, v) for (c, _), v in zip(keys[:i], values[:i])],
+            _after(column, direction, values[i])
+        ))
+
+    return or_(*expressions)
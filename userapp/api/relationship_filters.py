@@ -0,0 +1,50 @@
+#
+# Relationship filters
+#
+# List endpoints can filter on related rows with <relationship>.<column>=<operator>.<value>, for example
+# /users?projects.project_status=eq.ACTIVE&groups.group_id=eq.12. Each relationship is compiled to a
+# correlated EXISTS against the view below, keyed by the indexed (user_id, project_id) and
+# (user_id, group_id) pairs of the association tables. Only the columns listed can be filtered on.
+#
+
+from sqlalchemy.orm import DeclarativeBase
+
+from userapp.core.models.tables import User as UserTable, Project as ProjectTable, Group as GroupTable
+from userapp.core.models.views import JoinedProjectView as JoinedProjectViewTable, \
+    UserGroupView as UserGroupViewTable, GroupUserView as GroupUserViewTable
+from userapp.query_parser import RelationshipFilter
+
+relationship_filters: dict[type[DeclarativeBase], dict[str, RelationshipFilter]] = {
+    UserTable: {
+        "projects": RelationshipFilter(
+            local_key=UserTable.__table__.c.id,
+            remote_key=JoinedProjectViewTable.__table__.c.id,
+            columns=("project_id", "project_name", "project_status", "project_accounting_group", "role", "is_primary"),
+        ),
+        "groups": RelationshipFilter(
+            local_key=UserTable.__table__.c.id,
+            remote_key=UserGroupViewTable.__table__.c.user_id,
+            columns=("group_id", "name"),
+        ),
+    },
+    ProjectTable: {
+        "users": RelationshipFilter(
+            local_key=ProjectTable.__table__.c.id,
+            remote_key=JoinedProjectViewTable.__table__.c.project_id,
+            columns=("id", "netid", "username", "role", "is_primary", "active"),
+        ),
+    },
+    GroupTable: {
+        "users": RelationshipFilter(
+            local_key=GroupTable.__table__.c.id,
+            remote_key=GroupUserViewTable.__table__.c.group_id,
+            columns=("user_id", "netid", "username", "active"),
+        ),
+    },
+}
+
+
+def get_relationship_filters(model: type[DeclarativeBase]) -> dict[str, RelationshipFilter]:
+    """The relationships of the model that its list endpoints can filter on"""
+
+    return relationship_filters.get(model, {})
@@ -1,9 +1,11 @@
 from userapp.api.routes.forms import router as forms_router
 from .groups import router as groups_router
 from .managed import router as managed_router
+from .metrics import router as metrics_router
 from .pi_projects import router as pi_projects_router
 from .projects import router as projects_router
 from .security import router as security_router
+from .status import router as status_router
 from .submit_nodes import router as submit_nodes_router
 from .users import router as users_router
 from .tokens import router as tokens_router
@@ -14,9 +16,11 @@ all_routers = [
     forms_router,
     groups_router,
     managed_router,
+    metrics_router,
     pi_projects_router,
     projects_router,
     security_router,
+    status_router,
     submit_nodes_router,
     users_router,
     tokens_router
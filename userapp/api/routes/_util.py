@@ -1,13 +1,18 @@
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, union
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
 
-from userapp.api.util import create_one_endpoint
-from userapp.core.models.tables import UserSubmit, User, UserProject, UserGroup
+from userapp.api.util import create_one_endpoint, rows_fingerprint
+from userapp.api.serialization import serialize_response
+from userapp.api.load_options import joined_project_load_profile, user_group_load_profile
+from userapp.core.models.tables import UserSubmit, User, UserProject, UserGroup, Note, UserNote, Project, Group, \
+    SubmitNode, BaseForm, UserForm
 from userapp.core.models.views import JoinedProjectView, UserGroupView
 from userapp.core.schemas.user_project import UserProjectPatch
 from userapp.core.schemas.user_group import UserGroupPatch
 from userapp.core.schemas.user_submit import UserSubmitTableSchema, UserSubmitPost
+from userapp.core.schemas.users import UserGet, UserGetFull
 
 
 async def _patch_user_submit_nodes(session: AsyncSession, user: User, new_submit_nodes: list[UserSubmitPost]):
@@ -74,7 +79,7 @@ async def _patch_user_project(
         select(JoinedProjectView).where(
             JoinedProjectView.id == user_id,
             JoinedProjectView.project_id == project_id,
-        )
+        ).options(*joined_project_load_profile.options)
     )
     return view_row
 
@@ -112,6 +117,45 @@ async def _patch_user_group(
         select(UserGroupView).where(
             UserGroupView.user_id == user_id,
             UserGroupView.group_id == group_id,
-        )
+        ).options(*user_group_load_profile.options)
     )
     return view_row
+
+
+def _user_embed_response(db_users: User | list[User], embeds: list[str], response: Response | None = None) -> Response:
+    """Serializes users with only the embedded relationships, using the lean UserGet when nothing is embedded"""
+
+    schema = UserGetFull if embeds else UserGet
+    exclude = set(UserGetFull.model_fields) - set(UserGet.model_fields) - set(embeds)
+
+    if isinstance(db_users, list):
+        return serialize_response(list[schema], db_users, response, exclude={"__all__": exclude})
+
+    return serialize_response(schema, db_users, response, exclude=exclude)
+
+
+def _user_fingerprints(user_id: int) -> list:
+    """Fingerprints of a user's row, each of their relationships and the users nested in them, for the ETag of UserGetFull
+
+    Each relationship is fingerprinted from the tables behind its view, so the views themselves aren't run. The
+    nested users are the staff of the user's projects, the points of contact of their groups, the authors of
+    their notes and the PIs of their forms.
+    """
+
+    nested_user_ids = union(
+        select(Project.staff1).join(UserProject, UserProject.project_id == Project.id).where(UserProject.user_id == user_id),
+        select(Project.staff2).join(UserProject, UserProject.project_id == Project.id).where(UserProject.user_id == user_id),
+        select(Group.point_of_contact).join(UserGroup, UserGroup.group_id == Group.id).where(UserGroup.user_id == user_id),
+        select(Note.author_id).join(UserNote, Note.id == UserNote.note_id).where(UserNote.user_id == user_id),
+        select(UserForm.pi_id).join(BaseForm, BaseForm.id == UserForm.id).where(BaseForm.created_by == user_id),
+    )
+
+    return [
+        rows_fingerprint(select(User).where(User.id == user_id)),
+        rows_fingerprint(select(UserProject, Project).join(Project, UserProject.project_id == Project.id).where(UserProject.user_id == user_id)),
+        rows_fingerprint(select(UserGroup, Group).join(Group, UserGroup.group_id == Group.id).where(UserGroup.user_id == user_id)),
+        rows_fingerprint(select(UserSubmit, SubmitNode).join(SubmitNode, UserSubmit.submit_node_id == SubmitNode.id).where(UserSubmit.user_id == user_id)),
+        rows_fingerprint(select(Note, UserNote).join(UserNote, Note.id == UserNote.note_id).where(UserNote.user_id == user_id)),
+        rows_fingerprint(select(BaseForm, UserForm).join(UserForm, BaseForm.id == UserForm.id).where(BaseForm.created_by == user_id)),
+        rows_fingerprint(select(User).where(User.id.in_(nested_user_ids))),
+    ]
@@ -8,6 +8,7 @@ from userapp.core.models.tables import UserForm as UserFormTable, UserGroup, Use
 from userapp.core.schemas.user_application_form import UserFormPatch
 from userapp.core.schemas.user_project import UserProjectTableSchema
 from userapp.api.routes._util import _patch_user_submit_nodes
+from userapp.api.load_options import user_form_load_profile
 
 CHTC_NO_REPLY_EMAIL = "no-reply@chtc.wisc.edu"
 CHTC_TICKETING_EMAIL = "chtc@cs.wisc.edu"
@@ -56,6 +57,7 @@ async def on_user_form_accept(session: AsyncSession, form_id: int, form: UserFor
     user_form = await session.scalar(
         select(UserFormTable)
         .where(UserFormTable.id == form_id)
+        .options(*user_form_load_profile.options)
     )
     if user_form is None:
         raise HTTPException(status_code=404, detail=f"User form with id {form_id} not found")
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
 from userapp.api.routes.security import check_is_admin
-from userapp.api.util import list_endpoint
+from userapp.api.util import list_endpoint, CountStrategy, export_endpoint, ExportFormat, list_statement_timeout
+from userapp.api.load_options import base_form_load_profile
 from userapp.core.models.tables import BaseForm as BaseFormTable
 from userapp.core.schemas.forms import BaseFormGet
-from userapp.db import session_generator
+from userapp.db import session_generator, get_async_session
 from userapp.query_parser import get_filter_query_params
 
 router = APIRouter(
@@ -18,13 +19,15 @@ router = APIRouter(
     }
 )
 
-@router.get("")
+@router.get("", dependencies=[Depends(list_statement_timeout)])
 async def get_forms(
     response: Response,
     page: int = 0,
     page_size: int = 100,
+    cursor: str | None = None,
+    count: CountStrategy = "exact",
     filter_query_params=Depends(get_filter_query_params),
-    session=Depends(session_generator),
+    session=Depends(session_generator, scope="function"),
     _=Depends(check_is_admin),
 ) -> list[BaseFormGet]:
     if not any(value.startswith("order_by.") for _, value in filter_query_params):
@@ -37,4 +40,27 @@ async def get_forms(
         filter_query_params,
         page,
         page_size,
+        load_options=base_form_load_profile.options,
+        cursor=cursor,
+        count=count,
+    )
+
+
+@router.get("/export")
+async def export_forms(
+    format: ExportFormat = "ndjson",
+    filter_query_params=Depends(get_filter_query_params),
+    async_session_maker=Depends(get_async_session),
+    _=Depends(check_is_admin),
+) -> StreamingResponse:
+    if not any(value.startswith("order_by.") for _, value in filter_query_params):
+        filter_query_params.append(("id", "order_by.desc"))
+
+    return await export_endpoint(
+        async_session_maker,
+        BaseFormTable,
+        BaseFormGet,
+        filter_query_params,
+        format,
+        load_options=base_form_load_profile.options,
     )
@@ -5,7 +5,7 @@ from sqlalchemy.orm import selectinload
 from starlette.responses import Response
 
 from userapp.api.routes.security import check_is_admin, check_is_authenticated, get_user_from_cookie
-from userapp.api.util import create_one_endpoint, list_endpoint, list_select_stmt, update_one_endpoint, get_one_endpoint
+from userapp.api.util import create_one_endpoint, list_endpoint, list_select_stmt, update_one_endpoint, get_one_endpoint, CountStrategy, list_statement_timeout
 from userapp.core.models.enum import FormStatusEnum, FormTypeEnum
 from userapp.core.models.tables import BaseForm as BaseFormTable, Project as ProjectTable, \
     SubmitNode as SubmitNodeTable, User as UserTable, UserForm as UserFormTable, UserProject, UserSubmit
@@ -15,12 +15,11 @@ from userapp.core.schemas.forms import BaseFormTableSchema
 from userapp.core.schemas.user_application_form import UserFormPost, UserFormPatch, UserFormTableSchema
 from userapp.core.schemas.user_project import UserProjectTableSchema
 from userapp.core.schemas.user_submit import UserSubmitTableSchema
-from userapp.core.schemas.users import UserGet
 from userapp.db import session_generator
 from userapp.query_parser import get_filter_query_params
 from userapp.api.routes.forms._util import on_user_form_submit, on_user_form_accept
+from userapp.api.load_options import user_application_load_profile, user_form_load_profile
 
-UserApplicationViewFullSchema.model_rebuild(_types_namespace={'UserGet': UserGet})
 
 router = APIRouter(
     prefix="/user-applications",
@@ -38,13 +37,15 @@ form_triggers = {
     (FormTypeEnum.USER, FormStatusEnum.DENIED, FormStatusEnum.APPROVED): on_user_form_accept,
 }
 
-@router.get("")
+@router.get("", dependencies=[Depends(list_statement_timeout)])
 async def get_user_applications(
         response: Response,
         page: int = 0,
         page_size: int = 100,
+        cursor: str | None = None,
+        count: CountStrategy = "exact",
         filter_query_params=Depends(get_filter_query_params),
-        session=Depends(session_generator),
+        session=Depends(session_generator, scope="function"),
         _=Depends(check_is_admin),
 ) -> list[UserApplicationViewFullSchema]:
 
@@ -57,14 +58,17 @@ async def get_user_applications(
         response=response,
         filter_query_params=filter_query_params,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        load_options=user_application_load_profile.options,
+        cursor=cursor,
+        count=count,
     )
 
 
 @router.post("", status_code=201)
 async def create_user_form(
         form: UserFormPost,
-        session=Depends(session_generator),
+        session=Depends(session_generator, scope="function"),
         user_token=Depends(get_user_from_cookie),
         _=Depends(check_is_authenticated)
 ) -> UserApplicationViewFullSchema:
@@ -132,7 +136,7 @@ async def create_user_form(
         position=form.position,
         content=form_content
     )
-    user_form = await create_one_endpoint(session, UserFormTable, user_form_schema)
+    user_form = await create_one_endpoint(session, UserFormTable, user_form_schema, load_options=user_form_load_profile.options)
 
     # Flush session so we can get all the fields when we send the objects back as a view
     await session.flush()
@@ -142,7 +146,7 @@ async def create_user_form(
     if trigger:
         await trigger(session, created_base_form.id, user_form)
 
-    user_application_form = await get_one_endpoint(session, UserApplicationViewTable, created_base_form.id)
+    user_application_form = await get_one_endpoint(session, UserApplicationViewTable, created_base_form.id, load_options=user_application_load_profile.options)
     return user_application_form
 
 
@@ -150,7 +154,7 @@ async def create_user_form(
 async def update_form_status(
         form_id: int,
         form: UserFormPatch,
-        session=Depends(session_generator),
+        session=Depends(session_generator, scope="function"),
         user_token=Depends(get_user_from_cookie),
         _=Depends(check_is_admin),
 ) -> UserApplicationViewFullSchema:
@@ -183,4 +187,4 @@ async def update_form_status(
     if user_form is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    return await get_one_endpoint(session, UserApplicationViewTable, base_form.id)
+    return await get_one_endpoint(session, UserApplicationViewTable, form_id, load_options=user_application_load_profile.options)
@@ -1,23 +1,25 @@
 # Signed off by Cannon Lock 2025-11-03
 
-from fastapi import APIRouter, Depends, Response, HTTPException
+from fastapi import APIRouter, Depends, Request, Response, HTTPException
+from starlette.responses import StreamingResponse
 from typing import List
 
 from sqlalchemy import select, delete
 
 from userapp.core.models.views import GroupUserView
 from userapp.core.schemas.user_group import UserGroupPost, UserGroupPatch
-from userapp.db import session_generator
+from userapp.db import session_generator, get_async_session
 from userapp.query_parser import get_filter_query_params
-from userapp.api.routes.security import check_is_admin
+from userapp.api.routes.security import check_is_admin, get_response_cache_key
 from userapp.api.routes._util import _patch_user_group
+from userapp.api.load_options import group_load_profile
 from userapp.api.util import list_endpoint, get_one_endpoint, create_one_endpoint, update_one_endpoint, list_select_stmt, \
-    delete_one_endpoint, with_db_error_handling
-from userapp.core.schemas.general import Relationship, GroupUserView as GroupUserViewSchema, UserGroupView as UserGroupViewSchema
-from userapp.core.schemas.groups import GroupGet, GroupPost, GroupPatch
-from userapp.core.schemas.users import UserGet
+    delete_one_endpoint, with_db_error_handling, CountStrategy, export_endpoint, ExportFormat, lookup_endpoint, \
+    facets_endpoint, list_statement_timeout
+from userapp.core.schemas.general import Relationship, GroupUserView as GroupUserViewSchema, UserGroupView as UserGroupViewSchema, LookupGet, \
+    FacetsGet
+from userapp.core.schemas.groups import GroupGet, GroupPost, GroupPatch, GroupLookupPost
 
-GroupGet.model_rebuild(_types_namespace={'UserGet': UserGet})
 from userapp.core.models.tables import User as UserTable, Group as GroupTable, UserGroup
 
 
@@ -32,40 +34,64 @@ router = APIRouter(
     }
 )
 
-@router.get("")
-async def get_groups(response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[GroupGet]:
-    return await list_endpoint(session, GroupTable, response, filter_query_params, page, page_size)
+@router.get("", dependencies=[Depends(list_statement_timeout)])
+async def get_groups(response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> list[GroupGet]:
+    return await list_endpoint(session, GroupTable, response, filter_query_params, page, page_size, load_options=group_load_profile.options, cursor=cursor, count=count, cache_key=cache_key)
+
+
+@router.get("/export")
+async def export_groups(format: ExportFormat = "ndjson", filter_query_params=Depends(get_filter_query_params), async_session_maker=Depends(get_async_session)) -> StreamingResponse:
+    """Stream every group matching the filters as NDJSON or CSV"""
+
+    return await export_endpoint(async_session_maker, GroupTable, GroupGet, filter_query_params, format, load_options=group_load_profile.options)
+
+
+@router.get("/facets", dependencies=[Depends(list_statement_timeout)])
+async def get_group_facets(fields: str, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> FacetsGet:
+    """Count the groups matching the filters per value of each of the comma separated fields"""
+
+    return await facets_endpoint(session, GroupTable, filter_query_params, fields, cache_key=cache_key)
+
+
+@router.post("/lookup", dependencies=[Depends(list_statement_timeout)])
+async def lookup_groups(lookup: GroupLookupPost, session=Depends(session_generator, scope="function")) -> LookupGet[GroupGet]:
+    """Get groups by id or name in one request, returned in the order given"""
+
+    key_name, keys = lookup.get_keys()
+    key_column = {"ids": GroupTable.id, "names": GroupTable.name}[key_name]
+
+    return await lookup_endpoint(session, GroupTable, key_column, keys, load_options=group_load_profile.options)
 
 
 @router.delete("/{group_id}", status_code=204)
-async def delete_group(group_id: int, session=Depends(session_generator)) -> None:
+async def delete_group(group_id: int, session=Depends(session_generator, scope="function")) -> None:
     await delete_one_endpoint(session, GroupTable, group_id)
 
 @router.get("/{group_id}")
-async def get_group(group_id: int, session=Depends(session_generator)) -> GroupGet:
-    return await get_one_endpoint(session, GroupTable, group_id)
+async def get_group(group_id: int, session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> GroupGet:
+    return await get_one_endpoint(session, GroupTable, group_id, load_options=group_load_profile.options, cache_key=cache_key)
 
 
 @router.post("", status_code=201)
-async def create_group(group: GroupPost, session=Depends(session_generator)) -> GroupGet:
-    return await create_one_endpoint(session, GroupTable, group)
+async def create_group(group: GroupPost, session=Depends(session_generator, scope="function")) -> GroupGet:
+    return await create_one_endpoint(session, GroupTable, group, load_options=group_load_profile.options)
 
 
 @router.put("/{group_id}", status_code=200)
-async def update_group(group_id: int, group: GroupPatch, session=Depends(session_generator)) -> GroupGet:
-    return await update_one_endpoint(session, GroupTable, group_id, group)
+async def update_group(group_id: int, group: GroupPatch, session=Depends(session_generator, scope="function")) -> GroupGet:
+    return await update_one_endpoint(session, GroupTable, group_id, group, load_options=group_load_profile.options)
 
 
-@router.get("/{group_id}/users")
-async def get_group_users(group_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> List[GroupUserViewSchema]:
+@router.get("/{group_id}/users", dependencies=[Depends(list_statement_timeout)])
+async def get_group_users(group_id: int, request: Request, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function")) -> List[GroupUserViewSchema]:
     """Get users associated with a group"""
 
     select_stmt = select(GroupUserView).where(GroupUserView.group_id == group_id)
-    return await list_select_stmt(session, select_stmt, GroupUserView, response, filter_query_params, page, page_size)
+    return await list_select_stmt(session, select_stmt, GroupUserView, response, filter_query_params, page, page_size, cursor=cursor, count=count, request=request)
 
 @with_db_error_handling
 @router.post("/{group_id}/users", status_code=201)
-async def add_user_to_group(group_id: int, user: UserGroupPost, session=Depends(session_generator)) -> dict:
+async def add_user_to_group(group_id: int, user: UserGroupPost, session=Depends(session_generator, scope="function")) -> dict:
     """Add user to a group"""
 
     user_group = UserGroup(group_id=group_id, **user.model_dump(exclude_unset=True))
@@ -75,7 +101,7 @@ async def add_user_to_group(group_id: int, user: UserGroupPost, session=Depends(
 
 @with_db_error_handling
 @router.delete("/{group_id}/users/{user_id}", status_code=204)
-async def remove_user_from_group(group_id: int, user_id: int, session=Depends(session_generator)) -> None:
+async def remove_user_from_group(group_id: int, user_id: int, session=Depends(session_generator, scope="function")) -> None:
     """Remove user from a group"""
 
     result = await session.execute(
@@ -95,7 +121,7 @@ async def patch_user_in_group(
     group_id: int,
     user_id: int,
     patch: UserGroupPatch,
-    session=Depends(session_generator),
+    session=Depends(session_generator, scope="function"),
 ) -> UserGroupViewSchema:
     """Patch a user's membership in a group (managed_by)."""
     return await _patch_user_group(session, user_id, group_id, patch)
@@ -19,15 +19,11 @@ from userapp.core.models.views import (
 from userapp.core.schemas.general import JoinedProjectView, UserGroupView
 from userapp.core.schemas.user_group import ManagedUserGroupPut
 from userapp.core.schemas.user_project import ManagedUserProjectPut
-from userapp.core.schemas.users import UserGet
 from userapp.api.routes.security import check_is_admin
 from userapp.api.util import with_db_error_handling
+from userapp.api.load_options import joined_project_load_profile, user_group_load_profile
 from userapp.db import session_generator
 
-# Rebuild schemas that contain forward references once at import time.
-JoinedProjectView.model_rebuild(_types_namespace={"UserGet": UserGet})
-UserGroupView.model_rebuild(_types_namespace={"UserGet": UserGet})
-
 
 def create_managed_router(
     prefix: str,
@@ -60,7 +56,7 @@ def create_managed_router(
     async def sync_project_users(
         project_id: int,
         users: List[ManagedUserProjectPut],
-        session=Depends(session_generator),
+        session=Depends(session_generator, scope="function"),
     ) -> List[JoinedProjectView]:
         f"""Replace the set of {manager.name}-managed members of a project.
 
@@ -156,7 +152,7 @@ def create_managed_router(
             select(JoinedProjectViewTable).where(
                 JoinedProjectViewTable.project_id == project_id,
                 JoinedProjectViewTable.managed_by == manager,
-            )
+            ).options(*joined_project_load_profile.options)
         )
         return result.scalars().all()
 
@@ -169,7 +165,7 @@ def create_managed_router(
     async def sync_group_users(
         group_id: int,
         users: List[ManagedUserGroupPut],
-        session=Depends(session_generator),
+        session=Depends(session_generator, scope="function"),
     ) -> List[UserGroupView]:
         f"""Replace the set of {manager.name}-managed members of a group.
 
@@ -253,7 +249,7 @@ def create_managed_router(
             select(UserGroupViewTable).where(
                 UserGroupViewTable.group_id == group_id,
                 UserGroupViewTable.managed_by == manager,
-            )
+            ).options(*user_group_load_profile.options)
         )
         return result.scalars().all()
 
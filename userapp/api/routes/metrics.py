@@ -0,0 +1,69 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from starlette.datastructures import State
+from starlette.requests import Request
+
+from userapp.api.metrics import CONTENT_TYPE, Counter, Gauge, Metric, registry, render
+from userapp.api.routes.security import check_ip_in_whitelist
+from userapp.db import get_pool_stats
+
+router = APIRouter(
+    tags=["Status"],
+)
+
+
+def check_metrics_access(request: Request) -> None:
+    """Limits /metrics to the IPs and CIDRs of METRICS_IP_WHITELIST, no one can read it while it isn't set"""
+
+    whitelist = os.environ.get("METRICS_IP_WHITELIST")
+    if not whitelist or not check_ip_in_whitelist(request.client.host, whitelist):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def pool_metrics(state: State) -> list[Metric]:
+    """Occupancy and checkout counters of the primary's pool, and the replica's if there is one"""
+
+    engines = {"primary": state.engine}
+    if state.replica_monitor is not None:
+        engines["replica"] = state.replica_engine
+
+    gauges = {
+        "size": Gauge("userapp_db_pool_size", "Connections the pool keeps open", ("database",)),
+        "checked_out": Gauge("userapp_db_pool_checked_out", "Connections in use", ("database",)),
+        "overflow": Gauge("userapp_db_pool_overflow", "Connections open beyond the pool size", ("database",)),
+        "max_overflow": Gauge("userapp_db_pool_max_overflow", "Connections that can be opened beyond the pool size", ("database",)),
+        "wait_seconds_max": Gauge("userapp_db_pool_wait_seconds_max", "Longest wait for a connection", ("database",), aggregate="max"),
+    }
+    counters = {
+        "checkouts": Counter("userapp_db_pool_checkouts_total", "Connections checked out", ("database",)),
+        "timeouts": Counter("userapp_db_pool_timeouts_total", "Checkouts that timed out waiting for a connection", ("database",)),
+        "wait_seconds_total": Counter("userapp_db_pool_wait_seconds_total", "Time spent waiting for a connection", ("database",)),
+    }
+
+    for database, engine in engines.items():
+        pool_stats = get_pool_stats(engine)
+        for key, metric in [*gauges.items(), *counters.items()]:
+            metric.set(pool_stats[key], database=database)
+
+    return [*gauges.values(), *counters.values()]
+
+
+def worker_metrics(state: State) -> list[Metric]:
+    """The request metrics of this worker and the metrics of its pools"""
+
+    return [*registry.metrics, *pool_metrics(state)]
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(check_metrics_access)])
+async def get_metrics(request: Request) -> Response:
+    """Request and connection pool metrics of the workers in the Prometheus text format"""
+
+    metrics = worker_metrics(request.app.state)
+
+    multiprocess = request.app.state.multiprocess_metrics
+    if multiprocess is not None:
+        multiprocess.write(metrics)
+        metrics = multiprocess.collect(metrics)
+
+    return Response(content=render(metrics), media_type=CONTENT_TYPE)
@@ -1,11 +1,12 @@
 # Signed off by Cannon Lock 2025-11-03
 
 from fastapi import APIRouter, Depends, Response
+from starlette.responses import StreamingResponse
 
-from userapp.db import session_generator
+from userapp.db import session_generator, get_async_session
 from userapp.query_parser import get_filter_query_params
-from userapp.api.routes.security import check_is_admin
-from userapp.api.util import list_endpoint
+from userapp.api.routes.security import check_is_admin, get_response_cache_key
+from userapp.api.util import list_endpoint, CountStrategy, export_endpoint, ExportFormat, list_statement_timeout
 from userapp.core.models.views import PiProjectView as PiProjectViewTable
 from userapp.core.schemas.general import PiProjectView as PiProjectViewSchema
 
@@ -20,6 +21,13 @@ router = APIRouter(
     }
 )
 
-@router.get("")
-async def get_pi_projects(response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[PiProjectViewSchema]:
-    return await list_endpoint(session, PiProjectViewTable, response, filter_query_params, page, page_size)
+@router.get("", dependencies=[Depends(list_statement_timeout)])
+async def get_pi_projects(response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> list[PiProjectViewSchema]:
+    return await list_endpoint(session, PiProjectViewTable, response, filter_query_params, page, page_size, cursor=cursor, count=count, cache_key=cache_key)
+
+
+@router.get("/export")
+async def export_pi_projects(format: ExportFormat = "ndjson", filter_query_params=Depends(get_filter_query_params), async_session_maker=Depends(get_async_session)) -> StreamingResponse:
+    """Stream every PI project matching the filters as NDJSON or CSV"""
+
+    return await export_endpoint(async_session_maker, PiProjectViewTable, PiProjectViewSchema, filter_query_params, format)
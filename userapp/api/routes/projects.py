@@ -1,27 +1,24 @@
 from fastapi import APIRouter, Response, Depends, HTTPException
+from starlette.responses import StreamingResponse
 from sqlalchemy import delete, select
 
 from userapp.core.schemas.project_note import ProjectNotePost
 from userapp.core.schemas.user_note import UserNoteTableSchema
-from userapp.db import session_generator
+from userapp.db import session_generator, get_async_session
 from userapp.query_parser import get_filter_query_params
-from userapp.api.routes.security import check_is_admin, get_user_from_cookie
+from userapp.api.routes.security import check_is_admin, get_user_from_cookie, get_response_cache_key
+from userapp.api.serialization import serialize_response
 from userapp.api.util import list_endpoint, get_one_endpoint, create_one_endpoint, update_one_endpoint, delete_one_endpoint, \
-    list_select_stmt
-from userapp.core.schemas.projects import ProjectGet, ProjectPost, ProjectPatch
+    list_select_stmt, CountStrategy, export_endpoint, ExportFormat, lookup_endpoint, facets_endpoint, list_statement_timeout
+from userapp.core.schemas.projects import ProjectGet, ProjectPost, ProjectPatch, ProjectLookupPost
 from userapp.core.schemas.user_project import UserProjectPost, UserProjectTableSchema, UserProjectPatch
 from userapp.core.schemas.note import NoteGet, NoteTableSchema, NotePost, NoteGetFull
-from userapp.core.schemas.general import JoinedProjectView as JoinedProjectViewSchema
+from userapp.core.schemas.general import JoinedProjectView as JoinedProjectViewSchema, LookupGet, FacetsGet
 from userapp.core.models.tables import Project as ProjectTable, Note as NoteTable, UserNote, User, UserProject
 from userapp.core.models.views import JoinedProjectView as JoinedProjectViewTable
-from userapp.core.schemas.users import UserGet
 from userapp.api.routes._util import _patch_user_project
+from userapp.api.load_options import project_load_profile, joined_project_load_profile, note_load_profile
 
-# Rebuild fields that use forward references to avoid circular imports
-NoteGet.model_rebuild(_types_namespace={'UserGet': UserGet})
-NoteGetFull.model_rebuild(_types_namespace={'UserGet': UserGet})
-ProjectGet.model_rebuild(_types_namespace={'UserGet': UserGet})
-JoinedProjectViewSchema.model_rebuild(_types_namespace={'UserGet': UserGet})
 
 router = APIRouter(
     prefix="/projects",
@@ -34,14 +31,38 @@ router = APIRouter(
     }
 )
 
-@router.get("")
-async def get_projects(response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[ProjectGet]:
-    x = await list_endpoint(session, ProjectTable, response, filter_query_params, page, page_size)
+@router.get("", dependencies=[Depends(list_statement_timeout)])
+async def get_projects(response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> list[ProjectGet]:
+    x = await list_endpoint(session, ProjectTable, response, filter_query_params, page, page_size, load_options=project_load_profile.options, cursor=cursor, count=count, cache_key=cache_key)
     return x
 
 
+@router.get("/export")
+async def export_projects(format: ExportFormat = "ndjson", filter_query_params=Depends(get_filter_query_params), async_session_maker=Depends(get_async_session)) -> StreamingResponse:
+    """Stream every project matching the filters as NDJSON or CSV"""
+
+    return await export_endpoint(async_session_maker, ProjectTable, ProjectGet, filter_query_params, format, load_options=project_load_profile.options)
+
+
+@router.get("/facets", dependencies=[Depends(list_statement_timeout)])
+async def get_project_facets(fields: str, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> FacetsGet:
+    """Count the projects matching the filters per value of each of the comma separated fields"""
+
+    return await facets_endpoint(session, ProjectTable, filter_query_params, fields, cache_key=cache_key)
+
+
+@router.post("/lookup", dependencies=[Depends(list_statement_timeout)])
+async def lookup_projects(lookup: ProjectLookupPost, session=Depends(session_generator, scope="function")) -> LookupGet[ProjectGet]:
+    """Get projects by id, name or accounting group in one request, returned in the order given"""
+
+    key_name, keys = lookup.get_keys()
+    key_column = {"ids": ProjectTable.id, "names": ProjectTable.name, "accounting_groups": ProjectTable.accounting_group}[key_name]
+
+    return await lookup_endpoint(session, ProjectTable, key_column, keys, load_options=project_load_profile.options)
+
+
 @router.delete("/{project_id}", status_code=204)
-async def delete_project(project_id: int, session=Depends(session_generator)) -> None:
+async def delete_project(project_id: int, session=Depends(session_generator, scope="function")) -> None:
     """Delete a project by ID"""
 
     await delete_one_endpoint(session, ProjectTable, project_id)
@@ -58,30 +79,36 @@ async def delete_project(project_id: int, session=Depends(session_generator)) ->
 
 
 @router.get("/{project_id}")
-async def get_project(project_id: int, session=Depends(session_generator)) -> ProjectGet:
-    return await get_one_endpoint(session, ProjectTable,  project_id)
+async def get_project(project_id: int, session=Depends(session_generator, scope="function"), cache_key=Depends(get_response_cache_key)) -> ProjectGet:
+    return await get_one_endpoint(session, ProjectTable, project_id, load_options=project_load_profile.options, cache_key=cache_key)
 
 
 @router.post("", status_code=201)
-async def create_project(project: ProjectPost, session=Depends(session_generator)) -> ProjectGet:
-    return await create_one_endpoint(session, ProjectTable,  project)
+async def create_project(project: ProjectPost, session=Depends(session_generator, scope="function")) -> ProjectGet:
+    return await create_one_endpoint(session, ProjectTable, project, load_options=project_load_profile.options)
 
 
 @router.put("/{project_id}", status_code=200)
-async def update_project(project_id: int, project: ProjectPatch, session=Depends(session_generator)) -> ProjectGet:
-    return await update_one_endpoint(session, ProjectTable,  project_id, project)
+async def update_project(project_id: int, project: ProjectPatch, session=Depends(session_generator, scope="function")) -> ProjectGet:
+    return await update_one_endpoint(session, ProjectTable, project_id, project, load_options=project_load_profile.options)
 
 
-@router.get("/{project_id}/users")
-async def get_project_users(project_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[JoinedProjectViewSchema]:
+@router.get("/{project_id}/users", dependencies=[Depends(list_statement_timeout)])
+async def get_project_users(project_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function")) -> list[JoinedProjectViewSchema]:
     """Get users associated with a project"""
 
     filter_query_params.append(('project_id', f"eq.{project_id}"))
-    return await list_endpoint(session, JoinedProjectViewTable, response, filter_query_params, page, page_size)
+    users = await list_endpoint(session, JoinedProjectViewTable, response, filter_query_params, page, page_size, load_options=joined_project_load_profile.options, cursor=cursor, count=count)
+
+    # Sparse fieldsets are already serialized
+    if isinstance(users, Response):
+        return users
+
+    return serialize_response(list[JoinedProjectViewSchema], users, response)
 
 
 @router.post("/{project_id}/users", status_code=201)
-async def add_user_to_project(project_id: int, user_project: UserProjectPost, session=Depends(session_generator)) -> dict:
+async def add_user_to_project(project_id: int, user_project: UserProjectPost, session=Depends(session_generator, scope="function")) -> dict:
     """Add user to a project"""
 
     # Check if the user exists
@@ -97,7 +124,7 @@ async def add_user_to_project(project_id: int, user_project: UserProjectPost, se
 
 
 @router.delete("/{project_id}/users/{user_id}", status_code=204)
-async def remove_user_from_project(project_id: int, user_id: int, session=Depends(session_generator)) -> None:
+async def remove_user_from_project(project_id: int, user_id: int, session=Depends(session_generator, scope="function")) -> None:
     """Remove user from a project"""
 
     result = await session.execute(
@@ -117,24 +144,24 @@ async def patch_user_in_project(
     project_id: int,
     user_id: int,
     patch: UserProjectPatch,
-    session=Depends(session_generator),
+    session=Depends(session_generator, scope="function"),
 ) -> JoinedProjectViewSchema:
     """Patch a user's membership in a project (role, is_primary, managed_by)."""
     return await _patch_user_project(session, user_id, project_id, patch)
 
 
-@router.get("/{project_id}/notes")
-async def get_project_notes(project_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[NoteGetFull]:
+@router.get("/{project_id}/notes", dependencies=[Depends(list_statement_timeout)])
+async def get_project_notes(project_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function")) -> list[NoteGetFull]:
     """Get notes associated with a project"""
 
     select_stmt = select(NoteTable).join(
         UserNote, NoteTable.id == UserNote.note_id
     ).where(UserNote.project_id == project_id)
-    return await list_select_stmt(session, select_stmt, NoteTable, response, filter_query_params, page, page_size)
+    return await list_select_stmt(session, select_stmt, NoteTable, response, filter_query_params, page, page_size, load_options=note_load_profile.options, cursor=cursor, count=count)
 
 
 @router.get("/{project_id}/notes/{note_id}")
-async def get_project_note(project_id: int, note_id: int, session=Depends(session_generator)) -> NoteGetFull:
+async def get_project_note(project_id: int, note_id: int, session=Depends(session_generator, scope="function")) -> NoteGetFull:
     """Get a specific note associated with a project"""
 
     select_stmt = select(NoteTable).join(
@@ -142,7 +169,7 @@ async def get_project_note(project_id: int, note_id: int, session=Depends(sessio
     ).where(
         UserNote.project_id == project_id,
         UserNote.note_id == note_id
-    )
+    ).options(*note_load_profile.options)
     result = await session.scalar(select_stmt)
     if result is None:
         raise HTTPException(status_code=404, detail="Note not found in project")
@@ -150,7 +177,7 @@ async def get_project_note(project_id: int, note_id: int, session=Depends(sessio
 
 
 @router.post("/{project_id}/notes", status_code=201)
-async def add_note_to_project(project_id: int, note: ProjectNotePost, session=Depends(session_generator), user_token=Depends(get_user_from_cookie)) -> NoteGetFull:
+async def add_note_to_project(project_id: int, note: ProjectNotePost, session=Depends(session_generator, scope="function"), user_token=Depends(get_user_from_cookie)) -> NoteGetFull:
     """Add a note to a project"""
 
     note_row = NoteTableSchema(**{**note.model_dump(), 'author_id': user_token.user_id if user_token else None})
@@ -173,14 +200,15 @@ async def add_note_to_project(project_id: int, note: ProjectNotePost, session=De
     for user_note in [project_note, *user_project_notes]:
         await create_one_endpoint(session, UserNote, user_note)
 
-    # Flush the associations and refresh the note to load them in
+    # Flush the associations and reload the note to load them in
     await session.flush()
-    await session.refresh(new_note)
+    new_note_id = new_note.id
+    session.expire(new_note)
 
-    return new_note
+    return await get_one_endpoint(session, NoteTable, new_note_id, load_options=note_load_profile.options)
 
 @router.put("/{project_id}/notes/{note_id}")
-async def update_note_in_project(project_id: int, note_id: int, note: ProjectNotePost, session=Depends(session_generator), user_token=Depends(get_user_from_cookie)) -> NoteGetFull:
+async def update_note_in_project(project_id: int, note_id: int, note: ProjectNotePost, session=Depends(session_generator, scope="function"), user_token=Depends(get_user_from_cookie)) -> NoteGetFull:
     """Update a note in a project"""
 
     # Update the note content
@@ -208,15 +236,15 @@ async def update_note_in_project(project_id: int, note_id: int, note: ProjectNot
     for user_note in user_project_notes:
         await create_one_endpoint(session, UserNote, user_note)
 
-    # Flush the associations and refresh the note to load them in
+    # Flush the associations and reload the note to load them in
     await session.flush()
-    await session.refresh(updated_note)
+    session.expire(updated_note)
 
-    return updated_note
+    return await get_one_endpoint(session, NoteTable, note_id, load_options=note_load_profile.options)
 
 
 @router.delete("/{project_id}/notes/{note_id}", status_code=204)
-async def delete_note_from_project(project_id: int, note_id: int, session=Depends(session_generator)):
+async def delete_note_from_project(project_id: int, note_id: int, session=Depends(session_generator, scope="function")):
     """Delete a note from a project"""
 
     await session.execute(
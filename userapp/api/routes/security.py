@@ -7,26 +7,32 @@ from functools import lru_cache
 
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import HTTPBearer
-import httpx
 from pydantic import BaseModel
 from starlette.responses import Response, RedirectResponse
 from jose import JWTError, jwt
 from sqlalchemy.future import select
-from passlib.context import CryptContext
-from passlib.exc import UnknownHashError
 
+from userapp.api.cache import response_cache_key
 from userapp.api.util import get_one_endpoint
 from userapp.core.models.tables import User as UserTable, Token
 from userapp.core.schemas.note import NoteGet
 from userapp.core.schemas.users import UserGetFull, UserGet
 from userapp.core.schemas.general import JoinedProjectView
-from userapp.api.load_options import user_load_options
-from userapp.db import session_generator
+from userapp.api.load_options import token_load_profile, parse_user_embeds, get_user_load_options
+from userapp.api.routes._util import _user_embed_response, _user_fingerprints
+from userapp.db import session_generator, use_primary, use_transaction
+
+
+@lru_cache
+def get_password_context():
+    """The passlib context hashing passwords, created when first needed rather than on import"""
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt", "sha512_crypt"],
+        deprecated="auto",
+    )
 
-pwd_context = CryptContext(
-    schemes=["bcrypt", "sha512_crypt"],
-    deprecated="auto",
-)
 
 STATE_EXPIRATION_MINUTES = 10
 
@@ -36,7 +42,7 @@ def create_password_hash(plain_password: str) -> str:
 
     Uses bcrypt by default.
     """
-    hash = pwd_context.hash(plain_password)
+    hash = get_password_context().hash(plain_password)
 
     if not verify_password(plain_password, hash):
         raise ValueError("Failed to verify password hash after creation.")
@@ -51,11 +57,13 @@ def verify_password(plain_password: str, password_hash: str) -> bool:
     hashes produced by PHP or system crypt(). Returns False for unknown/invalid
     hash formats instead of raising.
     """
+    from passlib.exc import UnknownHashError
+
     if not password_hash:
         return False
 
     try:
-        return pwd_context.verify(plain_password, password_hash)
+        return get_password_context().verify(plain_password, password_hash)
     except (UnknownHashError, ValueError, TypeError):
         # Any parsing/format issues should look like an invalid password
         return False
@@ -144,7 +152,7 @@ def check_ip_in_whitelist(ip_str: str, whitelist_str: str) -> bool:
     except ValueError:
         return False
 
-async def get_auth_from_api_token(request: Request, session=Depends(session_generator), api_token=Depends(http_bearer)) -> ApiTokenData | None:
+async def get_auth_from_api_token(request: Request, session=Depends(session_generator, scope="function"), api_token=Depends(http_bearer)) -> ApiTokenData | None:
     """Get the current user from an API token in the Authorization header"""
 
     if api_token is None:
@@ -163,7 +171,7 @@ async def get_auth_from_api_token(request: Request, session=Depends(session_gene
     except ValueError:
         return None
 
-    result = await session.execute(select(Token).where(Token.id == token_id))
+    result = await session.execute(select(Token).where(Token.id == token_id).options(*token_load_profile.options))
     token = result.unique().scalar_one_or_none()
 
     if token is None:
@@ -197,6 +205,24 @@ async def check_is_admin(is_admin=Depends(is_admin)):
     if not is_admin: raise HTTPException(status_code=403, detail="User is not an admin")
 
 
+async def get_caller_role(is_admin=Depends(is_admin), user_token=Depends(get_user_from_cookie)) -> str:
+    """Dependency returning the caller's role, admin or the user themself"""
+
+    if is_admin:
+        return "admin"
+
+    if user_token:
+        return f"user:{user_token.user_id}"
+
+    return "anonymous"
+
+
+async def get_response_cache_key(request: Request, role=Depends(get_caller_role)) -> tuple:
+    """Dependency keying the response cache, responses are only shared between callers with the same role"""
+
+    return response_cache_key(request, role)
+
+
 async def is_user(user_id: int, user_token=Depends(get_user_from_cookie)):
     """Dependency to check if the user is the one currently logged in or an admin"""
 
@@ -299,10 +325,17 @@ async def csrf_middleware(request: Request):
             raise HTTPException(status_code=403, detail="CSRF token mismatch")
 
 
+def oidc_client():
+    """A client for the OIDC provider, httpx is only imported once someone logs in"""
+    import httpx
+
+    return httpx.AsyncClient(timeout=10.0)
+
+
 async def get_oidc_config() -> dict:
     """Fetch the OIDC provider configuration from the discovery URL"""
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with oidc_client() as client:
         oidc_config_resp = await client.get(
             os.environ["OIDC_DISCOVERY_URL"]
         )
@@ -327,7 +360,7 @@ async def get_oidc_public_keys() -> dict:
 
     oidc_config = await get_oidc_config()
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with oidc_client() as client:
         jwks_resp = await client.get(
             oidc_config["jwks_uri"]
         )
@@ -387,7 +420,9 @@ async def login_user(request: Request):
 
 
 @router.get("/auth/oidc/callback")
-async def oidc_callback(request: Request, response: Response, session=Depends(session_generator)):
+@use_primary
+@use_transaction
+async def oidc_callback(request: Request, response: Response, session=Depends(session_generator, scope="function")):
     """OIDC Callback endpoint to complete login.
 
     After successful authentication, redirect the user back to the original
@@ -411,7 +446,7 @@ async def oidc_callback(request: Request, response: Response, session=Depends(se
     redirect_uri = f"https://{request.url.hostname}/auth/oidc/callback" if 'PYTHON_ENV' in os.environ and os.environ['PYTHON_ENV'] == "production" else "http://localhost/auth/oidc/callback"
 
     # Exchange the authorization code for tokens
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with oidc_client() as client:
         token_resp = await client.post(
             oidc_config["token_endpoint"],
             data={
@@ -449,7 +484,7 @@ async def oidc_callback(request: Request, response: Response, session=Depends(se
     if user is None:
         # Call out to the userinfo endpoint with the access token
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with oidc_client() as client:
                 user_info_resp = await client.get(
                     oidc_config["userinfo_endpoint"],
                     headers={
@@ -511,10 +546,20 @@ async def logout_user(response: Response):
 
 @router.get("/me")
 @router.post("/me", include_in_schema=False) # Added for testing only
-async def get_current_user(user_token=Depends(get_user_from_cookie), session=Depends(session_generator)) -> UserGetFull:
-    """Get the current user"""
+@use_primary
+async def get_current_user(request: Request, response: Response, embed: str | None = None, user_token=Depends(get_user_from_cookie), session=Depends(session_generator, scope="function")) -> UserGetFull:
+    """Get the current user, embed limits the nested relationships as on /users/{user_id}"""
 
     if user_token:
-        return await get_one_endpoint(session, UserTable, user_token.user_id, load_options=user_load_options)
+        embeds = parse_user_embeds(embed)
+        user = await get_one_endpoint(
+            session, UserTable, user_token.user_id, load_options=get_user_load_options(embeds),
+            request=request, response=response, fingerprints=_user_fingerprints(user_token.user_id)
+        )
+
+        if embed is None:
+            return user
+
+        return _user_embed_response(user, embeds, response)
     else:
         raise HTTPException(status_code=401, detail="Not authenticated")
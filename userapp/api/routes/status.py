@@ -0,0 +1,57 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.requests import Request
+
+from userapp.api.routes.security import check_is_admin
+from userapp.api.slow_queries import slow_query_log
+from userapp.core.schemas.status import PoolStatsGet, ReplicaStatusGet, SlowQueryGet
+from userapp.db import get_pool_stats
+
+router = APIRouter(
+    prefix="/status",
+    tags=["Status"],
+    dependencies=[Depends(check_is_admin)],
+    responses={
+        404: {
+            "description": "Not found"
+        }
+    }
+)
+
+
+@router.get("/pool")
+async def get_pool_status(request: Request) -> PoolStatsGet:
+    """Occupancy of the database connection pool and how long checkouts have waited for a connection"""
+
+    return get_pool_stats(request.app.state.engine)
+
+
+@router.get("/replica")
+async def get_replica_status(request: Request) -> ReplicaStatusGet:
+    """Whether GET requests are being served by the read replica, its lag and its connection pool"""
+
+    replica_monitor = request.app.state.replica_monitor
+    if replica_monitor is None:
+        raise HTTPException(status_code=404, detail="No replica is configured")
+
+    await replica_monitor.is_healthy()
+
+    return {
+        "healthy": replica_monitor.healthy,
+        "lag_seconds": replica_monitor.lag,
+        "max_lag_seconds": replica_monitor.max_lag,
+        "pool": get_pool_stats(replica_monitor.engine),
+    }
+
+
+@router.get("/slow-queries")
+async def get_slow_queries() -> list[SlowQueryGet]:
+    """The most recent statements of this worker that ran for longer than SLOW_QUERY_THRESHOLD, newest first"""
+
+    return [asdict(slow_query) for slow_query in slow_query_log]
+
+
+@router.delete("/slow-queries", status_code=204)
+async def clear_slow_queries() -> None:
+    slow_query_log.clear()
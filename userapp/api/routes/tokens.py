@@ -5,14 +5,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select, delete
 from starlette.requests import Request
 from starlette.responses import Response
-from passlib.hash import bcrypt
 
 from userapp.core.schemas.token_permission import TokenPermissionGet, TokenPermissionPost
 from userapp.db import session_generator
 from userapp.query_parser import get_filter_query_params
-from userapp.api.routes.security import check_is_admin, get_user_from_cookie
+from userapp.api.routes.security import check_is_admin, get_user_from_cookie, get_password_context
 from userapp.api.util import list_endpoint, delete_one_endpoint, get_one_endpoint, create_one_endpoint, \
-    list_select_stmt, route_method_lookup
+    list_select_stmt, route_method_lookup, CountStrategy, list_statement_timeout
+from userapp.api.load_options import token_load_profile
 from userapp.core.schemas.tokens import TokenGet, TokenGetFull, TokenPost, TokenTableSchema
 from userapp.core.models.tables import Token, TokenPermission
 
@@ -27,27 +27,27 @@ router = APIRouter(
     }
 )
 
-@router.get("")
-async def get_tokens(response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[TokenGet]:
-    return await list_endpoint(session, Token, response, filter_query_params, page, page_size)
+@router.get("", dependencies=[Depends(list_statement_timeout)])
+async def get_tokens(response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function")) -> list[TokenGet]:
+    return await list_endpoint(session, Token, response, filter_query_params, page, page_size, load_options=token_load_profile.options, cursor=cursor, count=count)
 
 
 @router.delete("/{token_id}", status_code=204)
-async def delete_token(token_id: int, session=Depends(session_generator)) -> None:
+async def delete_token(token_id: int, session=Depends(session_generator, scope="function")) -> None:
     token = await get_one_endpoint(session, Token, token_id)
     token.expires_at = datetime(1970, 1, 1) # Set the token to be expired
 
 
 @router.get("/{token_id}")
-async def get_token(token_id: int, session=Depends(session_generator)) -> TokenGet:
-    return await get_one_endpoint(session, Token, token_id)
+async def get_token(token_id: int, session=Depends(session_generator, scope="function")) -> TokenGet:
+    return await get_one_endpoint(session, Token, token_id, load_options=token_load_profile.options)
 
 
 @router.post("", status_code=201)
-async def create_token(token: TokenPost, session=Depends(session_generator), user_token=Depends(get_user_from_cookie)) -> TokenGetFull:
+async def create_token(token: TokenPost, session=Depends(session_generator, scope="function"), user_token=Depends(get_user_from_cookie)) -> TokenGetFull:
 
     generated_token = secrets.token_hex(32)
-    hashed_token = bcrypt.hash(generated_token)
+    hashed_token = get_password_context().hash(generated_token)
 
     db_token = TokenTableSchema(
         **token.model_dump(exclude_unset=True),
@@ -66,13 +66,13 @@ async def create_token(token: TokenPost, session=Depends(session_generator), use
         expires_at=created_token.expires_at
     )
 
-@router.get("/{token_id}/permissions")
-async def get_token_permissions(token_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator)) -> list[TokenPermissionGet]:
+@router.get("/{token_id}/permissions", dependencies=[Depends(list_statement_timeout)])
+async def get_token_permissions(token_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function")) -> list[TokenPermissionGet]:
     select_stmt = select(TokenPermission).where(TokenPermission.token_id == token_id)
-    return await list_select_stmt(session, select_stmt, Token, response, filter_query_params, page, page_size)
+    return await list_select_stmt(session, select_stmt, TokenPermission, response, filter_query_params, page, page_size, cursor=cursor, count=count)
 
 @router.post("/{token_id}/permissions", status_code=201)
-async def create_token_permission(request: Request, token_id: int, permission: TokenPermissionPost, session=Depends(session_generator)) -> TokenPermissionGet:
+async def create_token_permission(request: Request, token_id: int, permission: TokenPermissionPost, session=Depends(session_generator, scope="function")) -> TokenPermissionGet:
 
     # Check that the route exists for the permission
     if route_method_lookup(request.app.routes, permission.route, permission.method) is False:
@@ -82,7 +82,7 @@ async def create_token_permission(request: Request, token_id: int, permission: T
     return await create_one_endpoint(session, TokenPermission, token_permission_schema)
 
 @router.delete("/{token_id}/permissions/{permission_id}", status_code=204)
-async def delete_token_permission(token_id: int, permission_id: int, session=Depends(session_generator)) -> None:
+async def delete_token_permission(token_id: int, permission_id: int, session=Depends(session_generator, scope="function")) -> None:
     await session.execute(
         delete(TokenPermission).where(
             TokenPermission.id == permission_id,
@@ -1,31 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload, joinedload
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
 from userapp.core.schemas.groups import GroupGet
-from userapp.db import session_generator
+from userapp.db import session_generator, get_async_session
 from userapp.query_parser import get_filter_query_params
-from userapp.api.routes.security import check_is_admin, is_admin, is_user, check_is_user
+from userapp.api.routes.security import check_is_admin, is_admin, is_user, check_is_user, get_response_cache_key
+from userapp.api.serialization import serialize_response
 from userapp.api.util import list_endpoint, delete_one_endpoint, get_one_endpoint, create_one_endpoint, \
-    list_select_stmt, update_one_endpoint
-from userapp.core.schemas.users import UserGet, UserPost, UserPatch, UserPostFull, UserPatchFull, \
-    RestrictedUserPatch, UserTableSchema, UserGetFull
+    list_select_stmt, update_one_endpoint, CountStrategy, export_endpoint, ExportFormat, lookup_endpoint, \
+    facets_endpoint, list_statement_timeout
+from userapp.core.schemas.users import UserPost, UserPatch, UserPostFull, UserPatchFull, \
+    RestrictedUserPatch, UserTableSchema, UserGetFull, UserLookupPost
 from userapp.core.schemas.user_project import UserProjectPost, UserProjectTableSchema, UserProjectPatch
 from userapp.core.schemas.user_group import UserGroupPatch
-from userapp.core.schemas.general import JoinedProjectView as JoinedProjectViewSchema, UserGroupView as UserGroupViewSchema
+from userapp.core.schemas.general import JoinedProjectView as JoinedProjectViewSchema, UserGroupView as UserGroupViewSchema, LookupGet, \
+    FacetsGet
 from userapp.core.schemas.user_submit import UserSubmitPost, UserSubmitTableSchema, UserSubmitGet
-from userapp.core.schemas.note import NoteGet
 from userapp.core.models.views import JoinedProjectView as JoinedProjectViewTable, \
     UserSubmitNodesView as UserSubmitNodesViewTable, UserSubmitNodesView, UserGroupView as UserGroupViewTable
 from userapp.core.models.tables import User as UserTable, UserProject, UserSubmit, Group, UserGroup, Note as NoteTable
-from userapp.api.load_options import user_load_options
-from userapp.api.routes._util import _patch_user_submit_nodes, _patch_user_project, _patch_user_group
-
-# Rebuild field for those that would cause circular imports
-NoteGet.model_rebuild(_types_namespace={'UserGet': UserGet})
-JoinedProjectViewSchema.model_rebuild(_types_namespace={'UserGet': UserGet})
-UserGroupViewSchema.model_rebuild(_types_namespace={'UserGet': UserGet})
+from userapp.api.load_options import user_load_profile, joined_project_load_profile, user_group_load_profile, \
+    parse_user_embeds, get_user_load_options
+from userapp.api.routes._util import _patch_user_submit_nodes, _patch_user_project, _patch_user_group, _user_embed_response, \
+    _user_fingerprints
 
 
 router = APIRouter(
@@ -40,27 +39,69 @@ router = APIRouter(
 )
 
 
-@router.get("")
-async def get_users(response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator), check_is_admin=Depends(check_is_admin)) -> list[UserGetFull]:
-    return await list_endpoint(session, UserTable, response, filter_query_params, page, page_size, load_options=user_load_options)
+@router.get("", dependencies=[Depends(list_statement_timeout)])
+async def get_users(response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", embed: str | None = None, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), check_is_admin=Depends(check_is_admin)) -> list[UserGetFull]:
+    """List users, embed=projects,groups limits the nested relationships to those listed, embed= returns none of them"""
+
+    embeds = parse_user_embeds(embed)
+    users = await list_endpoint(session, UserTable, response, filter_query_params, page, page_size, load_options=get_user_load_options(embeds), cursor=cursor, count=count)
+
+    # Sparse fieldsets are already serialized
+    if isinstance(users, Response):
+        return users
+
+    return _user_embed_response(users, embeds, response)
+
+
+@router.get("/export")
+async def export_users(format: ExportFormat = "ndjson", filter_query_params=Depends(get_filter_query_params), async_session_maker=Depends(get_async_session), check_is_admin=Depends(check_is_admin)) -> StreamingResponse:
+    """Stream every user matching the filters as NDJSON or CSV"""
+
+    return await export_endpoint(async_session_maker, UserTable, UserGetFull, filter_query_params, format, load_options=user_load_profile.options)
+
+
+@router.get("/facets", dependencies=[Depends(list_statement_timeout)])
+async def get_user_facets(fields: str, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), check_is_admin=Depends(check_is_admin), cache_key=Depends(get_response_cache_key)) -> FacetsGet:
+    """Count the users matching the filters per value of each of the comma separated fields, such as fields=position,active"""
+
+    return await facets_endpoint(session, UserTable, filter_query_params, fields, cache_key=cache_key)
+
+
+@router.post("/lookup", dependencies=[Depends(list_statement_timeout)])
+async def lookup_users(lookup: UserLookupPost, session=Depends(session_generator, scope="function"), check_is_admin=Depends(check_is_admin)) -> LookupGet[UserGetFull]:
+    """Get users by id, netid or username in one request, returned in the order given"""
+
+    key_name, keys = lookup.get_keys()
+    key_column = {"ids": UserTable.id, "netids": UserTable.netid, "usernames": UserTable.username}[key_name]
+
+    return await lookup_endpoint(session, UserTable, key_column, keys, load_options=user_load_profile.options)
 
 
 @router.delete("/{user_id}", status_code=204)
-async def delete_user(user_id: int, session=Depends(session_generator), check_is_admin=Depends(check_is_admin)) -> None:
+async def delete_user(user_id: int, session=Depends(session_generator, scope="function"), check_is_admin=Depends(check_is_admin)) -> None:
     await delete_one_endpoint(session, UserTable, user_id)
 
 
 @router.get("/{user_id}")
-async def get_user(user_id: int, session=Depends(session_generator), check_is_user=Depends(check_is_user)) -> UserGetFull:
-    return await get_one_endpoint(session, UserTable, user_id, load_options=user_load_options)
+async def get_user(user_id: int, request: Request, response: Response, embed: str | None = None, session=Depends(session_generator, scope="function"), check_is_user=Depends(check_is_user)) -> UserGetFull:
+    embeds = parse_user_embeds(embed)
+    user = await get_one_endpoint(
+        session, UserTable, user_id, load_options=get_user_load_options(embeds),
+        request=request, response=response, fingerprints=_user_fingerprints(user_id)
+    )
+
+    if embed is None:
+        return user
+
+    return _user_embed_response(user, embeds, response)
 
 
 @router.post("", status_code=201)
-async def create_user(user: UserPostFull, session=Depends(session_generator), check_is_admin=Depends(check_is_admin)) -> UserGetFull:
+async def create_user(user: UserPostFull, session=Depends(session_generator, scope="function"), check_is_admin=Depends(check_is_admin)) -> UserGetFull:
 
     # Create the user
     user_data_only = UserTableSchema(**user.model_dump())
-    created_user = await create_one_endpoint(session, UserTable, user_data_only, load_options=user_load_options)
+    created_user = await create_one_endpoint(session, UserTable, user_data_only, load_options=user_load_profile.options)
     created_user_id = created_user.id
 
     # Create the project association
@@ -84,12 +125,12 @@ async def create_user(user: UserPostFull, session=Depends(session_generator), ch
 
     # Expire the user to force a fresh load from the database
     session.expire(created_user)
-    created_user = await get_one_endpoint(session, UserTable, created_user_id, load_options=user_load_options)
+    created_user = await get_one_endpoint(session, UserTable, created_user_id, load_options=user_load_profile.options)
 
     return created_user
 
 @router.patch("/{user_id}")
-async def update_user(user_id: int, user: UserPatchFull, session=Depends(session_generator), is_user=Depends(is_user), is_admin=Depends(is_admin)) -> UserGetFull:
+async def update_user(user_id: int, user: UserPatchFull, session=Depends(session_generator, scope="function"), is_user=Depends(is_user), is_admin=Depends(is_admin)) -> UserGetFull:
     """Update a user"""
 
     # If the user is updating themselves but is not an admin, restrict what they can update
@@ -97,12 +138,12 @@ async def update_user(user_id: int, user: UserPatchFull, session=Depends(session
         user_update_schema = RestrictedUserPatch(
             **user.model_dump(exclude_unset=True)
         )
-        return await update_one_endpoint(session, UserTable, user_id, user_update_schema, load_options=user_load_options)
+        return await update_one_endpoint(session, UserTable, user_id, user_update_schema, load_options=user_load_profile.options)
 
     elif is_admin:
         # Update user
         user_data_only = UserPatch(**user.model_dump(exclude_unset=True))
-        updated_user = await update_one_endpoint(session, UserTable, user_id, user_data_only, load_options=user_load_options)
+        updated_user = await update_one_endpoint(session, UserTable, user_id, user_data_only, load_options=user_load_profile.options)
 
         # Update Submit Nodes if patched
         if user.submit_nodes is not None:
@@ -110,36 +151,42 @@ async def update_user(user_id: int, user: UserPatchFull, session=Depends(session
 
         # Expire the instance to force a fresh load from the database
         session.expire(updated_user)
-        updated_user = await get_one_endpoint(session, UserTable, user_id, load_options=user_load_options)
+        updated_user = await get_one_endpoint(session, UserTable, user_id, load_options=user_load_profile.options)
 
         return updated_user
 
     raise HTTPException(status_code=404, detail="User not found")
 
 
-@router.get("/{user_id}/projects")
-async def get_user_projects(user_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator), check_is_user=Depends(check_is_user)) -> list[JoinedProjectViewSchema]:
+@router.get("/{user_id}/projects", dependencies=[Depends(list_statement_timeout)])
+async def get_user_projects(user_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), check_is_user=Depends(check_is_user)) -> list[JoinedProjectViewSchema]:
     """Get projects associated with a user"""
 
     filter_query_params.append(('id', f"eq.{user_id}"))
-    return await list_endpoint(session, JoinedProjectViewTable, response, filter_query_params, page, page_size)
+    projects = await list_endpoint(session, JoinedProjectViewTable, response, filter_query_params, page, page_size, load_options=joined_project_load_profile.options, cursor=cursor, count=count)
+
+    # Sparse fieldsets are already serialized
+    if isinstance(projects, Response):
+        return projects
+
+    return serialize_response(list[JoinedProjectViewSchema], projects, response)
 
 
-@router.get("/{user_id}/submit_nodes")
-async def get_user_submit_nodes(user_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator), check_is_user=Depends(check_is_user)) -> list[UserSubmitGet]:
+@router.get("/{user_id}/submit_nodes", dependencies=[Depends(list_statement_timeout)])
+async def get_user_submit_nodes(user_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), check_is_user=Depends(check_is_user)) -> list[UserSubmitGet]:
     """Get submit nodes associated with a user"""
 
     select_stmt = select(UserSubmitNodesViewTable).where(UserSubmitNodesViewTable.user_id == user_id)
-    return await list_select_stmt(session, select_stmt, UserSubmitNodesViewTable, response, filter_query_params, page, page_size)
+    return await list_select_stmt(session, select_stmt, UserSubmitNodesViewTable, response, filter_query_params, page, page_size, cursor=cursor, count=count)
 
 
-@router.get("/{user_id}/groups")
-async def get_user_groups(user_id: int, response: Response, page: int = 0, page_size: int = 100, filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator), check_is_user=Depends(check_is_user)) -> list[UserGroupViewSchema]:
+@router.get("/{user_id}/groups", dependencies=[Depends(list_statement_timeout)])
+async def get_user_groups(user_id: int, response: Response, page: int = 0, page_size: int = 100, cursor: str | None = None, count: CountStrategy = "exact", filter_query_params=Depends(get_filter_query_params), session=Depends(session_generator, scope="function"), check_is_user=Depends(check_is_user)) -> list[UserGroupViewSchema]:
     """Get groups associated with a user"""
 
     # Join Group to User via the UserGroups association table and filter by user_id
     select_stmt = select(UserGroupViewTable).where(UserGroupViewTable.user_id == user_id)
-    return await list_select_stmt(session, select_stmt, UserGroupViewTable, response, filter_query_params, page, page_size)
+    return await list_select_stmt(session, select_stmt, UserGroupViewTable, response, filter_query_params, page, page_size, load_options=user_group_load_profile.options, cursor=cursor, count=count)
 
 
 @router.patch("/{user_id}/projects/{project_id}")
@@ -147,7 +194,7 @@ async def patch_user_project(
     user_id: int,
     project_id: int,
     patch: UserProjectPatch,
-    session=Depends(session_generator),
+    session=Depends(session_generator, scope="function"),
     check_is_admin=Depends(check_is_admin),
 ) -> JoinedProjectViewSchema:
     """Patch a user's membership in a project (role, is_primary, managed_by)."""
@@ -159,7 +206,7 @@ async def patch_user_group(
     user_id: int,
     group_id: int,
     patch: UserGroupPatch,
-    session=Depends(session_generator),
+    session=Depends(session_generator, scope="function"),
     check_is_admin=Depends(check_is_admin),
 ) -> UserGroupViewSchema:
     """Patch a user's membership in a group (managed_by)."""
@@ -0,0 +1,62 @@
+#
+# Response serialization
+#
+# FastAPI validates a route's return value against its response model before dumping it. For rows read
+# from the database that validation is mostly repeated work: every stored email is re-parsed even though
+# it was validated when it was written. serialize_response validates rows once with a TypeAdapter compiled
+# per response type, in the FROM_DATABASE context which skips those checks, and dumps them straight to
+# JSON bytes.
+#
+# benchmarks/serialization.py compares it to FastAPI's response model path.
+#
+
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+# Validation context of rows read back from the database, see userapp.core.schemas.general.EmailStr
+FROM_DATABASE = {"from_database": True}
+
+
+@lru_cache()
+def get_response_adapter(response_type: Any) -> TypeAdapter:
+    """The compiled TypeAdapter of a response type such as UserGetFull or list[UserGetFull]"""
+
+    return TypeAdapter(response_type)
+
+
+def serialize_rows(response_type: Any, content: Any, exclude=None) -> bytes:
+    """Validates ORM rows against the response type and dumps them as JSON bytes"""
+
+    adapter = get_response_adapter(response_type)
+    value = adapter.validate_python(content, from_attributes=True, context=FROM_DATABASE)
+
+    return adapter.dump_json(value, by_alias=True, exclude=exclude)
+
+
+def serialize_response(response_type: Any, content: Any, response: Response | None = None, exclude=None) -> Response:
+    """Returns ORM rows serialized as the response type, in place of the route's response model
+
+    Headers set on the injected response (X-Total-Count, ETag, ...) are not merged into a returned response so
+    they are copied over.
+    """
+
+    serialized = Response(content=serialize_rows(response_type, content, exclude=exclude), media_type="application/json")
+
+    if response is not None:
+        copy_headers(response, serialized)
+
+    return serialized
+
+
+def copy_headers(source: Response, target: Response) -> None:
+    """Appends the headers set on source to target, each value of a repeated header such as Set-Cookie or Vary
+
+    The target's own content-type and content-length are kept.
+    """
+
+    target.raw_headers.extend(
+        (name, value) for name, value in source.raw_headers if name not in (b"content-type", b"content-length")
+    )
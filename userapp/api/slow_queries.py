@@ -0,0 +1,153 @@
+#
+# Slow query log
+#
+# Every statement taking longer than SLOW_QUERY_THRESHOLD milliseconds is logged with its SQL (as sent, with
+# $1 placeholders rather than values), the types of its parameters, the route that ran it and how long it
+# took, and kept in a per worker ring buffer shown by GET /status/slow-queries.
+#
+# SLOW_QUERY_EXPLAIN_RATE of the slow SELECTs are run again under EXPLAIN (ANALYZE, BUFFERS) on a connection
+# of their own, in a transaction that is rolled back, and the plan is stored with the entry. ANALYZE runs the
+# statement again, so none are by default, and each is cancelled after SLOW_QUERY_EXPLAIN_TIMEOUT milliseconds.
+# One is run at a time and they are not themselves recorded.
+#
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from userapp.api.instrumentation import get_request_metrics
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds a statement has to run for to be recorded, 0 disables the log
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "1000"))
+# Fraction of the slow SELECTs whose plan is captured, 0 disables capturing plans
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0"))
+# Milliseconds capturing a plan may run for, the statement being explained already took SLOW_QUERY_THRESHOLD
+SLOW_QUERY_EXPLAIN_TIMEOUT = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", "5000"))
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "100"))
+
+# Set in the task capturing a plan so its own statements are not recorded
+_capturing_plan: contextvars.ContextVar[bool] = contextvars.ContextVar("capturing_plan", default=False)
+
+
+@dataclass
+class SlowQuery:
+    id: int
+    statement: str
+    parameter_types: list[str]
+    duration_ms: float
+    method: str | None
+    route: str | None
+    recorded_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    plan: list | None = None
+
+
+class SlowQueryLog:
+    """The most recent slow queries of this worker"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE, explain_timeout_ms: int = SLOW_QUERY_EXPLAIN_TIMEOUT, max_entries: int = SLOW_QUERY_MAX_ENTRIES):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.explain_timeout_ms = explain_timeout_ms
+        self.entries: deque[SlowQuery] = deque(maxlen=max_entries)
+        self._ids = itertools.count(1)
+        self._capture_task: asyncio.Task | None = None
+
+    def __iter__(self):
+        return reversed(self.entries)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def record(self, engine: Engine, statement: str, parameters, duration_ms: float, executemany: bool = False) -> SlowQuery:
+        metrics = get_request_metrics()
+        scope = metrics.scope if metrics is not None else None
+
+        slow_query = SlowQuery(
+            id=next(self._ids),
+            statement=" ".join(statement.split()),
+            # executemany, the types of the first row
+            parameter_types=_parameter_types(parameters[0] if executemany and parameters else parameters),
+            duration_ms=round(duration_ms, 1),
+            method=scope["method"] if scope is not None else None,
+            route=metrics.route if metrics is not None else None,
+        )
+        self.entries.append(slow_query)
+
+        logger.warning(
+            f"Slow query, {slow_query.duration_ms} ms in {slow_query.method} {slow_query.route}: "
+            f"{slow_query.statement} {slow_query.parameter_types}"
+        )
+
+        if not executemany and self._should_capture_plan(engine, statement):
+            # An empty context so the plan's statements aren't counted against the request
+            self._capture_task = asyncio.get_running_loop().create_task(
+                self.capture_plan(engine, slow_query, statement, parameters), context=contextvars.Context()
+            )
+
+        return slow_query
+
+    def _should_capture_plan(self, engine: Engine, statement: str) -> bool:
+        if not engine.dialect.is_async or not statement.lstrip().upper().startswith("SELECT"):
+            return False
+
+        # Such as migrations, which run on a sync engine in a thread
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        if self._capture_task is not None and not self._capture_task.done():
+            return False
+
+        return random.random() < self.explain_rate
+
+    async def capture_plan(self, engine: Engine, slow_query: SlowQuery, statement: str, parameters) -> None:
+        _capturing_plan.set(True)
+
+        try:
+            # Reads run in autocommit, the rollback has to undo whatever ANALYZE did
+            transactional_engine = engine.execution_options(isolation_level=engine.dialect.default_isolation_level)
+
+            async with AsyncEngine(transactional_engine).connect() as connection:
+                try:
+                    await connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                    result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+                    slow_query.plan = result.scalar()
+                finally:
+                    await connection.rollback()
+        except Exception as e:
+            logger.warning(f"Could not capture the plan of slow query {slow_query.id}: {e}")
+
+
+def _parameter_types(parameters) -> list[str]:
+    if isinstance(parameters, dict):
+        parameters = parameters.values()
+
+    return [type(parameter).__name__ for parameter in parameters or ()]
+
+
+slow_query_log = SlowQueryLog()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_slow_query(conn, cursor, statement, parameters, context, executemany):
+    statement_start = getattr(context, "statement_start", None)
+    if not slow_query_log.threshold_ms or statement_start is None or _capturing_plan.get():
+        return
+
+    duration_ms = (time.perf_counter() - statement_start) * 1000
+    if duration_ms >= slow_query_log.threshold_ms:
+        slow_query_log.record(conn.engine, statement, parameters, duration_ms, executemany)
@@ -84,8 +84,8 @@ def existing_admin_user() -> dict:
     }
 
 
-def _make_auth_client(user: dict) -> Generator[TestClient, Any, None]:
-    with TestClient(create_app()) as client:
+def _make_auth_client(user: dict, client: tuple[str, int] = ("testclient", 50000)) -> Generator[TestClient, Any, None]:
+    with TestClient(create_app(), client=client) as client:
         session_id = "test-session-admin"
 
         login_jwt = create_login_token(
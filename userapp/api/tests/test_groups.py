@@ -392,3 +392,14 @@ class TestGroups:
         )
 
         assert response.status_code == 404, "Getting a deleted group should return a 404 status code"
+
+    def test_lookup_groups(self, admin_client, group):
+        """Test looking up groups by name returns them in request order with misses listed"""
+
+        response = admin_client.post("/groups/lookup", json={"names": ["no_such_group", group['name']]})
+
+        assert response.status_code == 200, f"Looking up groups should return a 200 status code, instead got {response.text}"
+        data = response.json()
+        assert data['results'][0] == {"key": "no_such_group", "item": None}
+        assert data['results'][1]['item']['id'] == group['id']
+        assert data['missing'] == ["no_such_group"]
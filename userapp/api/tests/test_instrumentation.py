@@ -0,0 +1,79 @@
+import logging
+import random
+import re
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from starlette.testclient import TestClient
+
+from userapp.api.instrumentation import ServerTimingMiddleware
+from userapp.api.tests.conftest import _seed_db_url
+from userapp.db import connect_engine
+
+
+def server_timing(response) -> dict[str, str]:
+    """The Server-Timing header as {metric: its parameters}"""
+
+    return dict(
+        metric.strip().split(";", 1) if ";" in metric else (metric.strip(), "")
+        for metric in response.headers["Server-Timing"].split(",")
+    )
+
+
+@pytest.fixture
+def repeating_client():
+    """Client of an app whose /repeat?times=n runs the same statement n times"""
+
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware, repeat_threshold=3)
+
+    @app.get("/repeat")
+    async def repeat(times: int):
+        engine = await connect_engine(_seed_db_url())
+        try:
+            async with engine.connect() as connection:
+                for _ in range(times):
+                    await connection.execute(text("SELECT 1"))
+        finally:
+            await engine.dispose()
+
+    with TestClient(app) as client:
+        yield client
+
+
+class TestServerTiming:
+
+    def test_server_timing(self, admin_client):
+        # Not served from the response cache
+        response = admin_client.get(f"/groups?page_size=5&name=ne.server-timing-{random.randint(1, 10000000)}")
+
+        assert response.status_code == 200
+        timing = server_timing(response)
+        assert {"db", "serialize", "total"} <= timing.keys()
+
+        queries = int(re.search(r'desc="(\d+) queries"', timing["db"]).group(1))
+        assert queries > 0
+
+    def test_no_queries(self, admin_client):
+        """A request that never queried has no serialize timing"""
+
+        timing = server_timing(admin_client.get("/status/pool"))
+
+        assert 'desc="0 queries"' in timing["db"]
+        assert "serialize" not in timing
+        assert "total" in timing
+
+    def test_repeated_statement_logged(self, repeating_client, caplog):
+        with caplog.at_level(logging.WARNING, logger="userapp.api.instrumentation"):
+            repeating_client.get("/repeat?times=4")
+
+        assert "GET /repeat" in caplog.text
+        assert "4x SELECT 1" in caplog.text
+
+    def test_below_threshold_not_logged(self, repeating_client, caplog):
+        with caplog.at_level(logging.WARNING, logger="userapp.api.instrumentation"):
+            response = repeating_client.get("/repeat?times=3")
+
+        assert 'desc="3 queries"' in server_timing(response)["db"]
+        assert caplog.text == ""
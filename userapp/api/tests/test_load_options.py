@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from userapp.api.load_options import LoadProfile, user_load_profile, group_load_profile, project_load_profile, \
+    joined_project_load_profile, user_group_load_profile, note_load_profile, base_form_load_profile, \
+    user_application_load_profile, token_load_profile
+
+
+@contextmanager
+def count_statements():
+    """Collects every statement sent to the database while open, other than the SET LOCALs of route dependencies"""
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("SET LOCAL"):
+            statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestLoadProfiles:
+
+    @pytest.mark.parametrize("url,profile", [
+        ("/users?id=eq.{user_id}", user_load_profile),
+        ("/users/{user_id}", user_load_profile),
+        ("/users/{user_id}/projects", joined_project_load_profile),
+        ("/users/{user_id}/groups", user_group_load_profile),
+        ("/groups?page_size=20", group_load_profile),
+        ("/groups/{group_id}", group_load_profile),
+        ("/projects?page_size=20", project_load_profile),
+        ("/projects/{project_id}", project_load_profile),
+        ("/projects/{project_id}/users", joined_project_load_profile),
+        ("/projects/{project_id}/notes", note_load_profile),
+        ("/forms?page_size=20", base_form_load_profile),
+        ("/forms/user-applications?page_size=20", user_application_load_profile),
+        ("/tokens?page_size=20", token_load_profile),
+    ])
+    def test_statements_within_profile(self, admin_client, filled_out_project, group, url: str, profile: LoadProfile):
+        """Test an endpoint issues no more statements than its loading profile allows"""
+
+        user = filled_out_project['users'][0]
+        note_response = admin_client.post(
+            f"/projects/{filled_out_project['id']}/notes",
+            json={"note": "Load profile note", "users": [user['id']]}
+        )
+        assert note_response.status_code == 201
+
+        url = url.format(user_id=user['id'], group_id=group['id'], project_id=filled_out_project['id'])
+
+        # Warm up the connection so only the endpoint's statements are counted
+        admin_client.get(url)
+        with count_statements() as statements:
+            response = admin_client.get(url)
+
+        assert response.status_code == 200, f"Getting {url} should return a 200 status code, instead got {response.text}"
+        assert len(statements) <= profile.max_statements, \
+            f"{url} issued {len(statements)} statements, the {profile.name} profile allows {profile.max_statements}:\n" + "\n".join(statements)
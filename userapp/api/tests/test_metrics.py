@@ -0,0 +1,153 @@
+import os
+import random
+import re
+import subprocess
+
+import pytest
+
+from userapp.api.metrics import Counter, Gauge, Histogram, MultiprocessMetrics, render
+from userapp.api.tests.conftest import INVALID_CIDR_RANGE, VALID_CIDR_RANGE, WHITE_IP, _make_auth_client
+
+
+def sample(metrics: str, name: str, **labels) -> float | None:
+    """The value of one sample in a Prometheus text response, None if it isn't there"""
+
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(f"{name}{{{label_text}}}" if labels else name) + r" (\S+)$"
+    match = re.search(pattern, metrics, re.MULTILINE)
+
+    return float(match.group(1)) if match else None
+
+
+@pytest.fixture
+def metrics_client(monkeypatch, admin_user):
+    """Admin client requesting from an IP of METRICS_IP_WHITELIST"""
+
+    monkeypatch.setenv("METRICS_IP_WHITELIST", VALID_CIDR_RANGE)
+    yield from _make_auth_client(admin_user, client=(WHITE_IP, 443))
+
+
+class TestMetrics:
+
+    def test_request_metrics(self, metrics_client):
+        metrics_client.get(f"/groups?page_size=1&name=ne.metrics-{random.randint(1, 10000000)}")
+
+        response = metrics_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+        metrics = response.text
+        assert sample(metrics, "userapp_http_requests_total", method="GET", route="/groups", status="200") >= 1
+        assert sample(metrics, "userapp_http_request_duration_seconds_count", method="GET", route="/groups") >= 1
+        assert sample(metrics, "userapp_http_request_duration_seconds_bucket", method="GET", route="/groups", le="+Inf") >= 1
+        assert sample(metrics, "userapp_http_response_size_bytes_sum", method="GET", route="/groups") > 0
+
+        # The scrape itself is in flight
+        assert sample(metrics, "userapp_http_requests_in_flight", method="GET") >= 1
+
+    def test_pool_metrics(self, metrics_client):
+        metrics_client.get("/groups/1")
+
+        metrics = metrics_client.get("/metrics").text
+
+        assert sample(metrics, "userapp_db_pool_size", database="primary") == 5
+        assert sample(metrics, "userapp_db_pool_checkouts_total", database="primary") >= 1
+        assert sample(metrics, "userapp_db_pool_checked_out", database="replica") is None
+
+    def test_commit_duration(self, metrics_client):
+        response = metrics_client.post("/groups", json={"name": f"metrics_{random.randint(1, 10000000)}"})
+        assert response.status_code == 201, response.text
+
+        metrics = metrics_client.get("/metrics").text
+        assert sample(metrics, "userapp_db_commit_duration_seconds_count") >= 1
+
+        metrics_client.delete(f"/groups/{response.json()['id']}")
+
+    def test_unmatched_route(self, metrics_client):
+        """Paths that match no route share one series"""
+
+        assert metrics_client.get(f"/no-such-route-{random.randint(1, 10000000)}").status_code == 404
+
+        metrics = metrics_client.get("/metrics").text
+        assert sample(metrics, "userapp_http_requests_total", method="GET", route="unmatched", status="404") >= 1
+
+    def test_ip_whitelist(self, metrics_client, monkeypatch):
+        monkeypatch.setenv("METRICS_IP_WHITELIST", INVALID_CIDR_RANGE)
+
+        assert metrics_client.get("/metrics").status_code == 403
+
+    def test_denied_without_whitelist(self, api_client, monkeypatch):
+        monkeypatch.delenv("METRICS_IP_WHITELIST", raising=False)
+
+        assert api_client.get("/metrics").status_code == 403
+
+    def test_pool_max_overflow(self, metrics_client):
+        metrics = metrics_client.get("/metrics").text
+
+        assert sample(metrics, "userapp_db_pool_max_overflow", database="primary") == 10
+
+    def test_histogram_buckets_cumulative(self):
+        histogram = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1))
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(value, route="/test")
+
+        metrics = histogram.render()
+
+        assert sample(metrics, "test_seconds_bucket", route="/test", le="0.1") == 1
+        assert sample(metrics, "test_seconds_bucket", route="/test", le="1.0") == 3
+        assert sample(metrics, "test_seconds_bucket", route="/test", le="+Inf") == 4
+        assert sample(metrics, "test_seconds_sum", route="/test") == 6.05
+        assert sample(metrics, "test_seconds_count", route="/test") == 4
+
+
+@pytest.fixture
+def stopped_pid() -> int:
+    """The pid of a process that has exited"""
+
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def worker_metrics() -> list:
+    return [
+        Counter("test_total", "Test", ("route",)),
+        Gauge("test_in_flight", "Test"),
+        Gauge("test_wait_max", "Test", aggregate="max"),
+        Histogram("test_seconds", "Test", buckets=(0.1, 1)),
+    ]
+
+
+class TestMultiprocessMetrics:
+
+    def test_merged_across_workers(self, tmp_path, stopped_pid):
+        for pid, value in [(os.getpid(), 1), (os.getppid(), 2), (stopped_pid, 4)]:
+            total, in_flight, wait_max, seconds = metrics = worker_metrics()
+            total.inc(value, route="/test")
+            in_flight.set(value)
+            wait_max.set(value)
+            seconds.observe(value / 10)
+            MultiprocessMetrics(str(tmp_path), pid).write(metrics)
+
+        metrics = render(MultiprocessMetrics(str(tmp_path)).collect(worker_metrics()))
+
+        # The stopped worker's requests still count, its gauges don't
+        assert sample(metrics, "test_total", route="/test") == 7
+        assert sample(metrics, "test_in_flight") == 3
+        assert sample(metrics, "test_wait_max") == 2
+        assert sample(metrics, "test_seconds_bucket", le="0.1") == 1
+        assert sample(metrics, "test_seconds_bucket", le="1.0") == 3
+        assert sample(metrics, "test_seconds_count") == 3
+
+    def test_rewritten(self, tmp_path):
+        multiprocess = MultiprocessMetrics(str(tmp_path))
+        total = Counter("test_total", "Test")
+
+        total.inc()
+        multiprocess.write([total])
+        total.inc()
+        multiprocess.write([total])
+
+        assert sample(render(multiprocess.collect([total])), "test_total") == 2
+        assert os.listdir(tmp_path) == [f"{os.getpid()}.json"]
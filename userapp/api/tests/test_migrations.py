@@ -0,0 +1,107 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from userapp import migrations
+from userapp.api.tests.conftest import _seed_db_url
+from userapp.core.models.main import Base
+from userapp.core.models.tables import User
+from userapp.db import connect_engine
+from userapp.migrations import MIGRATION_LOCK_KEY, PROJECT_ROOT, include_object, migrate, script_heads
+
+
+class TestMigrations:
+
+    def test_script_heads(self):
+        """The heads read from the scripts' revision lines match Alembic's"""
+
+        config = AlembicConfig(str(PROJECT_ROOT / "alembic.ini"))
+        config.set_main_option("script_location", str(PROJECT_ROOT / "alembic"))
+
+        assert script_heads() == set(ScriptDirectory.from_config(config).get_heads())
+
+    def test_current_database_skipped(self, monkeypatch):
+        """A database at head is not migrated, nor waits for the lock"""
+
+        monkeypatch.setattr(migrations, "run_migrations", lambda db_url: pytest.fail("Should not have migrated"))
+
+        async def migrate_while_locked():
+            engine = await connect_engine(_seed_db_url())
+            try:
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                    try:
+                        return await asyncio.wait_for(migrate(_seed_db_url()), timeout=5)
+                    finally:
+                        await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            finally:
+                await engine.dispose()
+
+        assert asyncio.run(migrate_while_locked()) is False
+
+    def test_waits_for_lock(self, monkeypatch):
+        """Only one process migrates at a time"""
+
+        migrated = []
+        monkeypatch.setattr(migrations, "script_heads", lambda: {"not-yet-applied"})
+        monkeypatch.setattr(migrations, "run_migrations", migrated.append)
+        monkeypatch.setattr(migrations, "MIGRATION_LOCK_POLL_INTERVAL", 0.05)
+
+        async def migrate_after_lock_released():
+            engine = await connect_engine(_seed_db_url())
+            try:
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+                    migration = asyncio.create_task(migrate(_seed_db_url()))
+                    await asyncio.sleep(0.5)
+                    assert not migration.done() and migrated == []
+
+                    await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                    return await asyncio.wait_for(migration, timeout=5)
+            finally:
+                await engine.dispose()
+
+        assert asyncio.run(migrate_after_lock_released()) is True
+        assert migrated == [_seed_db_url()]
+
+    def test_migrate_command(self):
+        result = subprocess.run([sys.executable, "-m", "userapp", "migrate"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0, result.stderr
+        assert "latest migration" in result.stderr
+
+    def test_include_object_skips_missing_extension(self):
+        trigram_index = next(index for index in User.__table__.indexes if index.name == "ix_users_name_trgm")
+
+        assert include_object(set())(trigram_index, trigram_index.name, "index", False, None) is False
+        assert include_object({"pg_trgm"})(trigram_index, trigram_index.name, "index", False, None) is True
+
+    def test_search_indexes_match_models(self):
+        """Autogenerate finds no drift in the search indexes, whether or not the trigram ones were created"""
+
+        def search_index_diffs(connection) -> list:
+            installed_extensions = set(connection.execute(text("SELECT extname FROM pg_extension")).scalars())
+            context = MigrationContext.configure(connection, opts={"include_object": include_object(installed_extensions)})
+
+            return [
+                diff for diff in compare_metadata(context, Base.metadata)
+                if diff[0].endswith("_index") and diff[1].name.endswith(("_trgm", "_pattern"))
+            ]
+
+        async def diffs():
+            engine = await connect_engine(_seed_db_url())
+            try:
+                async with engine.connect() as connection:
+                    return await connection.run_sync(search_index_diffs)
+            finally:
+                await engine.dispose()
+
+        assert asyncio.run(diffs()) == []
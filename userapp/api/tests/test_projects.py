@@ -246,3 +246,19 @@ class TestProjects:
         # Clean up
         admin_client.delete(f"/projects/{project['id']}/users/{user['id']}")
 
+    def test_lookup_projects(self, admin_client, project_factory):
+        """Test looking up projects by id keeps the request order, repeats included"""
+
+        first_project = project_factory()
+        second_project = project_factory()
+
+        response = admin_client.post("/projects/lookup", json={"ids": [second_project['id'], first_project['id'], second_project['id']]})
+
+        assert response.status_code == 200, f"Looking up projects should return a 200 status code, instead got {response.text}"
+        data = response.json()
+        assert [result['item']['id'] for result in data['results']] == [second_project['id'], first_project['id'], second_project['id']]
+        assert data['results'][0]['item']['staff1'] is not None
+        assert data['missing'] == []
+
+        for project in (first_project, second_project):
+            admin_client.delete(f"/projects/{project['id']}")
@@ -1,8 +1,12 @@
-from sqlalchemy import Table, MetaData, Column, String, Integer
+import gc
+import weakref
+
+from fastapi import HTTPException
+from sqlalchemy import Table, MetaData, Column, String, Integer, select
 
 import pytest
 
-from userapp.query_parser import QueryParser, ParserException
+from userapp.query_parser import QueryParser, ParserException, RelationshipFilter
 
 from sqlalchemy.sql.expression import SQLColumnExpression
 
@@ -20,6 +24,22 @@ TEST_TABLE = Table(
     Column("int_column", Integer)
 )
 
+TEST_RELATED_TABLE = Table(
+    "test_related_table",
+    MetaData(),
+    Column("test_id", Integer),
+    Column("name", String),
+    Column("secret", String)
+)
+
+TEST_RELATIONSHIP_FILTERS = {
+    "related": RelationshipFilter(
+        local_key=TEST_TABLE.c.int_column,
+        remote_key=TEST_RELATED_TABLE.c.test_id,
+        columns=("name",),
+    )
+}
+
 
 class TestParser:
 
@@ -86,6 +106,46 @@ class TestParser:
 
         assert compile_statement(sql) == "test_table.string_column LIKE '%its rock time%'"
 
+    def test_startswith(self):
+        params = {
+            "string_column": "startswith.clo"
+        }
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params.items())
+        sql = query_parser.where_expressions()
+
+        assert compile_statement(sql) == "test_table.string_column LIKE 'clo%'"
+
+    def test_istartswith(self):
+        params = {
+            "string_column": "istartswith.Clo"
+        }
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params.items())
+        sql = query_parser.where_expressions()
+
+        assert compile_statement(sql) == "lower(test_table.string_column) LIKE 'clo%'"
+
+    def test_startswith_escapes_wildcards(self):
+        params = {
+            "string_column": "startswith.50%25_off"
+        }
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params.items())
+        sql = query_parser.where_expressions()
+
+        assert compile_statement(sql) == "test_table.string_column LIKE '50\\%\\_off%'"
+
+    def test_startswith_not_text(self):
+        params = {
+            "int_column": "startswith.1"
+        }
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params.items())
+
+        with pytest.raises(ParserException):
+            query_parser.where_expressions()
+
     def test_is_null(self):
         params = {
             "int_column": "is.null"
@@ -240,3 +300,90 @@ class TestParser:
 
         with pytest.raises(ParserException):
             query_parser.where_expressions()
+
+    def test_select(self):
+        params = [
+            ("select", "string_column,int_column"),
+            ("int_column", "eq.1"),
+        ]
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params)
+
+        assert [c.name for c in query_parser.get_projection_columns()] == ["string_column", "int_column"]
+        assert compile_statement(query_parser.where_expressions()) == "test_table.int_column = 1"
+
+    def test_no_select(self):
+        params = {
+            "int_column": "eq.1"
+        }
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params.items())
+
+        assert query_parser.get_projection_columns() is None
+
+    def test_compiled_query_shared(self):
+        """Parsers of the same query should share one compiled query"""
+
+        params = [("int_column", "eq.1"), ("string_column", "like.test")]
+
+        first_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params)
+        second_parser = QueryParser(columns=TEST_TABLE.columns, query_params=[*params])
+
+        assert first_parser.compiled_query is second_parser.compiled_query
+        assert compile_statement(first_parser.where_expressions()) == compile_statement(second_parser.where_expressions())
+
+    def test_compiled_query_invalid_not_cached(self):
+        """A query that fails to parse should still fail on every request"""
+
+        params = {"int_column": "eq.not-an-int"}
+
+        for _ in range(2):
+            with pytest.raises(ParserException):
+                QueryParser(columns=TEST_TABLE.columns, query_params=params.items()).where_expressions()
+
+    def test_parser_not_retained(self):
+        """Parsers should be freed once the request is done with them"""
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=[("int_column", "group_by")])
+        query_parser.get_group_by_column()
+        query_parser.where_expressions()
+
+        query_parser_ref = weakref.ref(query_parser)
+        del query_parser
+        gc.collect()
+
+        assert query_parser_ref() is None
+
+    def test_relationship_filter(self):
+        params = [
+            ("related.name", "eq.foo"),
+            ("related.name", "ne.bar"),
+            ("int_column", "eq.1"),
+        ]
+
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=params, relationship_filters=TEST_RELATIONSHIP_FILTERS)
+        sql = compile_statement(select(TEST_TABLE.c.int_column).where(query_parser.where_expressions()))
+
+        # Filters on one relationship are met by the same related row
+        assert sql == (
+            "SELECT test_table.int_column \n"
+            "FROM test_table \n"
+            "WHERE test_table.int_column = 1 AND (EXISTS (SELECT * \n"
+            "FROM test_related_table \n"
+            "WHERE test_related_table.test_id = test_table.int_column AND test_related_table.name = 'foo' AND test_related_table.name != 'bar'))"
+        )
+
+    def test_relationship_filter_not_whitelisted(self):
+        for column_name in ["related.secret", "unknown.name"]:
+            query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=[(column_name, "eq.foo")], relationship_filters=TEST_RELATIONSHIP_FILTERS)
+
+            with pytest.raises(HTTPException) as exception_info:
+                query_parser.where_expressions()
+
+            assert exception_info.value.status_code == 400
+
+    def test_relationship_filter_order_by(self):
+        query_parser = QueryParser(columns=TEST_TABLE.columns, query_params=[("related.name", "order_by.asc")], relationship_filters=TEST_RELATIONSHIP_FILTERS)
+
+        with pytest.raises(HTTPException):
+            query_parser.get_order_by_columns()
@@ -35,6 +35,16 @@ class TestSecurity:
         data = response.json()
         assert data['id'] == user['id']
 
+    def test_user_client_embed(self, user, nonadmin_client):
+        """Test that /me only embeds the requested relationships"""
+
+        response = nonadmin_client.get("/me?embed=groups")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['id'] == user['id']
+        assert "groups" in data and "projects" not in data
+
     def test_hash_password(self):
         """Test that password hashing and verification works correctly"""
 
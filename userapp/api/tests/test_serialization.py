@@ -0,0 +1,47 @@
+import pytest
+from pydantic import ValidationError
+from starlette.responses import Response
+
+from userapp.api.serialization import serialize_response, serialize_rows
+from userapp.core.models.tables import User
+from userapp.core.schemas.users import UserGet, UserPost
+
+
+class TestSerialization:
+
+    def test_matches_response_model(self, admin_client, user):
+        """Users serialized from rows should match the response model's output"""
+
+        response = admin_client.get(f"/users?id=eq.{user['id']}")
+
+        assert response.status_code == 200
+        assert response.json()[0] == admin_client.get(f"/users/{user['id']}").json()
+
+    def test_stored_emails_not_revalidated(self):
+        """Emails read back from the database were validated on write and are passed through"""
+
+        rows = [User(id=1, name="Legacy User", email1="legacy@localhost", active=True)]
+
+        assert serialize_rows(list[UserGet], rows) == \
+            b'[{"id":1,"name":"Legacy User","username":null,"email1":"legacy@localhost","email2":null,"netid":null,' \
+            b'"netid_exp_datetime":null,"phone1":null,"phone2":null,"is_admin":null,"active":true,"date":null,' \
+            b'"unix_uid":null,"position":null,"created_at":null,"updated_at":null,"auth_netid":false,"auth_username":false}]'
+
+    def test_request_emails_validated(self):
+        with pytest.raises(ValidationError):
+            UserPost(name="New User", email1="not-an-email")
+
+    def test_repeated_headers_kept(self):
+        """Every value of a header set more than once on the injected response is copied over"""
+
+        response = Response()
+        del response.headers["content-length"]
+        response.headers.append("Set-Cookie", "a=1")
+        response.headers.append("Set-Cookie", "b=2")
+        response.headers["X-Total-Count"] = "1"
+
+        serialized = serialize_response(list[UserGet], [], response)
+
+        assert serialized.headers.getlist("set-cookie") == ["a=1", "b=2"]
+        assert serialized.headers["x-total-count"] == "1"
+        assert serialized.headers["content-length"] == "2"
@@ -0,0 +1,139 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from userapp import server
+from userapp.migrations import PROJECT_ROOT
+from userapp.server import ServerSettings, uvicorn_options
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def serving():
+    """A `python -m userapp serve` with two workers, and its port"""
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": "2",
+        "DB_MIGRATE_ON_STARTUP": "false",
+        "METRICS_IP_WHITELIST": "127.0.0.1/32",
+        "METRICS_SHARE_INTERVAL": "0.2",
+    }
+    env.pop("METRICS_MULTIPROC_DIR", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "userapp", "serve"], cwd=PROJECT_ROOT, env=env, stderr=subprocess.PIPE, text=True,
+    )
+
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs")
+            break
+        except httpx.TransportError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                pytest.fail(f"Server didn't start: {process.communicate()[1]}")
+            time.sleep(0.2)
+
+    yield process, port
+
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+class TestServer:
+
+    def test_uvicorn_options(self):
+        options = uvicorn_options(ServerSettings(SERVER_WORKERS=3, SERVER_KEEPALIVE_TIMEOUT=30, SERVER_BACKLOG=512))
+
+        assert options["workers"] == 3
+        assert options["timeout_keep_alive"] == 30
+        assert options["backlog"] == 512
+        assert options["timeout_graceful_shutdown"] == 25
+
+    def test_one_worker_by_default(self, monkeypatch):
+        monkeypatch.delenv("SERVER_WORKERS", raising=False)
+        monkeypatch.setattr(os, "cpu_count", lambda: 6)
+
+        assert uvicorn_options(ServerSettings())["workers"] == 1
+
+    @pytest.mark.parametrize("workers, ttl", [(1, "30"), (2, "0")])
+    def test_response_cache_off_with_workers(self, monkeypatch, tmp_path, workers, ttl):
+        monkeypatch.setenv("RESPONSE_CACHE_TTL", "30")
+        monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setattr("uvicorn.run", lambda app, **options: None)
+
+        server.serve(ServerSettings(SERVER_WORKERS=workers))
+
+        assert os.environ["RESPONSE_CACHE_TTL"] == ttl
+
+    def test_metrics_dir_with_workers(self, monkeypatch, tmp_path):
+        (tmp_path / "1.json").write_text("{}")
+        monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setattr("uvicorn.run", lambda app, **options: None)
+
+        server.serve(ServerSettings(SERVER_WORKERS=2))
+
+        # The metrics of the previous run are dropped
+        assert os.listdir(tmp_path) == []
+
+    def test_temporary_metrics_dir(self, monkeypatch):
+        monkeypatch.setenv("METRICS_MULTIPROC_DIR", "")
+        dirs = []
+        monkeypatch.setattr("uvicorn.run", lambda app, **options: dirs.append(os.environ["METRICS_MULTIPROC_DIR"]))
+
+        server.serve(ServerSettings(SERVER_WORKERS=2))
+
+        assert dirs[0] and not os.path.exists(dirs[0])
+
+    @pytest.mark.parametrize("installed, loop, http", [
+        (True, "uvloop", "httptools"),
+        (False, "asyncio", "h11"),
+    ])
+    def test_loop_and_parser(self, monkeypatch, installed, loop, http):
+        monkeypatch.setattr(server, "_installed", lambda module: installed)
+
+        options = uvicorn_options(ServerSettings())
+
+        assert (options["loop"], options["http"]) == (loop, http)
+
+    def test_sigterm_stops_workers_gracefully(self, serving):
+        process, port = serving
+
+        assert httpx.get(f"http://127.0.0.1:{port}/docs").status_code == 200
+
+        process.send_signal(signal.SIGTERM)
+        _, stderr = process.communicate(timeout=60)
+
+        assert process.returncode == 0, stderr
+        # Each worker waits for its requests and runs the app's shutdown, disposing of its engines
+        assert stderr.count("Application shutdown complete") == 2
+        assert stderr.count("Finished server process") == 2
+
+    def test_metrics_of_all_workers(self, serving):
+        _, port = serving
+
+        for _ in range(20):
+            httpx.get(f"http://127.0.0.1:{port}/no-such-route")
+        # Until every worker has written its metrics
+        time.sleep(1)
+
+        # Whichever worker answers counts the requests of both
+        for _ in range(4):
+            metrics = httpx.get(f"http://127.0.0.1:{port}/metrics").text
+            assert 'userapp_http_requests_total{method="GET",route="unmatched",status="404"} 20' in metrics
@@ -0,0 +1,47 @@
+import importlib
+import os
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+from pydantic import BaseModel
+
+import userapp.core.schemas
+from benchmarks.import_time import IMPORT_TIME_BUDGET, PROJECT_ROOT, import_time
+
+# Only needed by some requests or commands, so not imported with the app
+LAZY_MODULES = ["alembic", "httpx", "passlib", "uvicorn"]
+
+
+class TestStartup:
+
+    # Timing depends on the machine's load, so the budget is only checked when asked for
+    @pytest.mark.skipif("IMPORT_TIME_BUDGET" not in os.environ, reason="set IMPORT_TIME_BUDGET to check import time")
+    def test_import_time_budget(self):
+        seconds = import_time("userapp.main")
+
+        assert seconds < IMPORT_TIME_BUDGET, \
+            f"import userapp.main took {seconds:.2f}s, over the {IMPORT_TIME_BUDGET}s budget, see python -m benchmarks.import_time"
+
+    def test_lazy_modules_not_imported(self):
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, userapp.main; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        )
+
+        assert result.stdout.split() == []
+
+    def test_schemas_complete(self):
+        """Every schema's forward references are resolved by importing the package"""
+
+        incomplete = []
+        for module_info in pkgutil.iter_modules(userapp.core.schemas.__path__):
+            module = importlib.import_module(f"userapp.core.schemas.{module_info.name}")
+
+            for name, value in vars(module).items():
+                if isinstance(value, type) and issubclass(value, BaseModel) and value.__module__ == module.__name__ \
+                        and not value.__pydantic_complete__:
+                    incomplete.append(f"{module.__name__}.{name}")
+
+        assert incomplete == []
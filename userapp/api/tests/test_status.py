@@ -0,0 +1,265 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Depends
+from fastapi.routing import APIRoute
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.requests import Request
+
+from userapp import db, main
+from userapp.api.slow_queries import SlowQueryLog, slow_query_log
+from userapp.api.tests.conftest import _seed_db_url, _make_auth_client
+from userapp.db import connect_engine, get_pool_stats, session_generator, set_statement_timeout, statement_timeout
+
+
+class TestStatus:
+
+    def test_pool_status(self, admin_client):
+        admin_client.get("/groups?page_size=1")
+
+        response = admin_client.get("/status/pool")
+
+        assert response.status_code == 200, f"Getting the pool status should return a 200 status code, instead got {response.text}"
+        data = response.json()
+        assert data['checkouts'] > 0
+        assert data['size'] == 5
+        assert data['checked_out'] <= data['size'] + data['max_overflow']
+
+    def test_pool_status_needs_admin(self, nonadmin_client):
+        assert nonadmin_client.get("/status/pool").status_code == 403
+
+    def test_pool_timeouts_counted(self):
+        """A checkout that times out waiting for a connection is counted"""
+
+        async def exhaust_pool():
+            engine = await connect_engine(_seed_db_url(), pool_size=1, max_overflow=0, pool_timeout=0.1)
+            try:
+                async with engine.connect():
+                    with pytest.raises(PoolTimeoutError):
+                        async with engine.connect():
+                            pass
+
+                return get_pool_stats(engine)
+            finally:
+                await engine.dispose()
+
+        stats = asyncio.run(exhaust_pool())
+
+        assert stats['checkouts'] == 1
+        assert stats['timeouts'] == 1
+        assert stats['wait_seconds_max'] >= 0.1
+
+
+@pytest.fixture
+def replica_client(monkeypatch, existing_admin_user):
+    """Admin client of an app whose replica is the test database itself"""
+
+    monkeypatch.setattr(main.settings, "DB_REPLICA_URL", _seed_db_url())
+    yield from _make_auth_client({**existing_admin_user, "is_admin": True})
+
+
+def checkouts(client) -> tuple[int, int]:
+    """Checkouts of the primary's and the replica's pools"""
+
+    state = client.app.state
+    return get_pool_stats(state.engine)['checkouts'], get_pool_stats(state.replica_engine)['checkouts']
+
+
+class TestReplica:
+
+    def test_get_reads_from_replica(self, replica_client):
+        replica_client.get("/status/replica")  # Checks the replica's lag
+
+        primary_checkouts, replica_checkouts = checkouts(replica_client)
+        response = replica_client.get("/groups?page_size=1&name=eq.replica-read")
+
+        assert response.status_code == 200
+        assert checkouts(replica_client) == (primary_checkouts, replica_checkouts + 1)
+
+    def test_writes_go_to_primary(self, replica_client):
+        replica_client.get("/status/replica")
+
+        primary_checkouts, replica_checkouts = checkouts(replica_client)
+        response = replica_client.post("/groups", json={"name": f"replica_write_{random.randint(1, 10000000)}"})
+
+        assert response.status_code == 201, response.text
+        assert checkouts(replica_client)[0] > primary_checkouts
+        assert checkouts(replica_client)[1] == replica_checkouts
+
+        replica_client.delete(f"/groups/{response.json()['id']}")
+
+    def test_use_primary(self, replica_client):
+        """/me reads back the user from the primary"""
+
+        replica_client.get("/status/replica")
+
+        primary_checkouts, replica_checkouts = checkouts(replica_client)
+        response = replica_client.get("/me")
+
+        assert response.status_code == 200
+        assert checkouts(replica_client)[0] > primary_checkouts
+        assert checkouts(replica_client)[1] == replica_checkouts
+
+    def test_lagging_replica_falls_back_to_primary(self, replica_client):
+        replica_monitor = replica_client.app.state.replica_monitor
+        replica_monitor.max_lag = -1
+
+        response = replica_client.get("/status/replica")
+        assert response.json()['healthy'] is False
+
+        primary_checkouts, replica_checkouts = checkouts(replica_client)
+        response = replica_client.get("/groups?page_size=1&name=eq.replica-fallback")
+
+        assert response.status_code == 200
+        assert checkouts(replica_client) == (primary_checkouts + 1, replica_checkouts)
+
+    def test_replica_not_streaming(self, replica_client, monkeypatch):
+        """A replica that has replayed everything it received but isn't streaming any more is left alone"""
+
+        monkeypatch.setattr(db, "REPLICA_LAG_QUERY", "SELECT false AS streaming, 0 AS lag")
+        replica_monitor = replica_client.app.state.replica_monitor
+
+        replica_client.portal.call(replica_monitor.check)
+
+        assert replica_monitor.healthy is False
+        assert replica_monitor.lag == 0
+
+    def test_no_replica(self, admin_client):
+        assert admin_client.get("/status/replica").status_code == 404
+
+
+def in_one_transaction(client, method: str, route=None) -> bool:
+    """Whether two statements of a request's session see the same transaction start"""
+
+    async def transaction_starts():
+        request = Request({"type": "http", "method": method, "app": client.app, "route": route, "headers": []})
+        sessions = session_generator(request)
+        session = await anext(sessions)
+        try:
+            first = (await session.execute(text("SELECT now()"))).scalar()
+            await session.execute(text("SELECT pg_sleep(0.01)"))
+            second = (await session.execute(text("SELECT now()"))).scalar()
+        finally:
+            await sessions.aclose()
+
+        return first, second
+
+    first, second = client.portal.call(transaction_starts)
+    return first == second
+
+
+class TestSession:
+
+    def test_no_checkout_without_statement(self, admin_client):
+        """A request that never queries, like this cookie authenticated one, doesn't take a connection"""
+
+        before = admin_client.get("/status/pool").json()['checkouts']
+        after = admin_client.get("/status/pool").json()['checkouts']
+
+        assert after == before
+
+    def test_connection_returned(self, admin_client):
+        assert admin_client.get("/groups?page_size=1").status_code == 200
+
+        assert get_pool_stats(admin_client.app.state.engine)['checked_out'] == 0
+
+    def test_reads_autocommit(self, api_client):
+        assert not in_one_transaction(api_client, "GET")
+
+    def test_writes_in_transaction(self, api_client):
+        assert in_one_transaction(api_client, "POST")
+
+    def test_use_transaction(self, api_client):
+        route = SimpleNamespace(endpoint=None, dependencies=[Depends(statement_timeout(1000))])
+
+        assert in_one_transaction(api_client, "GET", route)
+
+    def test_use_transaction_in_parameter_dependency(self, api_client):
+        async def filters(timeout=Depends(statement_timeout(1000))) -> None:
+            pass
+
+        async def endpoint(filters=Depends(filters)) -> None:
+            pass
+
+        assert in_one_transaction(api_client, "GET", APIRoute("/expensive", endpoint))
+
+    def test_list_routes_in_transaction(self, api_client):
+        route = next(route for route in api_client.app.routes if getattr(route, "path", None) == "/groups")
+
+        assert in_one_transaction(api_client, "GET", route)
+
+    def test_statement_timeout_in_autocommit(self, api_client):
+        async def set_in_autocommit():
+            request = Request({"type": "http", "method": "GET", "app": api_client.app, "route": None, "headers": []})
+            sessions = session_generator(request)
+            session = await anext(sessions)
+            try:
+                await set_statement_timeout(session, 1000)
+            finally:
+                await sessions.aclose()
+
+        with pytest.raises(RuntimeError):
+            api_client.portal.call(set_in_autocommit)
+
+
+@pytest.fixture
+def slow_queries(monkeypatch):
+    """Records every statement as slow and captures the plan of each"""
+
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0.001)
+    monkeypatch.setattr(slow_query_log, "explain_rate", 1)
+    slow_query_log.clear()
+    yield slow_query_log
+    slow_query_log.clear()
+
+
+class TestSlowQueries:
+
+    def test_slow_query_recorded(self, admin_client, slow_queries):
+        name = f"slow-{random.randint(1, 10000000)}"
+        admin_client.get(f"/groups?page_size=1&name=eq.{name}")
+
+        # The plan is captured in the background
+        for _ in range(50):
+            entries = admin_client.get("/status/slow-queries").json()
+            if any(entry['plan'] for entry in entries):
+                break
+            time.sleep(0.1)
+
+        assert entries, "The statements of the request should have been recorded"
+        entry = next(entry for entry in entries if entry['plan'])
+        assert entry['method'] == "GET"
+        assert entry['route'] == "/groups"
+        assert entry['statement'].startswith("SELECT")
+        assert "str" in entry['parameter_types']
+        assert name not in entry['statement']
+        assert "Plan" in entry['plan'][0]
+
+        assert admin_client.delete("/status/slow-queries").status_code == 204
+        assert admin_client.get("/status/slow-queries").json() == []
+
+    def test_plans_not_captured_by_default(self):
+        assert SlowQueryLog().explain_rate == 0
+
+    def test_plan_capture_times_out(self, slow_queries, api_client, monkeypatch):
+        monkeypatch.setattr(slow_queries, "explain_timeout_ms", 50)
+        engine = api_client.app.state.engine.sync_engine
+        slow_query = slow_queries.record(engine, "SELECT pg_sleep(2)", (), 2000)
+
+        start = time.monotonic()
+        api_client.portal.call(slow_queries.capture_plan, engine, slow_query, "SELECT pg_sleep(2)", ())
+
+        assert slow_query.plan is None
+        assert time.monotonic() - start < 2
+
+    def test_writes_not_explained(self, slow_queries, api_client):
+        engine = api_client.app.state.engine.sync_engine
+
+        assert not slow_queries._should_capture_plan(engine, "INSERT INTO groups (name) VALUES ($1)")
+
+    def test_slow_queries_needs_admin(self, nonadmin_client):
+        assert nonadmin_client.get("/status/slow-queries").status_code == 403
@@ -59,6 +59,131 @@ class TestUsers:
         assert fetched_user['name'] == user['name'], "Fetched user name should match the created user name"
         assert fetched_user['username'] == user['username'], "Fetched user username should match the created user username"
 
+    def test_get_user_embed(self, admin_client: Client, user_factory, project_factory):
+        """Test only the embedded relationships are returned"""
+
+        project = project_factory()
+        user = user_factory(5, project['id'])
+
+        user_response = admin_client.get(f"/users/{user['id']}?embed=projects,submit_nodes")
+
+        assert user_response.status_code == 200, f"Getting a user should return a 200 status code, instead got {user_response.text}"
+        fetched_user = user_response.json()
+        assert fetched_user['id'] == user['id'], "Fetched user ID should match the created user ID"
+        assert project['id'] in [p['project_id'] for p in fetched_user['projects']], "Embedded projects should be returned"
+        assert len(fetched_user['submit_nodes']) > 0, "Embedded submit nodes should be returned"
+        assert not {"notes", "groups", "user_forms"} & set(fetched_user), "Relationships that were not embedded should be left out"
+
+    def test_get_user_embed_none(self, admin_client: Client, user_factory, project_factory):
+        """Test an empty embed returns the plain user"""
+
+        project = project_factory()
+        user = user_factory(5, project['id'])
+
+        user_response = admin_client.get(f"/users/{user['id']}?embed=")
+
+        assert user_response.status_code == 200, f"Getting a user should return a 200 status code, instead got {user_response.text}"
+        assert set(user_response.json()) == set(UserGet.model_fields) | set(UserGet.model_computed_fields), "Only the user fields should be returned"
+
+    def test_list_users_embed(self, admin_client: Client, user_factory, project_factory):
+        """Test embed applies to every listed user"""
+
+        project = project_factory()
+        user = user_factory(5, project['id'])
+
+        response = admin_client.get(f"/users?id=eq.{user['id']}&embed=groups")
+
+        assert response.status_code == 200, f"Listing users should return a 200 status code, instead got {response.text}"
+        assert response.headers["X-Total-Count"] == "1", "The total count header should still be set"
+        users_list = response.json()
+        assert len(users_list) == 1
+        assert "groups" in users_list[0] and "projects" not in users_list[0], "Only the embedded relationships should be returned"
+
+    def test_get_user_invalid_embed(self, admin_client: Client, user):
+        """Test embedding an unknown relationship is rejected"""
+
+        response = admin_client.get(f"/users/{user['id']}?embed=tokens")
+
+        assert response.status_code == 400, f"Embedding an unknown relationship should return a 400 status code, instead got {response.text}"
+
+    def test_lookup_users(self, admin_client: Client, user, admin_user):
+        """Test looking up users by id returns them in request order with misses listed"""
+
+        response = admin_client.post("/users/lookup", json={"ids": [user['id'], 999999999, admin_user['id']]})
+
+        assert response.status_code == 200, f"Looking up users should return a 200 status code, instead got {response.text}"
+        data = response.json()
+        assert [result['key'] for result in data['results']] == [user['id'], 999999999, admin_user['id']]
+        assert data['results'][0]['item']['id'] == user['id']
+        assert data['results'][1]['item'] is None
+        assert data['results'][2]['item']['id'] == admin_user['id']
+        assert data['missing'] == [999999999]
+
+    def test_lookup_users_by_netid(self, admin_client: Client, user):
+        """Test looking up users by netid includes their relationships"""
+
+        response = admin_client.post("/users/lookup", json={"netids": [user['netid']]})
+
+        assert response.status_code == 200, f"Looking up users should return a 200 status code, instead got {response.text}"
+        data = response.json()
+        assert data['results'][0]['item']['id'] == user['id']
+        assert "projects" in data['results'][0]['item']
+        assert data['missing'] == []
+
+    def test_lookup_users_needs_one_key_list(self, admin_client: Client, user):
+        """Test a lookup with no or several key lists is rejected"""
+
+        assert admin_client.post("/users/lookup", json={}).status_code == 422
+        assert admin_client.post("/users/lookup", json={"ids": [user['id']], "netids": [user['netid']]}).status_code == 422
+
+    def test_lookup_users_needs_admin(self, nonadmin_client: Client, user):
+        assert nonadmin_client.post("/users/lookup", json={"ids": [user['id']]}).status_code == 403
+
+    def test_list_users_relationship_filters(self, admin_client: Client, user):
+        """Test filtering users on their projects and groups"""
+
+        project = user['projects'][0]
+        group = user['groups'][0]
+
+        response = admin_client.get(f"/users?projects.project_id=eq.{project['project_id']}&projects.role=eq.{project['role']}&groups.group_id=eq.{group['group_id']}")
+
+        assert response.status_code == 200, f"Filtering on relationships should return a 200 status code, instead got {response.text}"
+        assert [u['id'] for u in response.json()] == [user['id']]
+        assert response.headers["X-Total-Count"] == "1"
+
+        # Filters on one relationship have to match the same project
+        response = admin_client.get(f"/users?projects.project_id=eq.{project['project_id']}&projects.role=ne.{project['role']}")
+
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_user_facets(self, admin_client: Client, user):
+        """Test counting users per value of a column"""
+
+        response = admin_client.get(f"/users/facets?fields=active,position&id=eq.{user['id']}")
+
+        assert response.status_code == 200, f"Getting user facets should return a 200 status code, instead got {response.text}"
+        assert response.json() == {
+            "total": 1,
+            "facets": {
+                "active": {str(user['active']).lower(): 1},
+                "position": {user['position'] or "null": 1},
+            }
+        }
+
+        response = admin_client.get("/users/facets?fields=active")
+        assert sum(response.json()['facets']['active'].values()) == response.json()['total']
+
+    def test_user_facets_invalid_field(self, admin_client: Client):
+        assert admin_client.get("/users/facets?fields=not_a_column").status_code == 400
+        assert admin_client.get("/users/facets").status_code == 422
+
+    def test_list_users_relationship_filters_whitelist(self, admin_client: Client, user):
+        """Test filtering on a relationship column that is not whitelisted is rejected"""
+
+        assert admin_client.get("/users?projects.email1=eq.someone@wisc.edu").status_code == 400
+        assert admin_client.get("/users?notes.note=eq.note").status_code == 400
+
     def test_update_user_simple(self, admin_client: Client, user_factory, project_factory):
         """Test updating an existing user"""
 
@@ -1,7 +1,22 @@
+import asyncio
+import csv
+import io
+import json
 import random
-
-from userapp.api.tests.conftest import admin_client as client
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from userapp import main
+from userapp.api import util
+from userapp.api.cache import ResponseCache, response_cache
+from userapp.api.tests.conftest import admin_client as client, _seed_db_url, _make_auth_client
+from userapp.api.tests.test_load_options import count_statements
 from userapp.api.util import format_escaped_template, send_email
+from userapp.db import connect_engine, set_statement_timeout
 
 class TestListing:
 
@@ -20,7 +35,7 @@ class TestListing:
     def test_listing_total_count(self, client):
         """Test getting object lists from the database with total count parameter"""
 
-        response = client.get("/groups?page_size=9999999")
+        response = client.get("/groups?page_size=5000")
 
         assert response.status_code == 200
 
@@ -80,6 +95,20 @@ class TestListing:
 
         assert all(g['name'] == 'admin' for g in data), "Filtering by name did not return the expected results"
 
+    def test_prefix_filtering(self, client, group):
+        """Test filtering object lists by a case-insensitive prefix"""
+
+        prefix = group['name'][:-2].upper()
+
+        response = client.get(f"/groups?name=istartswith.{prefix}")
+
+        assert response.status_code == 200
+
+        names = [g['name'] for g in response.json()]
+
+        assert group['name'] in names
+        assert all(name.lower().startswith(prefix.lower()) for name in names)
+
     def test_ordering(self, client):
         """Test ordering object lists from the database"""
 
@@ -93,6 +122,509 @@ class TestListing:
 
         assert names == sorted(names, key=lambda x: x.lower()), "Ordering by name ascending did not return the expected results"
 
+class TestCountStrategy:
+
+    def test_exact_count_matches_separate_count(self, client):
+        """The windowed count should equal the size of the full filtered set"""
+
+        all_groups = client.get("/groups?page_size=5000").json()
+
+        response = client.get("/groups?page_size=1&count=exact")
+        assert response.status_code == 200
+        assert int(response.headers["X-Total-Count"]) == len(all_groups)
+        assert "X-Total-Count-Estimated" not in response.headers
+
+    def test_exact_count_past_last_page(self, client):
+        """An empty page past the end still reports the total"""
+
+        total_count = client.get("/groups").headers["X-Total-Count"]
+
+        response = client.get("/groups?page=9999&page_size=100")
+        assert response.status_code == 200
+        assert response.json() == []
+        assert response.headers["X-Total-Count"] == total_count
+
+    def test_exact_count_past_cursor(self, client):
+        """Pages past a cursor still report the size of the whole filtered set"""
+
+        first_page = client.get("/groups?cursor=&page_size=1")
+        second_page = client.get(f"/groups?cursor={first_page.headers['X-Next-Cursor']}&page_size=1")
+
+        assert second_page.headers["X-Total-Count"] == first_page.headers["X-Total-Count"]
+
+    def test_estimated_count(self, client):
+        response = client.get("/groups?count=estimated&has_groupdir=eq.true")
+
+        assert response.status_code == 200, response.text
+        assert int(response.headers["X-Total-Count"]) >= 0
+        assert response.headers["X-Total-Count-Estimated"] == "true"
+
+    def test_no_count(self, client):
+        response = client.get("/groups?count=none")
+
+        assert response.status_code == 200
+        assert len(response.json()) > 0
+        assert "X-Total-Count" not in response.headers
+
+    def test_invalid_count(self, client):
+        response = client.get("/groups?count=sometimes")
+
+        assert response.status_code == 422
+
+
+class TestQueryGuard:
+
+    def test_page_size_above_max(self, client):
+        response = client.get(f"/groups?page_size={util.MAX_PAGE_SIZE + 1}")
+
+        assert response.status_code == 400, "A page_size above MAX_PAGE_SIZE should return a 400 status code"
+
+    def test_query_cost_limit(self, client, monkeypatch):
+        """A page the planner costs above the limit is refused"""
+
+        monkeypatch.setattr(util, "QUERY_COST_LIMIT", 0.01)
+
+        response = client.get("/users?page_size=1")
+
+        assert response.status_code == 400, f"An expensive query should return a 400 status code, instead got {response.text}"
+        assert "too expensive" in response.json()["detail"]
+
+        monkeypatch.setattr(util, "QUERY_COST_LIMIT", 1e12)
+
+        response = client.get("/users?page_size=1")
+
+        assert response.status_code == 200
+        assert "X-Total-Count-Estimated" not in response.headers
+
+    def test_query_cost_limit_downgrades_count(self, client, monkeypatch):
+        """A page only over the limit because of its exact count is answered with an estimated count"""
+
+        async def explain_plan(session, select_stmt):
+            return {"Total Cost": 100.0 if "OVER ()" in str(select_stmt) else 1.0, "Plan Rows": 1}
+
+        monkeypatch.setattr(util, "QUERY_COST_LIMIT", 10.0)
+        monkeypatch.setattr(util, "explain_plan", explain_plan)
+
+        response = client.get("/users?page_size=1")
+
+        assert response.status_code == 200, response.text
+        assert response.headers["X-Total-Count-Estimated"] == "true"
+
+    def test_statement_timeout(self):
+        """A statement cancelled by its timeout is reported as a 504"""
+
+        @util.with_db_error_handling
+        async def slow_query():
+            engine = await connect_engine(_seed_db_url())
+            try:
+                async with async_sessionmaker(engine)() as session:
+                    async with session.begin():
+                        await set_statement_timeout(session, 10)
+                        await session.execute(text("SELECT pg_sleep(1)"))
+            finally:
+                await engine.dispose()
+
+        with pytest.raises(HTTPException) as exception_info:
+            asyncio.run(slow_query())
+
+        assert exception_info.value.status_code == 504
+
+
+class TestCursorPagination:
+
+    def _walk(self, client, url: str) -> list[int]:
+        """Follows X-Next-Cursor until the last page and returns the ids seen"""
+
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            response = client.get(f"{url}&cursor={cursor}")
+            assert response.status_code == 200, f"Cursor page should return 200, instead got {response.text}"
+
+            page = response.json()
+            assert len(page) > 0, "A cursor should never be issued for an empty page"
+            ids.extend(g['id'] for g in page)
+            cursor = response.headers.get("X-Next-Cursor")
+
+        return ids
+
+    def test_cursor_matches_offset(self, client, group_factory):
+        """Walking the cursor should return the same rows in the same order as one big offset page"""
+
+        for _ in range(3):
+            group_factory()
+
+        expected = [g['id'] for g in client.get("/groups?page_size=5000&name=order_by.desc").json()]
+
+        assert self._walk(client, "/groups?page_size=2&name=order_by.desc") == expected
+
+    def test_cursor_ties_broken_by_primary_key(self, client, group_factory):
+        """Ordering on a non unique column should neither skip nor repeat rows across pages"""
+
+        for _ in range(3):
+            group_factory()
+
+        ids = self._walk(client, "/groups?page_size=2&has_groupdir=order_by.asc")
+        all_ids = [g['id'] for g in client.get("/groups?page_size=5000").json()]
+
+        assert len(ids) == len(set(ids)), "Cursor pagination returned a row twice"
+        assert set(ids) == set(all_ids), "Cursor pagination skipped rows"
+
+    def test_cursor_respects_filters(self, client, group_factory):
+        """Cursor pages should only contain filtered rows and keep X-Total-Count for the filtered set"""
+
+        response = client.get("/groups?cursor=&page_size=1&has_groupdir=eq.true")
+
+        assert response.status_code == 200
+        assert all(g['has_groupdir'] for g in response.json())
+        assert int(response.headers["X-Total-Count"]) >= len(response.json())
+
+    def test_invalid_cursor(self, client):
+        """A cursor that was not issued by the api, or for another ordering, should be rejected"""
+
+        response = client.get("/groups?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+        first_page = client.get("/groups?cursor=&page_size=1&name=order_by.asc")
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert cursor is not None
+
+        response = client.get(f"/groups?cursor={cursor}&page_size=1&name=order_by.desc&unix_gid=order_by.asc")
+        assert response.status_code == 400
+
+
+class TestSparseFieldsets:
+
+    def test_select_columns(self, client):
+        """Only the selected columns should be returned"""
+
+        response = client.get("/groups?select=id,name&name=order_by.asc")
+
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert len(data) > 0
+        assert all(set(g.keys()) == {"id", "name"} for g in data)
+        assert int(response.headers["X-Total-Count"]) >= len(data)
+
+        full = client.get("/groups?name=order_by.asc").json()
+        assert data == [{"id": g["id"], "name": g["name"]} for g in full]
+
+    def test_select_with_filters(self, client):
+        response = client.get("/groups?select=id&has_groupdir=eq.true")
+
+        assert response.status_code == 200, response.text
+        expected = client.get("/groups?has_groupdir=eq.true").json()
+        assert [g["id"] for g in response.json()] == [g["id"] for g in expected]
+
+    def test_select_view(self, client, filled_out_project):
+        """Thin clients only need ids and netids of a project's members"""
+
+        response = client.get(f"/projects/{filled_out_project['id']}/users?select=id,netid")
+
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert {u["id"] for u in data} == {u["id"] for u in filled_out_project["users"]}
+        assert all(set(u.keys()) == {"id", "netid"} for u in data)
+
+    def test_select_with_cursor(self, client):
+        """Keyset columns are fetched for the cursor even when not selected"""
+
+        first_page = client.get("/groups?select=name&cursor=&page_size=1&name=order_by.asc")
+        assert first_page.status_code == 200, first_page.text
+        assert set(first_page.json()[0].keys()) == {"name"}
+
+        second_page = client.get(f"/groups?select=name&cursor={first_page.headers['X-Next-Cursor']}&page_size=1&name=order_by.asc")
+        assert second_page.status_code == 200, second_page.text
+        assert second_page.json() != first_page.json()
+
+    def test_select_unknown_column(self, client):
+        response = client.get("/groups?select=id,not_a_column")
+
+        assert response.status_code == 400
+
+
+class TestExport:
+
+    def test_export_ndjson(self, client):
+        """Every filtered row should be streamed as one JSON object per line"""
+
+        expected = client.get("/groups?page_size=5000&has_groupdir=eq.true").json()
+
+        response = client.get("/groups/export?has_groupdir=eq.true&id=order_by.asc")
+
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [r['id'] for r in rows] == sorted(g['id'] for g in expected)
+        assert all(r['has_groupdir'] for r in rows)
+
+    def test_export_csv(self, client):
+        total_count = int(client.get("/groups").headers["X-Total-Count"])
+
+        response = client.get("/groups/export?format=csv")
+
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/csv")
+
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == total_count
+        assert {"id", "name", "has_groupdir"} <= set(rows[0].keys())
+
+    def test_export_nested_rows(self, client, user):
+        """Users are exported with the same nested shape as the list endpoint"""
+
+        response = client.get(f"/users/export?id=eq.{user['id']}")
+
+        assert response.status_code == 200, response.text
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0]['id'] == user['id']
+        assert len(rows[0]['projects']) == len(user['projects'])
+
+    def test_export_invalid_format(self, client):
+        response = client.get("/groups/export?format=xml")
+
+        assert response.status_code == 422
+
+
+class TestConditionalGet:
+
+    def test_list_not_modified(self, client):
+        """A list re-fetched with its ETag should be answered with an empty 304"""
+
+        response = client.get("/submit_nodes")
+        etag = response.headers["ETag"]
+
+        response = client.get("/submit_nodes", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    def test_list_modified(self, client):
+        """Adding a row should change the list's ETag"""
+
+        etag = client.get("/submit_nodes").headers["ETag"]
+
+        create_response = client.post("/submit_nodes", json={"name": f"etag-node-{random.randint(0, 10**6)}"})
+        assert create_response.status_code == 201
+
+        response = client.get("/submit_nodes", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+        client.delete(f"/submit_nodes/{create_response.json()['id']}")
+
+    def test_list_row_updated(self, client):
+        """Updating a row on the page should change the list's ETag"""
+
+        create_response = client.post("/submit_nodes", json={"name": f"etag-node-{random.randint(0, 10**6)}"})
+        assert create_response.status_code == 201
+        submit_node_id = create_response.json()['id']
+        url = f"/submit_nodes?id=eq.{submit_node_id}"
+
+        etag = client.get(url).headers["ETag"]
+
+        update_response = client.put(f"/submit_nodes/{submit_node_id}", json={"name": f"etag-node-{random.randint(0, 10**6)}"})
+        assert update_response.status_code == 200, update_response.text
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+        client.delete(f"/submit_nodes/{submit_node_id}")
+
+    def test_list_one_query(self, client):
+        """Without If-None-Match the ETag comes with the page, nothing is fingerprinted first"""
+
+        with count_statements() as statements:
+            response = client.get("/submit_nodes")
+
+        assert "ETag" in response.headers
+        assert len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]) == 1
+
+    def test_view_list_not_modified(self, client, user):
+        """Lists of views are fingerprinted by the row versions of their base tables"""
+
+        url = f"/groups/{user['groups'][0]['group_id']}/users"
+        etag = client.get(url).headers["ETag"]
+
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    def test_view_list_base_row_updated(self, client, user):
+        """Renaming a user should change the ETag of the users of their groups"""
+
+        url = f"/groups/{user['groups'][0]['group_id']}/users"
+        etag = client.get(url).headers["ETag"]
+
+        update_response = client.patch(f"/users/{user['id']}", json={"name": f"etag-{random.randint(0, 10**6)}"})
+        assert update_response.status_code == 200, update_response.text
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_etag_varies_with_query(self, client):
+        assert client.get("/submit_nodes?page_size=1").headers["ETag"] != client.get("/submit_nodes?page_size=2").headers["ETag"]
+
+    def test_get_one_not_modified(self, client, user):
+        """A user re-fetched with its ETag should be answered with a 304 until one of their memberships changes"""
+
+        etag = client.get(f"/users/{user['id']}").headers["ETag"]
+
+        response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        group_response = client.post("/groups/2/users", json={"user_id": user['id']})
+        assert group_response.status_code == 201
+
+        response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert 2 in [g['group_id'] for g in response.json()['groups']]
+
+    def test_get_one_related_row_updated(self, client, user):
+        """Updating a project the user is in should change the user's ETag"""
+
+        etag = client.get(f"/users/{user['id']}").headers["ETag"]
+
+        project_id = user['projects'][0]['project_id']
+        update_response = client.put(f"/projects/{project_id}", json={"status": f"etag-{random.randint(0, 10**6)}"})
+        assert update_response.status_code == 200, update_response.text
+
+        response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    def test_get_one_nested_user_updated(self, client, user, admin_user):
+        """Renaming the author of one of the user's notes should change the user's ETag"""
+
+        note_response = client.post(
+            f"/projects/{user['projects'][0]['project_id']}/notes",
+            json={"note": "ETag note", "users": [user['id']]},
+        )
+        assert note_response.status_code == 201, note_response.text
+
+        etag = client.get(f"/users/{user['id']}").headers["ETag"]
+        assert client.get(f"/users/{user['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+        update_response = client.patch(f"/users/{admin_user['id']}", json={"name": f"etag-author-{random.randint(0, 10**6)}"})
+        assert update_response.status_code == 200, update_response.text
+
+        response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    def test_get_one_missing(self, client):
+        """A missing item is still a 404 whatever the If-None-Match"""
+
+        response = client.get("/users/999999999", headers={"If-None-Match": "*"})
+
+        assert response.status_code == 404
+
+
+@pytest.fixture
+def enabled_response_cache(monkeypatch):
+    """Turns the response cache on, it is off by default"""
+
+    monkeypatch.setattr(response_cache, "ttl", 30)
+    yield response_cache
+    response_cache.clear()
+
+
+class TestResponseCache:
+
+    def test_disabled_by_default(self):
+        assert not ResponseCache().enabled
+
+    def test_cache_hit(self, client, enabled_response_cache):
+        """A repeated list request should be answered without querying the database"""
+
+        first_response = client.get("/groups?page_size=7")
+        with count_statements() as statements:
+            second_response = client.get("/groups?page_size=7")
+
+        assert second_response.status_code == 200
+        assert second_response.json() == first_response.json()
+        assert second_response.headers["X-Total-Count"] == first_response.headers["X-Total-Count"]
+        assert [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")] == []
+
+    def test_invalidated_by_update(self, client, group, enabled_response_cache):
+        """Updating an item should drop its cached response"""
+
+        has_groupdir = client.get(f"/groups/{group['id']}").json()['has_groupdir']
+
+        response = client.put(f"/groups/{group['id']}", json={"has_groupdir": not has_groupdir})
+        assert response.status_code == 200
+
+        assert client.get(f"/groups/{group['id']}").json()['has_groupdir'] is (not has_groupdir)
+
+    def test_invalidated_by_create(self, client, group_factory, enabled_response_cache):
+        """Creating a row should drop the cached lists of its table"""
+
+        total_count = int(client.get("/groups?page_size=1").headers["X-Total-Count"])
+
+        group = group_factory()
+
+        assert int(client.get("/groups?page_size=1").headers["X-Total-Count"]) == total_count + 1
+
+        client.delete(f"/groups/{group['id']}")
+
+    def test_least_recently_used_evicted(self):
+        response_cache = ResponseCache(max_entries=2, ttl=60)
+
+        response_cache.set("a", frozenset({"groups"}), 1, response_cache.generation)
+        response_cache.set("b", frozenset({"groups"}), 2, response_cache.generation)
+        response_cache.get("a")
+        response_cache.set("c", frozenset({"groups"}), 3, response_cache.generation)
+
+        assert response_cache.get("a") == 1
+        assert response_cache.get("b") is None
+        assert response_cache.get("c") == 3
+
+    def test_expired(self, monkeypatch):
+        response_cache = ResponseCache(max_entries=2, ttl=60)
+        response_cache.set("a", frozenset({"groups"}), 1, response_cache.generation)
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+
+        assert response_cache.get("a") is None
+
+    def test_entry_ttl(self, monkeypatch):
+        """An entry can be given a shorter ttl than the cache's"""
+
+        response_cache = ResponseCache(max_entries=2, ttl=60)
+        response_cache.set("a", frozenset({"groups"}), 1, response_cache.generation, ttl=10)
+        response_cache.set("b", frozenset({"groups"}), 2, response_cache.generation)
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+        assert response_cache.get("a") is None
+        assert response_cache.get("b") == 2
+
+    def test_invalidate_tables(self):
+        response_cache = ResponseCache(max_entries=2, ttl=60)
+        response_cache.set("a", frozenset({"groups"}), 1, response_cache.generation)
+        response_cache.set("b", frozenset({"projects", "users"}), 2, response_cache.generation)
+
+        response_cache.invalidate({"users"})
+
+        assert response_cache.get("a") == 1
+        assert response_cache.get("b") is None
+
+    def test_not_stored_across_write(self):
+        """A response loaded while a write was committed may be stale and should not be stored"""
+
+        response_cache = ResponseCache(max_entries=2, ttl=60)
+        generation = response_cache.generation
+
+        response_cache.invalidate({"groups"})
+        response_cache.set("a", frozenset({"groups"}), 1, generation)
+
+        assert response_cache.get("a") is None
+
+
 class TestGetOne:
 
     def test_get_one(self, client):
@@ -168,3 +700,76 @@ class TestEmail:
     def test_email(self):
 
         send_email("no-reply@chtc.wisc.edu", "clock@wisc.edu",  "Test Email", "This is a test email from UserApp API tests.", "cannonLock@wisc.edu", "karate@wisc.edu")
+
+
+def prepared_statements(**engine_kwargs) -> list[str]:
+    """Names of the prepared statements of a query on a connection that has run it twice"""
+
+    async def run_query():
+        engine = await connect_engine(_seed_db_url(), **engine_kwargs)
+        try:
+            async with engine.connect() as connection:
+                for _ in range(2):
+                    await connection.execute(text("SELECT id FROM groups WHERE id = :id"), {"id": 1})
+
+                result = await connection.execute(text("SELECT name FROM pg_prepared_statements WHERE statement LIKE 'SELECT id FROM groups%'"))
+                return result.scalars().all()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run_query())
+
+
+@pytest.fixture(params=[None, 10], ids=["unnamed", "cached"])
+def pgbouncer_client(request, monkeypatch, existing_admin_user):
+    """Admin client of an app connecting in PgBouncer mode, with and without a statement cache"""
+
+    monkeypatch.setattr(main.settings, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(main.settings, "DB_STATEMENT_CACHE_SIZE", request.param)
+    yield from _make_auth_client({**existing_admin_user, "is_admin": True})
+
+
+class TestStatementCache:
+
+    def test_direct(self):
+        """The repeated query is prepared once and kept"""
+
+        assert len(prepared_statements()) == 1
+
+    def test_pgbouncer_unnamed(self):
+        """Through PgBouncer statements are unnamed, none are left on the server connection"""
+
+        assert prepared_statements(pgbouncer=True) == []
+
+    def test_pgbouncer_cached(self):
+        names = prepared_statements(pgbouncer=True, statement_cache_size=10)
+
+        assert len(names) == 1
+        assert names[0].startswith("__asyncpg_") and "stmt" not in names[0]
+
+    def test_pgbouncer_autocommit(self, pgbouncer_client, group):
+        """Repeated GETs run in autocommit on the PgBouncer mode connections, seen by the engine events"""
+
+        for _ in range(3):
+            response = pgbouncer_client.get(f"/groups/{group['id']}")
+
+            assert response.status_code == 200, response.text
+            assert response.json()['name'] == group['name']
+            assert 'desc="0 queries"' not in response.headers["Server-Timing"]
+
+        async def prepared_group_statements():
+            async with pgbouncer_client.app.state.autocommit_session_maker() as session:
+                for _ in range(2):
+                    await session.execute(text("SELECT id FROM groups WHERE id = :id"), {"id": group['id']})
+
+                isolation_level = (await session.connection()).sync_connection.get_execution_options()["isolation_level"]
+                result = await session.execute(text("SELECT name FROM pg_prepared_statements WHERE statement LIKE 'SELECT id FROM groups%'"))
+                return isolation_level, result.scalars().all()
+
+        isolation_level, names = pgbouncer_client.portal.call(prepared_group_statements)
+
+        assert isolation_level == "AUTOCOMMIT"
+        if main.settings.DB_STATEMENT_CACHE_SIZE:
+            assert len(names) == 1 and names[0].startswith("__asyncpg_")
+        else:
+            assert names == []
@@ -1,4 +1,9 @@
 from html import escape
+import csv
+import enum
+import hashlib
+import io
+import json
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formatdate
@@ -7,17 +12,28 @@ import smtplib
 import traceback
 import logging
 import os
-from typing import Any, Callable, TypeVar, Union
+from typing import Any, Callable, Literal, Optional, TypeVar, Union
 
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, ValidationError
 from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.orm import DeclarativeBase
-from starlette.responses import Response
-from sqlalchemy import select, func
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import select, func, cast, Text, Table, any_, bindparam, inspect, literal_column, tuple_, \
+    column as sql_column, table as sql_table
+from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.sql.selectable import Select
 from sqlalchemy.dialects import postgresql
 
+from userapp.api.cache import response_cache, cache_tables
+from userapp.api.pagination import get_keyset_columns, get_keyset_values, encode_cursor, decode_cursor, \
+    keyset_where_expression
+from userapp.api.relationship_filters import get_relationship_filters
+from userapp.api.serialization import copy_headers
+from userapp.db import set_statement_timeout, statement_timeout
 from userapp.query_parser import QueryParser
 
 logger = logging.getLogger(__name__)
@@ -25,12 +41,41 @@ logger = logging.getLogger(__name__)
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.wiscmail.wisc.edu")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 
+# Rows fetched from the server side cursor at a time when exporting
+EXPORT_BATCH_SIZE = 500
+
+# Milliseconds an export's statements may run for, streaming a whole collection outlasts STATEMENT_TIMEOUT
+EXPORT_STATEMENT_TIMEOUT = int(os.getenv("EXPORT_STATEMENT_TIMEOUT", "600000"))
+
+# Milliseconds the statements of a list, lookup or facets request may run for, their filters are up to the caller
+LIST_STATEMENT_TIMEOUT = int(os.getenv("LIST_STATEMENT_TIMEOUT", "10000"))
+
+# Route dependency applying LIST_STATEMENT_TIMEOUT, one instance so the request's dependencies share it
+list_statement_timeout = statement_timeout(LIST_STATEMENT_TIMEOUT)
+
+# Largest page_size a list endpoint accepts, larger collections are read with cursor pagination or /export
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "5000"))
+
+# Planner cost above which a list page is refused, 0 disables the check, see check_query_cost
+QUERY_COST_LIMIT = float(os.getenv("QUERY_COST_LIMIT", "0"))
+
+# Seconds a facets response is kept in the response cache, dashboards poll them but can bear a little staleness
+FACETS_CACHE_TTL = float(os.getenv("FACETS_CACHE_TTL", "10"))
+
+# Most columns a facets request can count at once
+MAX_FACET_FIELDS = 10
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
 def with_db_error_handling(func):
     async def wrapper(*args, **kwargs):
         try:
             return await func(*args, **kwargs)
         except (DBAPIError, IntegrityError) as e:
             logger.error(f"Database error: {str(e)}")
+            if getattr(e.orig, "pgcode", None) == QUERY_CANCELED:
+                raise HTTPException(status_code=504, detail="The query took too long and was cancelled, narrow the filters or lower page_size")
             raise HTTPException(status_code=400, detail="Database error occurred, likely due to violation of constraints.")
         except ValidationError as e:
             raise HTTPException(status_code=500, detail=f"Data validation error: {str(e)}")
@@ -45,6 +90,193 @@ def with_db_error_handling(func):
 
 T = TypeVar("T", bound=BaseModel)
 
+# How X-Total-Count is computed for list endpoints
+#   exact - counted alongside the page with a window function
+#   estimated - the planner's row estimate, cheap on large or heavily filtered views but approximate
+#   none - the header is omitted
+CountStrategy = Literal["exact", "estimated", "none"]
+
+
+async def explain_plan(session, select_stmt: Select) -> dict:
+    """Returns the planner's top plan node for the select statement, it is not run"""
+
+    connection = await session.connection()
+    compiled_select_stmt = select_stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled_select_stmt}")
+    plan = result.scalar()
+
+    return plan[0]["Plan"]
+
+
+async def estimate_count(session, select_stmt: Select) -> int:
+    """Returns the planner's estimate of the number of rows the select statement will return"""
+
+    return int((await explain_plan(session, select_stmt))["Plan Rows"])
+
+
+async def check_query_cost(session, select_stmt: Select, count: CountStrategy, count_with_page: bool) -> CountStrategy:
+    """Refuses a page the planner costs above QUERY_COST_LIMIT, returns the count strategy to continue with
+
+    Counting the whole filtered set is often most of the cost, so an exact count is first downgraded to
+    estimated before the page is refused.
+    """
+
+    if count_with_page:
+        total_cost = (await explain_plan(session, select_stmt.add_columns(func.count().over())))["Total Cost"]
+    else:
+        total_cost = (await explain_plan(session, select_stmt))["Total Cost"]
+
+    if total_cost <= QUERY_COST_LIMIT:
+        return count
+
+    if count_with_page and (await explain_plan(session, select_stmt))["Total Cost"] <= QUERY_COST_LIMIT:
+        return "estimated"
+
+    raise HTTPException(
+        status_code=400,
+        detail=f"Query is too expensive ({total_cost:.0f} > {QUERY_COST_LIMIT:.0f}), narrow the filters or lower page_size"
+    )
+
+
+def _row_version(table) -> ColumnElement:
+    return literal_column(f"{table.name}.ctid::text || ':' || {table.name}.xmin::text")
+
+
+def row_version_columns(select_stmt: Select) -> list[ColumnElement] | None:
+    """Columns giving the versions of the rows behind each row of the select statement, None if it can't carry them
+
+    A table's row is versioned by its ctid and xmin, the location of the row version and the transaction that
+    wrote it, which every INSERT and UPDATE changes, so only row headers are read rather than whole rows. A
+    view's row is versioned by the rows of its base tables listed in the row_versions of its info, the base
+    table's key columns mapped to the view's. Grouped and distinct rows, and views without row_versions, have
+    none.
+    """
+
+    if select_stmt._group_by_clauses or select_stmt._distinct:
+        return None
+
+    versions = []
+    tables = []
+    for column in select_stmt.selected_columns:
+        table = getattr(column, "table", None)
+        if table is None:
+            # Such as the total count window
+            continue
+        if not isinstance(table, Table):
+            return None
+        if table in tables:
+            continue
+        tables.append(table)
+
+        if not table.info.get("is_view"):
+            versions.append(_row_version(table))
+            continue
+
+        base_rows = table.info.get("row_versions")
+        if base_rows is None:
+            return None
+
+        for base_table_name, keys in base_rows.items():
+            base_table = sql_table(base_table_name, *[sql_column(key) for key in keys]).alias(f"{base_table_name}_version")
+            versions.append(
+                select(_row_version(base_table))
+                .select_from(base_table)
+                .where(*[base_table.c[key] == table.c[view_key] for key, view_key in keys.items()])
+                .scalar_subquery()
+            )
+
+    return versions or None
+
+
+def row_version(select_stmt: Select) -> ColumnElement | None:
+    """The row versions of the select statement as one labeled column, see row_version_columns"""
+
+    versions = row_version_columns(select_stmt)
+    if versions is None:
+        return None
+
+    return func.concat_ws("|", *versions).label("row_version")
+
+
+def rows_fingerprint(select_stmt: Select):
+    """Returns a scalar subquery fingerprinting the rows of the select statement, NULL when there are none
+
+    The fingerprint is the count and an order independent sum of the hashes of the rows' versions, computed
+    by the database so nothing is hydrated, see row_version_columns.
+    """
+
+    version = row_version(select_stmt)
+    if version is None:
+        raise ValueError("The rows of the select statement have no row versions to fingerprint")
+
+    rows = select_stmt.with_only_columns(version, maintain_column_froms=True).subquery()
+
+    return select(
+        cast(func.count(), Text) + ":" + cast(func.sum(func.hashtextextended(rows.c.row_version, 0)), Text)
+    ).scalar_subquery()
+
+
+def page_fingerprint(row_versions: list[str]) -> str:
+    """Order independent digest of the row versions of a page"""
+
+    return hashlib.sha1("\n".join(sorted(row_versions)).encode()).hexdigest()
+
+
+async def get_fingerprint_values(session, fingerprints: list) -> tuple:
+    """Returns the values of the fingerprints in one round trip"""
+
+    return tuple((await session.execute(select(*fingerprints))).one())
+
+
+async def get_page_fingerprint_values(session, versions_select_stmt: Select, version, filtered_select_stmt: Select, count: CountStrategy) -> tuple:
+    """The values list_select_stmt makes a page's ETag from, without loading the page
+
+    The total count if it is exact, as X-Total-Count changes with it, and the page_fingerprint of the page's row
+    versions, in one round trip.
+    """
+
+    rows = versions_select_stmt.with_only_columns(version, maintain_column_froms=True).subquery()
+    total_count = select(func.count()).select_from(filtered_select_stmt.subquery()).scalar_subquery() if count == "exact" else None
+
+    row_versions, total_count = (await session.execute(select(
+        select(func.array_agg(rows.c.row_version)).scalar_subquery(),
+        total_count if total_count is not None else literal_column("NULL"),
+    ))).one()
+
+    return total_count, page_fingerprint(row_versions or [])
+
+
+def make_etag(request: Request, fingerprint_values: tuple) -> str:
+    """The ETag of the fingerprint values
+
+    The query string is part of the ETag as it changes the representation (embed, select, page, ...).
+    """
+
+    digest = hashlib.sha1(json.dumps([str(request.query_params), *fingerprint_values], default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def check_etag(request: Request, response: Response, fingerprint_values: tuple) -> None:
+    """Sets the response's ETag from the fingerprint values, raising a 304 if the client's If-None-Match is still current"""
+
+    etag = make_etag(request, fingerprint_values)
+
+    check_if_none_match(request, etag)
+
+    response.headers["ETag"] = etag
+
+
+def check_if_none_match(request: Request, etag: str) -> None:
+    """Raises a 304 if the client's If-None-Match includes the etag"""
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        client_etags = {client_etag.strip().removeprefix("W/") for client_etag in if_none_match.split(",")}
+        if "*" in client_etags or etag.removeprefix("W/") in client_etags:
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+
+
 
 @with_db_error_handling
 async def list_select_stmt(
@@ -56,34 +288,172 @@ async def list_select_stmt(
     page: int = 0,
     page_size: int = 100,
     load_options=None,
+    cursor: Optional[str] = None,
+    count: CountStrategy = "exact",
+    request: Optional[Request] = None,
+    cache_key: Optional[tuple] = None,
 ):
-    """Generic list endpoint generator"""
+    """Generic list endpoint generator
 
-    query_parser = QueryParser(columns=model.__table__.c, query_params=filter_query_params)
+    If cursor is given (an empty string starts from the beginning) the page is found by seeking past the
+    cursor's sort key rather than by offset, and the cursor of the next page is returned in X-Next-Cursor.
 
-    paginated_select_stmt = select_stmt \
-        .limit(page_size) \
-        .offset(page_size * page) \
-        .where(query_parser.where_expressions())
+    count selects how X-Total-Count is computed, see CountStrategy.
 
-    if load_options:
+    If the filters include select=col1,col2 only those columns are queried and the rows are returned directly
+    as JSON, skipping ORM hydration, load_options and the route's response model.
+
+    If request is given the response gets an ETag, computed from the versions of the page's rows selected with
+    them, see row_version_columns. A request with If-None-Match has the page's row versions fingerprinted first
+    and is answered with a 304 before the page is loaded if they still match.
+
+    If cache_key is given the page and its headers are kept in the response cache until a write is committed
+    to one of the tables they were read from, see userapp/api/cache.py.
+
+    page_size is capped at MAX_PAGE_SIZE and, if QUERY_COST_LIMIT is set, pages the planner costs above it
+    are refused, see check_query_cost.
+    """
+
+    if page < 0 or page_size < 0:
+        raise HTTPException(status_code=400, detail="page and page_size can not be negative")
+
+    if page_size > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"page_size can be at most {MAX_PAGE_SIZE}, use cursor pagination or /export to read more"
+        )
+
+    cache_generation = response_cache.generation
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            results, raw_headers = cached
+            etag = Headers(raw=raw_headers).get("ETag")
+            if request is not None and etag is not None:
+                check_if_none_match(request, etag)
+
+            response.raw_headers.extend(raw_headers)
+            return results
+
+    query_parser = QueryParser(
+        columns=model.__table__.c,
+        query_params=filter_query_params,
+        relationship_filters=get_relationship_filters(model),
+    )
+    projection_columns = query_parser.get_projection_columns()
+
+    # The filtered set is paged below and counted for X-Total-Count
+    filtered_select_stmt = select_stmt.where(query_parser.where_expressions())
+
+    paginated_select_stmt = filtered_select_stmt
+
+    keyset_columns = []
+    if cursor is not None:
+        if query_parser.get_group_by_column() is not None:
+            raise HTTPException(status_code=400, detail="Cursor pagination cannot be combined with group_by")
+
+        keyset_columns = get_keyset_columns(model, query_parser.get_order_by_keys())
+
+        if cursor:
+            paginated_select_stmt = paginated_select_stmt.where(
+                keyset_where_expression(keyset_columns, decode_cursor(cursor, keyset_columns))
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        paginated_select_stmt = paginated_select_stmt \
+            .order_by(*[column.asc() if direction == "asc" else column.desc() for column, direction in keyset_columns]) \
+            .limit(page_size + 1)
+
+    else:
+        paginated_select_stmt = paginated_select_stmt \
+            .limit(page_size) \
+            .offset(page_size * page)
+
+        if query_parser.get_order_by_columns() is not None and \
+                query_parser.get_group_by_column() is None:
+            paginated_select_stmt = paginated_select_stmt.order_by(*query_parser.get_order_by_columns())
+
+    # The rows of the page, versioned for the ETag before the columns are projected
+    version = row_version(paginated_select_stmt) if request is not None else None
+    versions_select_stmt = paginated_select_stmt
+
+    if projection_columns is not None:
+        # Keyset columns are needed to build the next cursor even if they were not selected
+        paginated_select_stmt = paginated_select_stmt.with_only_columns(
+            *projection_columns,
+            *[column for column, _ in keyset_columns if column not in projection_columns]
+        )
+
+    elif load_options:
         paginated_select_stmt = paginated_select_stmt.options(*load_options)
 
-    if query_parser.get_order_by_columns() is not None and \
-            query_parser.get_group_by_column() is None:
-        paginated_select_stmt = paginated_select_stmt.order_by(*query_parser.get_order_by_columns())
+    if QUERY_COST_LIMIT > 0:
+        count = await check_query_cost(session, paginated_select_stmt, count, count == "exact" and not cursor)
+
+    # Past a cursor the page no longer sees the whole filtered set, so it can't count it
+    count_with_page = count == "exact" and not cursor
+    if count_with_page:
+        paginated_select_stmt = paginated_select_stmt.add_columns(func.count().over().label("total_count"))
+
+    if version is not None:
+        if "If-None-Match" in request.headers:
+            check_etag(request, response, await get_page_fingerprint_values(session, versions_select_stmt, version, filtered_select_stmt, count))
+
+        paginated_select_stmt = paginated_select_stmt.add_columns(version)
 
     result = await session.execute(paginated_select_stmt)
-    results = result.unique().fetchall()
 
-    # Get the total count for pagination
-    count_stmt = select(func.count()).select_from(select_stmt.where(query_parser.where_expressions()).subquery())
+    # Plain column rows are not deduplicated, two users can share a position
+    if projection_columns is not None:
+        results = result.fetchall()
+    else:
+        results = result.unique().fetchall()
+
+    # Of every row fetched, as fingerprinted by get_page_fingerprint_values
+    row_versions = [row.row_version for row in results] if version is not None else None
+
+    if cursor is not None and len(results) > page_size:
+        results = results[:page_size]
+
+        if projection_columns is not None:
+            keyset_values = [results[-1]._mapping[column] for column, _ in keyset_columns]
+        else:
+            keyset_values = get_keyset_values(model, keyset_columns, results[-1][0])
+
+        response.headers["X-Next-Cursor"] = encode_cursor(keyset_columns, keyset_values)
+
+    if count == "exact":
+        if count_with_page and results:
+            num_results_total = results[0].total_count
+        elif count_with_page and (cursor == "" or page == 0):
+            num_results_total = 0
+        else:
+            # An empty page past the end, or a page past a cursor
+            num_results_total = await session.scalar(select(func.count()).select_from(filtered_select_stmt.subquery()))
+
+        response.headers["X-Total-Count"] = str(num_results_total)
+
+    elif count == "estimated":
+        response.headers["X-Total-Count"] = str(await estimate_count(session, filtered_select_stmt))
+        response.headers["X-Total-Count-Estimated"] = "true"
+
+    if row_versions is not None:
+        response.headers["ETag"] = make_etag(request, (num_results_total if count == "exact" else None, page_fingerprint(row_versions)))
 
-    num_results_total = await session.execute(count_stmt)
-    response.headers["X-Total-Count"] = str(num_results_total.scalar())
+    if projection_columns is not None:
+        projected = JSONResponse(content=jsonable_encoder([
+            {column.name: row._mapping[column] for column in projection_columns} for row in results
+        ]))
+        copy_headers(response, projected)
+        return projected
 
     # Depending on the select statement, if you use columns you can return directly, if you use models you need to extract from Row
-    return [x[0] for x in results]
+    results = [x[0] for x in results]
+
+    if cache_key is not None:
+        response_cache.set(cache_key, cache_tables(model), (results, list(response.raw_headers)), cache_generation)
+
+    return results
 
 
 async def list_endpoint(
@@ -93,7 +463,11 @@ async def list_endpoint(
     filter_query_params,
     page: int = 0,
     page_size: int = 100,
-    load_options=None
+    load_options=None,
+    cursor: Optional[str] = None,
+    count: CountStrategy = "exact",
+    request: Optional[Request] = None,
+    cache_key: Optional[tuple] = None,
 ):
     """Generic list endpoint generator"""
     return await list_select_stmt(
@@ -105,21 +479,276 @@ async def list_endpoint(
         page_size=page_size,
         session=session,
         load_options=load_options,
+        cursor=cursor,
+        count=count,
+        request=request,
+        cache_key=cache_key,
+    )
+
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def _csv_row(item: dict) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(
+        json.dumps(value) if isinstance(value, (dict, list)) else value
+        for value in item.values()
     )
+    return buffer.getvalue()
+
+
+async def _stream_export(async_session_maker, select_stmt: Select, schema: type[BaseModel], export_format: ExportFormat):
+    """Yields the serialized rows of the select statement, holding one batch in memory at a time"""
+
+    # The export gets its own session and transaction, held while the body streams. session_generator's session
+    # is committed and closed by its function scoped dependency as soon as the endpoint returns, before the body
+    # is sent, and GETs run it in autocommit, where a server side cursor and SET LOCAL wouldn't outlive a statement
+    async with async_session_maker() as session:
+        async with session.begin():
+            await set_statement_timeout(session, EXPORT_STATEMENT_TIMEOUT)
+            result = await session.stream_scalars(select_stmt)
+
+            write_header = export_format == "csv"
+            async for partition in result.partitions():
+                chunk = []
+                for db_item in partition:
+                    item = schema.model_validate(db_item)
+
+                    if export_format == "ndjson":
+                        chunk.append(item.model_dump_json() + "\n")
+                        continue
+
+                    item = item.model_dump(mode="json")
+                    if write_header:
+                        chunk.append(_csv_row({k: k for k in item}))
+                        write_header = False
+                    chunk.append(_csv_row(item))
+
+                # Drop the batch from the identity map so memory stays flat over the export
+                session.expunge_all()
+                yield "".join(chunk)
 
 
 @with_db_error_handling
-async def get_one_endpoint(session, model: type[DeclarativeBase], model_id: Union[str, int], load_options=None):
-    """Generic get one endpoint generator"""
+async def export_select_stmt(
+    async_session_maker,
+    select_stmt: Select,
+    model: type[DeclarativeBase],
+    schema: type[BaseModel],
+    filter_query_params,
+    export_format: ExportFormat = "ndjson",
+    load_options=None,
+) -> StreamingResponse:
+    """Generic export endpoint generator
+
+    Streams every row matching the filters from a server side cursor as NDJSON or CSV, nested values are JSON
+    encoded in CSV cells.
+    """
+
+    query_parser = QueryParser(
+        columns=model.__table__.c,
+        query_params=filter_query_params,
+        relationship_filters=get_relationship_filters(model),
+    )
+
+    streamed_select_stmt = select_stmt \
+        .where(query_parser.where_expressions()) \
+        .order_by(*query_parser.get_order_by_columns()) \
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    if load_options:
+        streamed_select_stmt = streamed_select_stmt.options(*load_options)
+
+    if export_format == "csv":
+        media_type = "text/csv"
+    else:
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        _stream_export(async_session_maker, streamed_select_stmt, schema, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{model.__tablename__}.{export_format}"'},
+    )
+
+
+async def export_endpoint(
+    async_session_maker,
+    model: type[DeclarativeBase],
+    schema: type[BaseModel],
+    filter_query_params,
+    export_format: ExportFormat = "ndjson",
+    load_options=None,
+) -> StreamingResponse:
+    """Generic export endpoint generator"""
+    return await export_select_stmt(
+        async_session_maker=async_session_maker,
+        select_stmt=select(model),
+        model=model,
+        schema=schema,
+        filter_query_params=filter_query_params,
+        export_format=export_format,
+        load_options=load_options,
+    )
+
+
+@with_db_error_handling
+async def get_one_endpoint(
+    session,
+    model: type[DeclarativeBase],
+    model_id: Union[str, int],
+    load_options=None,
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    fingerprints: Optional[list] = None,
+    cache_key: Optional[tuple] = None,
+):
+    """Generic get one endpoint generator
+
+    If request and response are given the response gets an ETag and a matching If-None-Match is answered
+    with a 304 before the item is loaded. The ETag covers the item's row, routes whose response includes
+    relationships pass fingerprints covering them as well.
+
+    If cache_key is given the item is kept in the response cache, as in list_select_stmt.
+    """
+
+    cache_generation = response_cache.generation
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     select_stmt = select(model).where(model.id == model_id)
+
+    if request is not None and response is not None:
+        fingerprint_values = await get_fingerprint_values(session, fingerprints or [rows_fingerprint(select_stmt)])
+
+        # A missing item falls through to the 404 below
+        if fingerprint_values[0] is not None:
+            check_etag(request, response, fingerprint_values)
+
     if load_options:
         select_stmt = select_stmt.options(*load_options)
     result = await session.scalar(select_stmt)
     if result is None:
         raise HTTPException(status_code=404, detail=f"Item not found")
+
+    if cache_key is not None:
+        response_cache.set(cache_key, cache_tables(model), result, cache_generation)
+
     return result
 
+@with_db_error_handling
+async def lookup_endpoint(session, model: type[DeclarativeBase], key_column, keys: list, load_options=None) -> dict:
+    """Generic bulk lookup endpoint generator
+
+    Fetches every item whose key_column is one of keys in a single key_column = ANY(:keys) query and returns
+    them in the order the keys were given, see LookupGet. A key matching several items, such as a shared
+    accounting group, is returned once for each of them.
+    """
+
+    select_stmt = select(model) \
+        .where(key_column == any_(bindparam("keys", list(dict.fromkeys(keys)), type_=postgresql.ARRAY(key_column.type)))) \
+        .order_by(*inspect(model).primary_key)
+
+    if load_options:
+        select_stmt = select_stmt.options(*load_options)
+
+    items_by_key = {}
+    for item in (await session.scalars(select_stmt)).all():
+        items_by_key.setdefault(getattr(item, key_column.key), []).append(item)
+
+    results = []
+    missing = []
+    for key in keys:
+        if key not in items_by_key:
+            results.append({"key": key, "item": None})
+            missing.append(key)
+            continue
+
+        results.extend({"key": key, "item": item} for item in items_by_key[key])
+
+    return {"results": results, "missing": missing}
+
+
+def _facet_value(value) -> str:
+    """The facet key of a column value, as it would be written in a filter"""
+
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, enum.Enum):
+        return str(value.value)
+
+    return str(value)
+
+
+@with_db_error_handling
+async def facets_endpoint(
+    session,
+    model: type[DeclarativeBase],
+    filter_query_params,
+    fields: str,
+    cache_key: Optional[tuple] = None,
+) -> dict:
+    """Generic facets endpoint generator
+
+    Counts the rows matching the filters for each value of each of the comma separated fields, in one
+    GROUPING SETS query over the filtered set, see FacetsGet. If cache_key is given the counts are kept in
+    the response cache for FACETS_CACHE_TTL.
+    """
+
+    cache_generation = response_cache.generation
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    field_names = [*dict.fromkeys(field.strip() for field in fields.split(",") if field.strip())]
+    if len(field_names) == 0 or len(field_names) > MAX_FACET_FIELDS:
+        raise HTTPException(status_code=400, detail=f"fields must list between 1 and {MAX_FACET_FIELDS} columns")
+
+    columns = []
+    for field_name in field_names:
+        column = model.__table__.c.get(field_name)
+        if column is None:
+            raise HTTPException(status_code=400, detail=f"Column ({field_name}) in fields not found")
+
+        columns.append(column)
+
+    query_parser = QueryParser(
+        columns=model.__table__.c,
+        query_params=filter_query_params,
+        relationship_filters=get_relationship_filters(model),
+    )
+
+    # One grouping set per column and () for the total, grouping(column) is 0 on the rows grouped by that column
+    select_stmt = select(
+        *[column.label(f"value_{i}") for i, column in enumerate(columns)],
+        *[func.grouping(column).label(f"grouping_{i}") for i, column in enumerate(columns)],
+        func.count().label("count"),
+    ) \
+        .where(query_parser.where_expressions()) \
+        .group_by(func.grouping_sets(*columns, tuple_()))
+
+    total = 0
+    facets = {field_name: {} for field_name in field_names}
+    for row in (await session.execute(select_stmt)).mappings():
+        grouped = [i for i in range(len(columns)) if row[f"grouping_{i}"] == 0]
+
+        if len(grouped) == 0:
+            total = row["count"]
+        else:
+            facets[field_names[grouped[0]]][_facet_value(row[f"value_{grouped[0]}"])] = row["count"]
+
+    results = {"total": total, "facets": facets}
+
+    if cache_key is not None:
+        response_cache.set(cache_key, cache_tables(model), results, cache_generation, ttl=FACETS_CACHE_TTL)
+
+    return results
+
 @with_db_error_handling
 async def create_one_endpoint(session, model: type[DeclarativeBase], item: T, load_options=None):
     """Generic create one endpoint generator"""
@@ -2,7 +2,7 @@ from typing import List, Optional
 
 from sqlalchemy import CheckConstraint, Column, Integer, String, Boolean, Text, TIMESTAMP, ForeignKey, UniqueConstraint, \
     func, VARCHAR, \
-    Table, Index, null
+    Table, Index, null, text, column
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy import Enum as SQLEnum
 from sqlalchemy.dialects.postgresql import JSONB
@@ -16,8 +16,37 @@ from userapp.core.models.views import UserApplicationView
 from userapp.core.models.views import UserGroupView
 
 
+def search_indexes(table_name: str, *column_names: str) -> tuple[Index, ...]:
+    """Indexes behind the like/ilike, startswith and istartswith filters of the commonly searched text columns
+
+    A pg_trgm GIN index serves substring matches, btrees with text_pattern_ops on the column and on lower(column)
+    serve case-sensitive and case-insensitive prefix matches. Created by the add_text_search_indexes migration,
+    which skips the trigram indexes where pg_trgm isn't available, as does autogenerate (see
+    userapp.migrations.include_object).
+    """
+
+    indexes = []
+    for column_name in column_names:
+        indexes.append(Index(
+            f'ix_{table_name}_{column_name}_trgm', column_name,
+            postgresql_using='gin', postgresql_ops={column_name: 'gin_trgm_ops'},
+            info=dict(requires_extension='pg_trgm'),
+        ))
+        indexes.append(Index(
+            f'ix_{table_name}_{column_name}_pattern', column_name, postgresql_ops={column_name: 'text_pattern_ops'},
+        ))
+        indexes.append(Index(
+            f'ix_{table_name}_{column_name}_lower_pattern', func.lower(column(column_name)).label(f'{column_name}_lower'),
+            postgresql_ops={f'{column_name}_lower': 'text_pattern_ops'},
+        ))
+
+    return tuple(indexes)
+
+
 class Group(Base):
     __tablename__ = 'groups'
+    __table_args__ = search_indexes('groups', 'name')
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(VARCHAR(32), unique=True, nullable=False)
     point_of_contact = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), index=True)
@@ -27,7 +56,7 @@ class Group(Base):
     point_of_contact_user: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[point_of_contact],
-        lazy="selectin",
+        lazy="raise",
     )
 
 
@@ -43,20 +72,22 @@ class Note(Base):
     author: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[author_id],
-        lazy="selectin",
+        lazy="raise",
     )
     users: Mapped[List["User"]] = relationship(
         secondary="user_notes",
         primaryjoin="Note.id==UserNote.note_id",
         secondaryjoin="User.id==UserNote.user_id",
         foreign_keys="[UserNote.note_id, UserNote.user_id]",
-        lazy="selectin",
+        lazy="raise",
         back_populates="notes"
     )
 
 
 class Project(Base):
     __tablename__ = 'projects'
+    __table_args__ = search_indexes('projects', 'name', 'accounting_group')
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, unique=True)
     pi = Column(Integer, index=True)
@@ -73,12 +104,12 @@ class Project(Base):
     staff1_user: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[staff1],
-        lazy="selectin",
+        lazy="raise",
     )
     staff2_user: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[staff2],
-        lazy="selectin",
+        lazy="raise",
     )
 
 
@@ -95,6 +126,7 @@ class User(Base):
         Index('ix_users_email1', 'email1'),
         Index('ix_users_unix_uid', 'unix_uid'),
         Index('ix_users_active', 'active'),
+        *search_indexes('users', 'name', 'netid', 'username', 'email1'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -119,35 +151,35 @@ class User(Base):
         primaryjoin="User.id==UserNote.user_id",
         secondaryjoin="Note.id==UserNote.note_id",
         foreign_keys="[UserNote.user_id, UserNote.note_id]",
-        lazy="selectin",
+        lazy="raise",
         back_populates="users"
     )
 
     submit_nodes: Mapped[List[UserSubmitNodesView]] = relationship(
         "UserSubmitNodesView",
         primaryjoin="User.id==foreign(UserSubmitNodesView.user_id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
 
     projects: Mapped[List["JoinedProjectView"]] = relationship(
         "JoinedProjectView",
         primaryjoin="User.id==foreign(JoinedProjectView.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
 
     groups: Mapped[List["UserGroupView"]] = relationship(
         "UserGroupView",
         primaryjoin="User.id==foreign(UserGroupView.user_id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
 
     user_forms: Mapped[List[UserApplicationView]] = relationship(
         "UserApplicationView",
         primaryjoin="User.id==foreign(UserApplicationView.created_by)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
 
@@ -228,7 +260,7 @@ class Token(Base):
     permissions: Mapped[List["TokenPermission"]] = relationship(
         "TokenPermission",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
 class TokenPermission(Base):
@@ -266,13 +298,13 @@ class BaseForm(Base):
     created_by_user: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[created_by],
-        lazy="selectin",
+        lazy="raise",
     )
 
     updated_by_user: Mapped[Optional["User"]] = relationship(
         "User",
         foreign_keys=[updated_by],
-        lazy="selectin",
+        lazy="raise",
     )
 
 class UserForm(Base):
@@ -291,7 +323,7 @@ class UserForm(Base):
 
     base_form: Mapped["BaseForm"] = relationship(
         "BaseForm",
-        lazy="selectin",
+        lazy="raise",
     )
 
     # must either provide (pi_id) or (pi_name and pi_email) but not both
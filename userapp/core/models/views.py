@@ -10,7 +10,7 @@ from userapp.core.models.main import Base
 
 class PiProjectView(Base):
     __tablename__ = 'pi_projects'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(is_view=True, base_tables=['users', 'user_projects', 'projects'])}
     user_id = Column(Integer, primary_key=True)
     name = Column(String(255))
     project_id = Column(Integer, primary_key=True)
@@ -22,7 +22,7 @@ class PiProjectView(Base):
 
 class JoinedProjectView(Base):
     __tablename__ = 'joined_projects'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(is_view=True, base_tables=['users', 'user_projects', 'projects', 'notes', 'user_notes'])}
     id = Column(Integer, primary_key=True)
     project_id = Column(Integer, primary_key=True)
     project_name = Column(String(255))
@@ -33,13 +33,13 @@ class JoinedProjectView(Base):
     staff1_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="JoinedProjectView.project_staff1==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
     staff2_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="JoinedProjectView.project_staff2==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
     )
     project_last_contact = Column(TIMESTAMP)
@@ -71,7 +71,7 @@ class JoinedProjectView(Base):
 
 class UserSubmitNodesView(Base):
     __tablename__ = 'user_submit_nodes'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(is_view=True, base_tables=['user_submits', 'submit_nodes'])}
     user_id = Column(Integer, primary_key=True)
     submit_node_id = Column(Integer, primary_key=True)
     submit_node_name = Column(String(60))
@@ -85,7 +85,7 @@ class UserSubmitNodesView(Base):
 
 class UserApplicationView(Base):
     __tablename__ = 'user_applications'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(is_view=True, base_tables=['forms', 'user_form'])}
 
     # BaseForm columns
     id = Column(Integer, primary_key=True)
@@ -108,7 +108,7 @@ class UserApplicationView(Base):
     created_by_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="UserApplicationView.created_by==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
         foreign_keys="[UserApplicationView.created_by]",
     )
@@ -116,7 +116,7 @@ class UserApplicationView(Base):
     updated_by_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="UserApplicationView.updated_by==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
         foreign_keys="[UserApplicationView.updated_by]",
     )
@@ -124,7 +124,7 @@ class UserApplicationView(Base):
     pi_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="UserApplicationView.pi_id==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
         foreign_keys="[UserApplicationView.pi_id]",
     )
@@ -133,7 +133,12 @@ class UserApplicationView(Base):
 class GroupUserView(Base):
     """A view intended to show a groups users in the context of a known group"""
     __tablename__ = 'group_users'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(
+        is_view=True,
+        base_tables=['user_groups', 'users'],
+        # The base table rows behind each row, their key columns to the view's, versioning the row for ETags
+        row_versions={'user_groups': {'group_id': 'group_id', 'user_id': 'user_id'}, 'users': {'id': 'user_id'}},
+    )}
 
     # Columns from UserGroup Table
     # No ForeignKey declarations — this is a view; FK constraints don't exist on it.
@@ -155,7 +160,11 @@ class GroupUserView(Base):
 class UserGroupView(Base):
     """A view intended to show a user's groups in the context of a known user"""
     __tablename__ = 'user_group_memberships'
-    __table_args__ = {'info': dict(is_view=True)}
+    __table_args__ = {'info': dict(
+        is_view=True,
+        base_tables=['user_groups', 'groups'],
+        row_versions={'user_groups': {'group_id': 'group_id', 'user_id': 'user_id'}, 'groups': {'id': 'group_id'}},
+    )}
 
     # Columns from UserGroup Table
     # No ForeignKey declarations — this is a view; FK constraints don't exist on it.
@@ -174,7 +183,7 @@ class UserGroupView(Base):
     point_of_contact_user: Mapped[Optional["User"]] = relationship(
         "User",
         primaryjoin="UserGroupView.point_of_contact==foreign(User.id)",
-        lazy="selectin",
+        lazy="raise",
         viewonly=True,
         foreign_keys="[UserGroupView.point_of_contact]",
     )
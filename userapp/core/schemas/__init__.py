@@ -0,0 +1 @@
+import userapp.core.schemas.registry  # noqa: F401, resolves the schemas' forward references
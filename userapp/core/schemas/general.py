@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Optional, TYPE_CHECKING
-from pydantic import BaseModel as PydanticBaseModel, ConfigDict, model_validator, Field, EmailStr, computed_field
+from typing import Generic, Optional, TYPE_CHECKING, TypeVar
+from pydantic import BaseModel as PydanticBaseModel, ConfigDict, model_validator, Field, EmailStr as PydanticEmailStr, computed_field
+from pydantic_core import core_schema
 
 from userapp.core.models.enum import RoleEnum, PositionEnum, FormStatusEnum, FormTypeEnum, EntityManagerEnum
 
@@ -15,10 +16,61 @@ class BaseModel(PydanticBaseModel):
             return {k: (None if v == '' else v) for k, v in values.items()}
         return values
 
+class EmailStr(PydanticEmailStr):
+    """Pydantic's EmailStr, except emails read back from the database are not validated again
+
+    Those were validated when they were written, see userapp/api/serialization.py.
+    """
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, _source, _handler) -> core_schema.CoreSchema:
+        return core_schema.with_info_after_validator_function(cls._validate_unless_stored, core_schema.str_schema())
+
+    @classmethod
+    def _validate_unless_stored(cls, input_value: str, info: core_schema.ValidationInfo) -> str:
+        if info.context and info.context.get("from_database"):
+            return input_value
+
+        return cls._validate(input_value)
+
 class Relationship(BaseModel):
     """Used to post entities to groups by id"""
     id: int
 
+# Most keys a single lookup request can ask for
+LOOKUP_MAX_KEYS = 1000
+
+class LookupPost(BaseModel):
+    """Base of the /lookup request bodies, each field is a list of keys and exactly one is given"""
+
+    @model_validator(mode="after")
+    def exactly_one_key_list(self):
+        given = [name for name in type(self).model_fields if getattr(self, name) is not None]
+        if len(given) != 1:
+            raise ValueError(f"Exactly one of {[*type(self).model_fields]} is required")
+        return self
+
+    def get_keys(self) -> tuple[str, list]:
+        """Returns the name of the given field and its keys"""
+
+        return next((name, getattr(self, name)) for name in type(self).model_fields if getattr(self, name) is not None)
+
+T = TypeVar("T")
+
+class LookupResult(BaseModel, Generic[T]):
+    key: int | str
+    item: Optional[T] = Field(default=None)
+
+class LookupGet(BaseModel, Generic[T]):
+    """Items in the order their keys were given, a key with no item has a null item and is also listed in missing"""
+    results: list[LookupResult[T]]
+    missing: list[int | str]
+
+class FacetsGet(BaseModel):
+    """Rows matching the filters, in total and per value of each requested column, null values are keyed 'null'"""
+    total: int
+    facets: dict[str, dict[str, int]]
+
 class PiProjectView(BaseModel):
     user_id: int
     name: Optional[str] = Field(default=None)
@@ -2,7 +2,7 @@ from pydantic import AfterValidator, ConfigDict, Field
 from typing import Optional, Annotated
 import re
 
-from userapp.core.schemas.general import BaseModel
+from userapp.core.schemas.general import BaseModel, LookupPost, LOOKUP_MAX_KEYS
 
 
 def group_name_validator(name: str) -> str:
@@ -50,3 +50,8 @@ class GroupGet(BaseModel):
     point_of_contact: Optional["UserGet"] = Field(default=None, validation_alias='point_of_contact_user')
     unix_gid: Optional[int] = Field(default=None)
     has_groupdir: bool
+
+
+class GroupLookupPost(LookupPost):
+    ids: Optional[list[int]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
+    names: Optional[list[str]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
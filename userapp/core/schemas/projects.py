@@ -3,7 +3,7 @@ from typing import Optional
 
 from pydantic import HttpUrl, field_serializer, ConfigDict, Field
 
-from userapp.core.schemas.general import BaseModel
+from userapp.core.schemas.general import BaseModel, LookupPost, LOOKUP_MAX_KEYS
 
 class ProjectTableSchema(BaseModel):
     """Used to represent a project as stored in the database"""
@@ -65,3 +65,9 @@ class ProjectPatch(BaseModel):
     @field_serializer('url')
     def serialize_url(self, url):
         return str(url) if url is not None else None
+
+
+class ProjectLookupPost(LookupPost):
+    ids: Optional[list[int]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
+    names: Optional[list[str]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
+    accounting_groups: Optional[list[str]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
@@ -0,0 +1,39 @@
+#
+# Forward references
+#
+# Schemas embedding a user refer to it as "UserGet", which users.py defines after importing them. They are
+# resolved here once, when userapp.core.schemas is first imported, rather than by each module that uses them,
+# so every schema is complete before any route declares it as a response model.
+#
+
+from pydantic import BaseModel
+
+from userapp.core.schemas.general import JoinedProjectView, UserApplicationViewFull, UserGroupView
+from userapp.core.schemas.groups import GroupGet
+from userapp.core.schemas.note import NoteGet, NoteGetFull
+from userapp.core.schemas.projects import ProjectGet
+from userapp.core.schemas.users import UserGet, UserGetFull
+
+FORWARD_REFERENCES = {"UserGet": UserGet}
+
+# In dependency order, UserGetFull embeds schemas above it
+SCHEMAS = [
+    GroupGet,
+    JoinedProjectView,
+    UserApplicationViewFull,
+    UserGroupView,
+    NoteGet,
+    NoteGetFull,
+    ProjectGet,
+    UserGetFull,
+]
+
+
+def rebuild_schemas(schemas: list[type[BaseModel]] = SCHEMAS) -> None:
+    """Resolves the forward references of schemas, a no-op for those already complete"""
+
+    for schema in schemas:
+        schema.model_rebuild(_types_namespace=FORWARD_REFERENCES)
+
+
+rebuild_schemas()
@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from userapp.core.schemas.general import BaseModel
+
+
+class PoolStatsGet(BaseModel):
+    """Connection pool of this worker, counters are since the pool was created"""
+
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    max_overflow: int
+    timeout: float
+
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+class ReplicaStatusGet(BaseModel):
+    """The read replica as last checked, GET requests go to the primary while it is not healthy"""
+
+    healthy: bool
+    lag_seconds: Optional[float]
+    max_lag_seconds: float
+    pool: PoolStatsGet
+
+
+class SlowQueryGet(BaseModel):
+    """A statement that ran for longer than SLOW_QUERY_THRESHOLD, plan is its EXPLAIN (ANALYZE, BUFFERS) if it was sampled"""
+
+    id: int
+    statement: str
+    parameter_types: list[str]
+    duration_ms: float
+    method: Optional[str]
+    route: Optional[str]
+    recorded_at: datetime
+    plan: Optional[Any] = None
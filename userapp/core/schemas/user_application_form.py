@@ -1,10 +1,10 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import Field, model_validator, EmailStr
+from pydantic import Field, model_validator
 
 from userapp.core.models.enum import FormStatusEnum, FormTypeEnum, PositionEnum, RoleEnum
-from userapp.core.schemas.general import BaseModel
+from userapp.core.schemas.general import BaseModel, EmailStr
 from userapp.core.schemas.users import UserGet, UserSubmitPost
 
 
@@ -1,4 +1,4 @@
-from pydantic import EmailStr, AfterValidator, model_validator, ConfigDict, Field, computed_field
+from pydantic import AfterValidator, model_validator, ConfigDict, Field, computed_field
 from typing import Optional, Annotated
 from datetime import datetime
 import re
@@ -6,7 +6,7 @@ import re
 from userapp.core.schemas.general import JoinedProjectView, UserApplicationView as UserApplicationViewSchema, UserGroupView
 from userapp.core.schemas.note import NoteGet
 from userapp.core.schemas.user_submit import UserSubmitGet, UserSubmitPost
-from userapp.core.schemas.general import BaseModel
+from userapp.core.schemas.general import BaseModel, EmailStr, LookupPost, LOOKUP_MAX_KEYS
 from userapp.core.schemas.groups import GroupGet
 from userapp.core.models.enum import RoleEnum, PositionEnum
 
@@ -154,3 +154,9 @@ class RestrictedUserPatch(BaseModel):
     email2: Optional[EmailStr] = Field(default=None)
     phone1: Optional[str] = Field(default=None)
     phone2: Optional[str] = Field(default=None)
+
+
+class UserLookupPost(LookupPost):
+    ids: Optional[list[int]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
+    netids: Optional[list[str]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
+    usernames: Optional[list[str]] = Field(default=None, max_length=LOOKUP_MAX_KEYS)
@@ -5,42 +5,359 @@
 #
 # On the bottom you will find the methods that do not use this method
 #
+import asyncio
+import logging
 import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
 from typing import AsyncGenerator
 
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from fastapi import Depends
 from dotenv import load_dotenv
 from starlette.requests import Request
 
+from userapp.api.metrics import commit_duration
+
 load_dotenv()
 
-async def connect_engine(db_url: str) -> AsyncEngine:
+logger = logging.getLogger(__name__)
+
+# Milliseconds any statement may run for before Postgres cancels it, set on every connection. Routes can
+# give their statements another budget with the statement_timeout dependency, 0 disables the timeout.
+STATEMENT_TIMEOUT = int(os.getenv("STATEMENT_TIMEOUT", "30000"))
+
+# Requests that only read and so can be served by the replica
+SAFE_METHODS = {"GET", "HEAD"}
+
+# Whether the replica is streaming WAL from the primary, and the seconds it is behind, 0 once it has replayed
+# everything it received. A replica whose WAL receiver has disconnected has also replayed everything it received,
+# so it only counts as caught up while streaming. The status of pg_stat_wal_receiver needs pg_read_all_stats,
+# without it a running WAL receiver is taken to be streaming.
+REPLICA_LAG_QUERY = """
+SELECT
+    NOT pg_is_in_recovery() OR EXISTS (
+        SELECT 1 FROM pg_stat_wal_receiver WHERE coalesce(status = 'streaming', pid IS NOT NULL)
+    ) AS streaming,
+    CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag
+"""
+
+@dataclass
+class PoolStats:
+    """Checkouts of an ObservedPool since it was created, waits include opening a new connection"""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class ObservedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool recording how long each checkout waited for a connection"""
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        # Connections that can be opened beyond the pool size, as configured
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            wait_seconds = time.perf_counter() - start
+            self.stats.wait_seconds_total += wait_seconds
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, wait_seconds)
+
+        self.stats.checkouts += 1
+        return connection
+
+
+def _unnamed_statement() -> str:
+    return ""
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4().hex}__"
+
+
+async def connect_engine(
+    db_url: str,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    pool_recycle: int = -1,
+    pool_pre_ping: bool = False,
+    pgbouncer: bool = False,
+    statement_cache_size: int | None = None,
+) -> AsyncEngine:
+    """Engine of the database at db_url, pooled by an ObservedPool
+
+    Connecting directly each connection keeps its statement_cache_size (default 100) most recent prepared
+    statements so repeated queries skip the parse and plan.
+
+    With pgbouncer, for PgBouncer in transaction pooling mode, a server connection is shared by every
+    client so named statements could be missing or clash. By default statements are unnamed and not
+    cached. A statement_cache_size caches them under unique names, which needs PgBouncer 1.21+ with
+    max_prepared_statements set. PgBouncer rejects the statement_timeout startup parameter, so set
+    STATEMENT_TIMEOUT on the database role instead.
+    """
+
     # Normalize URL for asyncpg
     if db_url.startswith("postgresql://"):
         db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-    connect_args = {}
+    if pgbouncer:
+        statement_cache_size = statement_cache_size or 0
+        connect_args = {
+            # asyncpg's own cache names its statements per connection, only SQLAlchemy's is kept
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": statement_cache_size,
+            "prepared_statement_name_func": _unique_statement_name if statement_cache_size else _unnamed_statement,
+        }
+    else:
+        statement_cache_size = 100 if statement_cache_size is None else statement_cache_size
+        connect_args = {
+            "statement_cache_size": statement_cache_size,
+            "prepared_statement_cache_size": statement_cache_size,
+            "server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT)},
+        }
+
     if os.environ.get("PYTHON_ENV") != "production":
         connect_args["ssl"] = False
 
-    engine: AsyncEngine = create_async_engine(db_url, connect_args=connect_args)
+    engine: AsyncEngine = create_async_engine(
+        db_url,
+        connect_args=connect_args,
+        poolclass=ObservedPool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+    )
 
     return engine
 
 
+def get_pool_stats(engine: AsyncEngine) -> dict:
+    """Current occupancy and checkout statistics of the engine's pool"""
+
+    pool = engine.pool
+
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # Negative until the pool has opened pool_size connections
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool.max_overflow,
+        "timeout": pool.timeout(),
+        **asdict(pool.stats),
+    }
+
+
 async def dispose_engine(engine) -> None:
     if engine is not None:
         await engine.dispose()
 
 
-def get_async_session(request: Request) -> async_sessionmaker[AsyncSession]:
-    return async_sessionmaker(request.app.state._state.get('engine', None), expire_on_commit=False)
+class ReplicaMonitor:
+    """Tracks whether the replica is up and close enough behind the primary to serve reads
+
+    The lag is measured at most every check_interval seconds, by the first request that needs it.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_lag: float, check_interval: float, check_timeout: float = 2):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+
+        self.healthy = False
+        self.lag: float | None = None
+        self.checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.check_interval
+
+    async def is_healthy(self) -> bool:
+        if self._is_stale():
+            async with self._lock:
+                # Another request may have checked while this one waited
+                if self._is_stale():
+                    await self.check()
+
+        return self.healthy
+
+    async def check(self) -> None:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with self.engine.connect() as connection:
+                    streaming, lag = (await connection.execute(text(REPLICA_LAG_QUERY))).one()
+
+            self.lag = float(lag) if lag is not None else None
+            self.healthy = streaming and self.lag is not None and self.lag <= self.max_lag
+            if not streaming:
+                logger.warning("Replica isn't streaming from the primary, reading from the primary")
+            elif not self.healthy:
+                logger.warning(f"Replica is {self.lag} seconds behind, reading from the primary")
+
+        except Exception as e:
+            logger.warning(f"Replica is unavailable, reading from the primary: {e}")
+            self.lag = None
+            self.healthy = False
+
+        self.checked_at = time.monotonic()
+
+
+def use_primary(endpoint):
+    """Marks an endpoint whose GET requests read from the primary rather than the replica
+
+    For reads that have to see a write the client has just made, such as /me right after logging in.
+    Apply it below the route decorator.
+    """
+
+    endpoint.use_primary = True
+    return endpoint
+
+
+def use_transaction(endpoint):
+    """Marks an endpoint, or a route dependency, whose GET requests run in a transaction
+
+    GET and HEAD requests otherwise run their statements in autocommit, without a BEGIN and COMMIT around them.
+    For reads that have to see one snapshot across statements, that write or that SET LOCAL.
+    Apply it below the route decorator.
+    """
 
-async def session_generator(request: Request, async_session_maker=Depends(get_async_session)) -> AsyncGenerator[AsyncSession, None]:
+    endpoint.use_transaction = True
+    return endpoint
+
+
+def _route(request: Request):
+    return request.scope.get("route")
+
+
+def _reads_from_replica(request: Request) -> bool:
+    if request.method not in SAFE_METHODS:
+        return False
+
+    return not getattr(getattr(_route(request), "endpoint", None), "use_primary", False)
+
+
+def _runs_in_transaction(request: Request) -> bool:
+    if request.method not in SAFE_METHODS:
+        return True
+
+    route = _route(request)
+    if getattr(getattr(route, "endpoint", None), "use_transaction", False):
+        return True
+
+    if any(getattr(dependency.dependency, "use_transaction", False) for dependency in getattr(route, "dependencies", ())):
+        return True
+
+    # The dependencies of the endpoint's parameters, and theirs
+    return _depends_on_transaction(getattr(route, "dependant", None))
+
+
+def _depends_on_transaction(dependant) -> bool:
+    if dependant is None:
+        return False
+
+    return any(
+        getattr(dependency.call, "use_transaction", False) or _depends_on_transaction(dependency)
+        for dependency in dependant.dependencies
+    )
+
+
+async def _uses_replica(request: Request) -> bool:
+    replica_monitor = getattr(request.app.state, "replica_monitor", None)
+    return replica_monitor is not None and _reads_from_replica(request) and await replica_monitor.is_healthy()
+
+
+async def get_async_session(request: Request) -> async_sessionmaker[AsyncSession]:
+    """The sessionmaker built once by the app's lifespan
+
+    GET and HEAD requests get the replica's if a replica is configured and healthy, see ReplicaMonitor.
+    """
+
+    state = request.app.state
+
+    if await _uses_replica(request):
+        return state.replica_session_maker
+
+    return state.async_session_maker
+
+
+async def get_autocommit_session(request: Request) -> async_sessionmaker[AsyncSession]:
+    """As get_async_session, but its sessions run each statement in autocommit"""
+
+    state = request.app.state
+
+    if await _uses_replica(request):
+        return state.replica_autocommit_session_maker
+
+    return state.autocommit_session_maker
+
+
+async def session_generator(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """The request's session, committed and closed as soon as the endpoint returns
+
+    Depend on it with Depends(session_generator, scope="function"), the default "request" scope would only
+    return the connection after the response is sent. A connection is checked out on the first statement, so
+    requests that never query don't take one, and GET and HEAD requests run in autocommit unless the endpoint
+    is marked with use_transaction.
+    """
+
+    if _runs_in_transaction(request):
+        async_session_maker = await get_async_session(request)
+    else:
+        async_session_maker = await get_autocommit_session(request)
+
+    # Closing the session rolls back if the endpoint raised
     async with async_session_maker() as session:
-        async with session.begin():
-            request.state.db_session = session
-            yield session
+        yield session
+
+        if session.in_transaction():
+            start = time.perf_counter()
+            await session.commit()
+            commit_duration.observe(time.perf_counter() - start)
+
+
+async def set_statement_timeout(session: AsyncSession, milliseconds: int) -> None:
+    """Sets the statement timeout for the rest of the session's transaction
+
+    SET LOCAL has no effect in autocommit, so this raises if the request's GETs aren't marked with use_transaction.
+    """
+
+    connection = await session.connection()
+    if connection.sync_connection.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+        raise RuntimeError("SET LOCAL statement_timeout in autocommit, mark the endpoint or dependency with use_transaction")
+
+    await session.execute(text(f"SET LOCAL statement_timeout = {int(milliseconds)}"))
+
+
+def statement_timeout(milliseconds: int):
+    """Route dependency giving the statements of the request their own timeout rather than STATEMENT_TIMEOUT
+
+    router.get("/expensive", dependencies=[Depends(statement_timeout(5000))])
+    """
+
+    @use_transaction
+    async def _statement_timeout(session=Depends(session_generator, scope="function")) -> None:
+        await set_statement_timeout(session, milliseconds)
 
+    return _statement_timeout
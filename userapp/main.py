@@ -1,49 +1,26 @@
 from contextlib import asynccontextmanager
-from pathlib import Path
 from typing import Optional
 import asyncio
 import logging
-import os
 
-import uvicorn
-from alembic import command
-from alembic.config import Config as AlembicConfig
 from fastapi import FastAPI
 from pydantic_settings import BaseSettings
-from starlette.requests import Request
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from userapp.api.instrumentation import ServerTimingMiddleware
+from userapp.api.metrics import MetricsMiddleware, MultiprocessMetrics, share_metrics
 from userapp.api.routes import all_routers
+from userapp.api.routes.metrics import worker_metrics
 from userapp.db import (
     connect_engine,
-    dispose_engine
+    dispose_engine,
+    ReplicaMonitor
 )
+from userapp.migrations import migrate
 
 logger = logging.getLogger(__name__)
 
 
-def run_migrations(db_url: str) -> None:
-    """
-    Run Alembic `upgrade head` synchronously.
-
-    Idempotent: creates all tables/views/enums on an empty DB,
-    no-ops on an already-migrated DB.
-    """
-    # alembic.ini lives at the repo root, one level above the `userapp` package.
-    project_root = Path(__file__).resolve().parent.parent
-    alembic_ini = project_root / "alembic.ini"
-
-    cfg = AlembicConfig(str(alembic_ini))
-    # Make sure the migration scripts dir resolves correctly regardless of CWD.
-    cfg.set_main_option("script_location", str(project_root / "alembic"))
-
-    # env.py reads DB_URL from the environment; make sure it's set.
-    os.environ["DB_URL"] = db_url
-
-    logger.info("Running Alembic migrations (upgrade head)...")
-    command.upgrade(cfg, "head")
-    logger.info("Alembic migrations complete.")
-
-
 class AppSettings(BaseSettings):
     DB_HOST: Optional[str] = None
     DB_PORT: Optional[int] = 5432
@@ -57,6 +34,33 @@ class AppSettings(BaseSettings):
     SMTP_SERVER: Optional[str] = "smtp.wiscmail.wisc.edu"
     SMTP_PORT: Optional[int] = 587
 
+    # Connection pool of the engine, see sqlalchemy.create_engine
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+
+    # Set when connecting through PgBouncer in transaction pooling mode, prepared statements are then unnamed
+    # unless DB_STATEMENT_CACHE_SIZE is set, see connect_engine
+    DB_PGBOUNCER: bool = False
+    # Prepared statements kept per connection, 100 connecting directly and 0 with DB_PGBOUNCER when unset
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None
+
+    # Optional streaming replica serving GET and HEAD requests while it is at most DB_REPLICA_MAX_LAG seconds
+    # behind, its lag is checked every DB_REPLICA_CHECK_INTERVAL seconds
+    DB_REPLICA_URL: Optional[str] = None
+    DB_REPLICA_MAX_LAG: float = 10
+    DB_REPLICA_CHECK_INTERVAL: float = 5
+
+    # Set to false when migrations are run before deploying with `python -m userapp migrate`
+    DB_MIGRATE_ON_STARTUP: bool = True
+
+    # Directory the workers share their metrics through, set by `python -m userapp serve` when it runs more than
+    # one, each writes its metrics to it every METRICS_SHARE_INTERVAL seconds
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+    METRICS_SHARE_INTERVAL: float = 5
+
 
 settings = AppSettings()
 
@@ -67,20 +71,60 @@ async def setup_engine(a: FastAPI):
     if settings.DB_URL is None:
         settings.DB_URL = f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"  # Fix typo DB_name -> DB_NAME
 
-    # Apply Alembic migrations before the app starts serving requests.
-    # `command.upgrade` is synchronous and uses its own (sync) engine internally,
-    # so we run it in a worker thread to avoid blocking the event loop.
-    await asyncio.to_thread(run_migrations, settings.DB_URL)
+    # Apply Alembic migrations before the app starts serving requests, unless they are run separately with
+    # `python -m userapp migrate`
+    if settings.DB_MIGRATE_ON_STARTUP:
+        await migrate(settings.DB_URL)
+
+    pool_settings = dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pgbouncer=settings.DB_PGBOUNCER,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    )
 
     # assume connect_engine returns the engine instance
-    engine = await connect_engine(settings.DB_URL)
+    engine = await connect_engine(settings.DB_URL, **pool_settings)
 
     a.state.engine = engine
+    a.state.async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    # Shares the engine's pool, for reads that don't need a transaction
+    a.state.autocommit_session_maker = async_sessionmaker(engine.execution_options(isolation_level="AUTOCOMMIT"), expire_on_commit=False)
+
+    replica_engine = None
+    a.state.replica_monitor = None
+    if settings.DB_REPLICA_URL is not None:
+        replica_engine = await connect_engine(settings.DB_REPLICA_URL, **pool_settings)
+
+        a.state.replica_engine = replica_engine
+        a.state.replica_session_maker = async_sessionmaker(replica_engine, expire_on_commit=False)
+        a.state.replica_autocommit_session_maker = async_sessionmaker(replica_engine.execution_options(isolation_level="AUTOCOMMIT"), expire_on_commit=False)
+        a.state.replica_monitor = ReplicaMonitor(
+            replica_engine,
+            max_lag=settings.DB_REPLICA_MAX_LAG,
+            check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+        )
+
+    a.state.multiprocess_metrics = None
+    if settings.METRICS_MULTIPROC_DIR is not None:
+        a.state.multiprocess_metrics = MultiprocessMetrics(settings.METRICS_MULTIPROC_DIR)
+        share_task = asyncio.create_task(share_metrics(
+            a.state.multiprocess_metrics, lambda: worker_metrics(a.state), settings.METRICS_SHARE_INTERVAL,
+        ))
 
     try:
         yield
     finally:
+        if a.state.multiprocess_metrics is not None:
+            share_task.cancel()
+            # The requests this worker served keep counting after it stops
+            a.state.multiprocess_metrics.write(worker_metrics(a.state))
+
         await dispose_engine(engine)
+        await dispose_engine(replica_engine)
 
 def create_app() -> FastAPI:
 
@@ -89,27 +133,16 @@ def create_app() -> FastAPI:
         openapi_prefix="./",
     )
 
-    @app.middleware("http")
-    async def commit_db_session(request: Request, call_next):
-        """
-        Commit db_session before response is returned.
-        """
-        response = await call_next(request)
-        db_session = request.state._state.get("db_session")  # noqa
-        if db_session:
-            await db_session.commit()
-        return response
+    app.add_middleware(ServerTimingMiddleware)
+    app.add_middleware(MetricsMiddleware)
 
     for router in all_routers:
         app.include_router(router)
 
     return app
 
-async def main():
-    config = uvicorn.Config("userapp.main:create_app", host="0.0.0.0", port=80, log_level="info", factory=True)
-    server = uvicorn.Server(config)
-    await server.serve()
-
-# To run the server, use the following command in your terminal:
+# To run the server, use `python -m userapp serve`, see userapp/server.py
 if __name__ == "__main__":
-    asyncio.run(main())
+    from userapp.server import serve
+
+    serve()
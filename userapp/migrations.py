@@ -0,0 +1,155 @@
+#
+# Database migrations
+#
+# Every worker calls migrate on startup (unless DB_MIGRATE_ON_STARTUP is false), as does
+# `python -m userapp migrate`. The database's alembic_version is compared with the heads of the scripts in
+# alembic/versions, read from their revision lines rather than by loading each script, so a database that is
+# already current costs one query. Otherwise one process at a time takes a Postgres advisory lock and runs
+# Alembic's upgrade, the others wait for it and find the database current once they get the lock.
+#
+
+import asyncio
+import logging
+import os
+import re
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from userapp.db import connect_engine
+
+logger = logging.getLogger(__name__)
+
+# alembic.ini lives at the repo root, one level above the `userapp` package.
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+VERSIONS_DIR = PROJECT_ROOT / "alembic" / "versions"
+
+# Key of the advisory lock held while migrating, shared by every process of the app
+MIGRATION_LOCK_KEY = 4_827_310_552
+# Seconds between attempts to take the lock while another process migrates
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+_REVISION = re.compile(r"^revision\s*(?::[^=]*)?=\s*['\"](\w+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\s*(?::[^=]*)?=\s*(.+)$", re.MULTILINE)
+
+
+def get_db_url() -> str:
+    """DB_URL, or the URL built from DB_USER, DB_PASSWORD, DB_HOST, DB_PORT and DB_NAME"""
+
+    return os.environ.get("DB_URL") or (
+        f"postgresql+asyncpg://{os.environ.get('DB_USER')}:{os.environ.get('DB_PASSWORD')}"
+        f"@{os.environ.get('DB_HOST')}:{os.environ.get('DB_PORT', '5432')}/{os.environ.get('DB_NAME')}"
+    )
+
+
+def script_heads(versions_dir: Path = VERSIONS_DIR) -> set[str]:
+    """The revisions of the migration scripts that no other script revises"""
+
+    revisions = set()
+    down_revisions = set()
+
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text()
+
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision is not None:
+            # None, a single revision or a tuple of them for a merge
+            down_revisions.update(re.findall(r"['\"](\w+)['\"]", down_revision.group(1)))
+
+    return revisions - down_revisions
+
+
+def include_object(installed_extensions: set[str]):
+    """Alembic's include_object hook for autogenerate, comparing only what the migrations create
+
+    Views are created by hand-written migrations, and objects requiring an extension (their info's
+    requires_extension) are skipped where it isn't installed, as the migrations skip them.
+    """
+
+    def include(object, name, type_, reflected, compare_to) -> bool:
+        if type_ == "table" and object.info.get("is_view"):
+            return False
+
+        if type_ == "index" and not reflected:
+            extension = object.info.get("requires_extension")
+            if extension is not None and extension not in installed_extensions:
+                return False
+
+        return True
+
+    return include
+
+
+async def database_revisions(connection: AsyncConnection) -> set[str]:
+    """The revisions in alembic_version, empty for a database that was never migrated"""
+
+    if (await connection.execute(text("SELECT to_regclass('alembic_version')"))).scalar() is None:
+        return set()
+
+    return set((await connection.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+
+
+def run_migrations(db_url: str) -> None:
+    """
+    Run Alembic `upgrade head` synchronously.
+
+    Idempotent: creates all tables/views/enums on an empty DB,
+    no-ops on an already-migrated DB.
+    """
+    from alembic import command
+    from alembic.config import Config as AlembicConfig
+
+    cfg = AlembicConfig(str(PROJECT_ROOT / "alembic.ini"))
+    # Make sure the migration scripts dir resolves correctly regardless of CWD.
+    cfg.set_main_option("script_location", str(PROJECT_ROOT / "alembic"))
+
+    # env.py reads DB_URL from the environment; make sure it's set.
+    os.environ["DB_URL"] = db_url
+
+    logger.info("Running Alembic migrations (upgrade head)...")
+    command.upgrade(cfg, "head")
+    logger.info("Alembic migrations complete.")
+
+
+async def _lock(connection: AsyncConnection) -> None:
+    # Polled rather than waited on with pg_advisory_lock so the wait isn't cut short by STATEMENT_TIMEOUT
+    while not (await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})).scalar():
+        await asyncio.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+
+async def migrate(db_url: str) -> bool:
+    """Upgrades the database to the scripts' head unless it is already there, returns whether it ran the upgrade"""
+
+    heads = script_heads()
+
+    engine = await connect_engine(db_url, pool_size=1, max_overflow=0)
+    try:
+        async with engine.connect() as connection:
+            # Nothing is held between statements while another process migrates
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+
+            if await database_revisions(connection) == heads:
+                logger.info("Database is at the latest migration.")
+                return False
+
+            await _lock(connection)
+            try:
+                # Another process may have migrated while this one waited for the lock
+                if await database_revisions(connection) == heads:
+                    logger.info("Database was migrated by another process.")
+                    return False
+
+                # `command.upgrade` is synchronous and uses its own (sync) engine internally,
+                # so we run it in a worker thread to avoid blocking the event loop.
+                await asyncio.to_thread(run_migrations, db_url)
+                return True
+            finally:
+                await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    finally:
+        await engine.dispose()
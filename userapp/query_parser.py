@@ -6,8 +6,8 @@
 
 import urllib.parse
 from dataclasses import dataclass
-from functools import lru_cache
-from typing import Union
+from functools import cached_property, lru_cache
+from typing import Any, Union
 
 from multidict import MultiDict
 import starlette.requests
@@ -15,9 +15,15 @@ import logging
 from fastapi import FastAPI, HTTPException, Request
 
 from sqlalchemy.sql.expression import SQLColumnExpression
-from sqlalchemy import or_, and_, Column, not_, func, distinct, cast, String, case, true
+from sqlalchemy import or_, and_, Column, not_, func, distinct, cast, String, case, true, exists
 
-VALID_OPERATORS = ["not", "eq", "lt", "le", "gt", "ge", "ne", "like", "ilike", "in", "is"]
+VALID_OPERATORS = ["not", "eq", "lt", "le", "gt", "ge", "ne", "like", "ilike", "startswith", "istartswith", "in", "is"]
+
+# Query params that control the listing itself rather than filter it
+RESERVED_QUERY_PARAMS = ["page", "page_size", "cursor", "count", "format", "embed", "fields"]
+
+# Distinct (columns, query params) pairs kept parsed, see compile_query
+COMPILED_QUERY_CACHE_SIZE = 1024
 
 log = logging.getLogger(__name__)
 
@@ -27,9 +33,9 @@ class ParserException(Exception):
 
 
 def get_filter_query_params(request: Request) -> list[tuple[str, str]]:
-    """Returns the query params that are not page or page_size"""
+    """Returns the query params that are not reserved for pagination"""
 
-    return [*filter(lambda x: x[0] not in ["page", "page_size"], request.query_params.multi_items())]
+    return [*filter(lambda x: x[0] not in RESERVED_QUERY_PARAMS, request.query_params.multi_items())]
 
 
 def cast_to_column_type(column: Column, value):
@@ -60,180 +66,288 @@ class QueryParameter:
     operators: list[str]
     value: str
 
+    # Name of the RelationshipFilter for <relationship>.<column> params, column is then the related column
+    relationship: str | None = None
+
     def __str__(self):
         return f"{self.column} {self.operators} {self.value}"
 
     def is_mapped_to_column(self) -> bool:
         return isinstance(self.column, Column)
 
+    def compile(self) -> "CompiledFilter":
+        return CompiledFilter(
+            column=self.column,
+            operators=tuple(self.operators),
+            value=_cast_operator_value(self.column, self.operators, self.value)
+        )
+
     def get_operator_expression(self):
-        return self._get_operator_expression(self.column, self.operators, self.value)
+        return self.compile().to_expression()
+
+
+def _cast_operator_value(column: Column, operators, value: str):
+    """Validates the filter and casts its value to the column's type"""
+
+    if len(operators) == 0:
+        raise ParserException(f"Query parameters invalid")
+
+    match operators[0]:
+        case "not":
+            return _cast_operator_value(column, operators[1:], value)
+
+        case "eq" | "lt" | "le" | "gt" | "ge" | "ne" | "is_distinct_from" | "is_not_distinct_from":
+            return cast_to_column_type(column, value)
+
+        case "like" | "ilike":
+            if value[0] != "%" or value[-1] != "%":
+                value = f"%{value}%"
 
-    @staticmethod
-    def _get_operator_expression(column: Column, operators, value: str):
+            return cast_to_column_type(column, value)
 
-        if len(operators) == 0:
-            raise ParserException(f"Query parameters invalid")
+        case "startswith" | "istartswith":
+            if column.type.python_type is not str:
+                raise ParserException(f"{operators[0]} can only filter text columns")
 
-        match operators[0]:
-            case "not":
-                return not_(
-                    QueryParameter._get_operator_expression(column, operators[1:], value)
+            # The value is matched literally, Postgres' default LIKE escape character is backslash
+            prefix = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            if operators[0] == "istartswith":
+                prefix = prefix.lower()
+
+            return f"{prefix}%"
+
+        case "in":
+            if value[0] != "(" or value[-1] != ")":
+                raise ParserException(
+                    f"Query param value for in must be in form (x,y,z)"
                 )
 
-            case "eq":
-                value = cast_to_column_type(column, value)
-                return column.__eq__(value)
+            values = value[1:-1].split(",")
+            return tuple(cast_to_column_type(column, x) for x in values)
 
-            case "lt":
-                value = cast_to_column_type(column, value)
-                return column.__lt__(value)
+        case "is":
+            if value.lower() == "false":
+                return False
+            elif value.lower() == "true":
+                return True
+            elif value.lower() == "null":
+                return None
+            else:
+                raise ParserException(
+                    f"Query params outside valid set: {operators}"
+                )
 
-            case "le":
-                value = cast_to_column_type(column, value)
-                return column.__le__(value)
+        case "_":
+            raise ParserException(f"Query params outside valid set: {operators}")
 
-            case "gt":
-                value = cast_to_column_type(column, value)
-                return column.__gt__(value)
+    return value
 
-            case "ge":
-                value = cast_to_column_type(column, value)
-                return column.__ge__(value)
 
-            case "ne":
-                value = cast_to_column_type(column, value)
-                return column.__ne__(value)
+def _operator_expression(column: Column, operators, value):
 
-            case "is_distinct_from":
-                value = cast_to_column_type(column, value)
-                return column.is_distinct_from(value)
+    match operators[0]:
+        case "not":
+            return not_(_operator_expression(column, operators[1:], value))
 
-            case "is_not_distinct_from":
-                value = cast_to_column_type(column, value)
-                return column.is_not_distinct_from(value)
+        case "eq":
+            return column.__eq__(value)
 
-            case "like":
-                if value[0] != "%" or value[-1] != "%":
-                    value = f"%{value}%"
+        case "lt":
+            return column.__lt__(value)
 
-                value = cast_to_column_type(column, value)
-                return column.like(value)
+        case "le":
+            return column.__le__(value)
 
-            case "ilike":
-                if value[0] != "%" or value[-1] != "%":
-                    value = f"%{value}%"
+        case "gt":
+            return column.__gt__(value)
 
-                value = cast_to_column_type(column, value)
-                return column.ilike(value)
+        case "ge":
+            return column.__ge__(value)
 
-            case "in":
-                if value[0] != "(" or value[-1] != ")":
-                    raise ParserException(
-                        f"Query param value for in must be in form (x,y,z)"
-                    )
+        case "ne":
+            return column.__ne__(value)
 
-                values = value[1:-1].split(",")
-                clean_values = map(lambda x: cast_to_column_type(column, x), values)
-
-                return column.in_(clean_values)
-
-            case "is":
-                if value.lower() == "false":
-                    return column.is_(False)
-                elif value.lower() == "true":
-                    return column.is_(True)
-                elif value.lower() == "null":
-                    return column.is_(None)
-                else:
-                    raise ParserException(
-                        f"Query params outside valid set: {operators}"
-                    )
+        case "is_distinct_from":
+            return column.is_distinct_from(value)
 
-            case "_":
-                raise ParserException(f"Query params outside valid set: {operators}")
+        case "is_not_distinct_from":
+            return column.is_not_distinct_from(value)
 
+        case "like":
+            return column.like(value)
 
-class QueryParser:
-    """Used to parse the query parameters from the request"""
+        case "ilike":
+            return column.ilike(value)
 
-    VALID_OPERATORS = VALID_OPERATORS
+        case "startswith":
+            return column.like(value)
 
-    def __init__(self, columns: list[Column], query_params: list[dict] | None):
+        # Compared on lower(column) so the lower(column) text_pattern_ops index can be used, ILIKE never uses a btree
+        case "istartswith":
+            return func.lower(column).like(value)
 
-        # If no query params, then set to empty list
-        if query_params is None:
-            query_params = []
+        case "in":
+            return column.in_(value)
 
-        self.columns = {c.name: c for c in columns}
-        self.query_params = query_params
+        case "is":
+            return column.is_(value)
 
-    def where_expressions(self):
-        """Returns the where expressions for the query"""
 
-        where_expressions = []
+@dataclass(frozen=True)
+class CompiledFilter:
+    """A filter with its value already cast, turned into a fresh SQLAlchemy expression for each request"""
 
-        for query_param in self.decomposed_query_params.values():
+    column: Column
+    operators: tuple[str, ...]
+    value: Any
 
-            or_group = self.get_or(query_param)
-            if or_group is not None:
-                where_expressions.append(or_group)
-                continue
+    def to_expression(self):
+        return _operator_expression(self.column, self.operators, self.value)
 
-            # If the column is not mapped to a column, then skip
-            if not query_param.is_mapped_to_column():
-                continue
 
-            if query_param.operators[0] not in ["group_by", "order_by"]:
-                where_expressions.append(
-                    query_param.get_operator_expression()
+@dataclass(frozen=True)
+class CompiledOr:
+    """Filters from or=(col1.eq.val1,col2.lt.val2)"""
+
+    filters: tuple[CompiledFilter, ...]
+
+    def to_expression(self):
+        return or_(*[compiled_filter.to_expression() for compiled_filter in self.filters])
+
+
+@dataclass(frozen=True)
+class RelationshipFilter:
+    """Filters on rows related to the listed one, given as <relationship>.<column>=<operator>.<value>
+
+    The related rows are read from the table or view of remote_key, correlated with remote_key = local_key.
+    Only the columns listed can be filtered on so each filter stays on indexed columns.
+    """
+
+    local_key: Column
+    remote_key: Column
+    columns: tuple[str, ...]
+
+    def get_column(self, column_name: str) -> Column | None:
+        if column_name not in self.columns:
+            return None
+
+        return self.remote_key.table.c[column_name]
+
+
+@dataclass(frozen=True)
+class CompiledExists:
+    """Filters on one relationship, all met by the same related row"""
+
+    relationship_filter: RelationshipFilter
+    filters: tuple[CompiledFilter, ...]
+
+    def to_expression(self):
+        return exists().where(
+            self.relationship_filter.remote_key == self.relationship_filter.local_key,
+            *[compiled_filter.to_expression() for compiled_filter in self.filters]
+        )
+
+
+def _decompose_encoded_expression(encoded_expression) -> tuple:
+    encoded_expression_split = encoded_expression.split(".")
+
+    # If group_by or order_by, then there is no value
+    if len(encoded_expression_split) == 1:
+        if encoded_expression_split[0] not in ["group_by"]:
+            raise ParserException(f"Query is invalid.")
+
+        return encoded_expression_split[:1], ""
+
+    elif len(encoded_expression_split) == 2:
+        return encoded_expression_split[:1], encoded_expression_split[1]
+
+    else:
+        if encoded_expression_split[0] == "not":
+            if encoded_expression_split[1] in VALID_OPERATORS:
+                return encoded_expression_split[0:2], ".".join(
+                    encoded_expression_split[2:]
                 )
 
-        if len(where_expressions) == 1:
-            return where_expressions[0]
+            else:
+                raise ParserException(
+                    f"Query is invalid. Use these Operators only {VALID_OPERATORS}"
+                )
 
-        else:
-            # true() is the identity for AND; it also keeps and_() valid (not
-            # deprecated) when where_expressions is empty.
-            return and_(true(), *where_expressions)
+        elif encoded_expression_split[0] in VALID_OPERATORS:
+            return encoded_expression_split[:1], ".".join(
+                encoded_expression_split[1:]
+            )
 
 
-    def get_or(self, query_param: QueryParameter):
-        """Handles the or operator for the query in format or=(col1.eq.val1,col2.lt.val2)"""
+def _compile_or(columns: dict[str, Column], query_param: QueryParameter) -> CompiledOr:
+    """Handles the or operator for the query in format or=(col1.eq.val1,col2.lt.val2)"""
 
-        if query_param.column == "or":
-            if not query_param.value.startswith("(") or not query_param.value.endswith(")"):
-                raise ParserException(f"Or operator must be in format or=(col1.eq.val1,col2.lt.val2)")
+    if not query_param.value.startswith("(") or not query_param.value.endswith(")"):
+        raise ParserException(f"Or operator must be in format or=(col1.eq.val1,col2.lt.val2)")
 
-            or_expressions = []
-            or_clauses = query_param.value[1:-1].split(",")
+    or_filters = []
+    or_clauses = query_param.value[1:-1].split(",")
 
-            for clause in or_clauses:
-                clause_split = clause.split(".")
+    for clause in or_clauses:
+        clause_split = clause.split(".")
 
-                if len(clause_split) < 2:
-                    raise ParserException(f"Or clause is invalid: {clause}")
+        if len(clause_split) < 2:
+            raise ParserException(f"Or clause is invalid: {clause}")
 
-                column_name = clause_split[0]
-                operators, value = self._decompose_encoded_expression(".".join(clause_split[1:]))
+        column_name = clause_split[0]
+        operators, value = _decompose_encoded_expression(".".join(clause_split[1:]))
 
-                col = self.columns.get(column_name, column_name)
+        col = columns.get(column_name, column_name)
 
-                if col == column_name:
-                    raise ParserException(f"Column ({column_name}) not found in table for or operator")
+        if col == column_name:
+            raise ParserException(f"Column ({column_name}) not found in table for or operator")
 
-                qp = QueryParameter(column=col, operators=operators, value=value)
-                or_expressions.append(qp.get_operator_expression())
+        or_filters.append(QueryParameter(column=col, operators=operators, value=value).compile())
 
-            return or_(*or_expressions)
+    return CompiledOr(filters=tuple(or_filters))
 
-        return None
 
+@dataclass(frozen=True)
+class CompiledQuery:
+    """The query params of a request parsed against a table's columns
 
-    @lru_cache
-    def get_group_by_column(self):
-        """Returns the group by expressions for the query"""
+    Shared by every request with the same columns and query params, see compile_query. Filters are only
+    compiled when first used so errors are raised where the parser raised them before.
+    """
+
+    columns: dict[str, Column]
+    decomposed_query_params: MultiDict[QueryParameter]
+    relationship_filters: dict[str, RelationshipFilter]
+
+    @cached_property
+    def where_filters(self) -> tuple[CompiledFilter | CompiledOr | CompiledExists, ...]:
+        where_filters = []
+        relationship_where_filters = {}
 
+        for query_param in self.decomposed_query_params.values():
+
+            if query_param.column == "or":
+                where_filters.append(_compile_or(self.columns, query_param))
+                continue
+
+            # If the column is not mapped to a column, then skip
+            if not query_param.is_mapped_to_column():
+                continue
+
+            if query_param.relationship is not None:
+                relationship_where_filters.setdefault(query_param.relationship, []).append(query_param.compile())
+                continue
+
+            if query_param.operators[0] not in ["group_by", "order_by"]:
+                where_filters.append(query_param.compile())
+
+        for relationship, filters in relationship_where_filters.items():
+            where_filters.append(CompiledExists(self.relationship_filters[relationship], tuple(filters)))
+
+        return tuple(where_filters)
+
+    @cached_property
+    def group_by_column(self) -> Column | None:
         group_by_columns = []
         for query_param in self.decomposed_query_params.values():
 
@@ -251,6 +365,143 @@ class QueryParser:
 
         return group_by_columns[0]
 
+
+def _decompose_relationship_query_param(
+    relationship_filters: dict[str, RelationshipFilter], column_name: str, operators, value
+) -> QueryParameter:
+    """Handles <relationship>.<column> filters, which must be whitelisted in the relationship's RelationshipFilter"""
+
+    relationship, related_column_name = column_name.split(".", 1)
+
+    relationship_filter = relationship_filters.get(relationship)
+    if relationship_filter is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query is invalid. Relationship ({relationship}) can not be filtered on, use one of {[*relationship_filters]}"
+        )
+
+    col = relationship_filter.get_column(related_column_name)
+    if col is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query is invalid. Column ({related_column_name}) of {relationship} can not be filtered on, use one of {[*relationship_filter.columns]}"
+        )
+
+    if operators[0] in ["group_by", "order_by"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query is invalid. {operators[0]} can not be used on {column_name}"
+        )
+
+    return QueryParameter(column=col, operators=operators, value=value, relationship=relationship)
+
+
+def _decompose_query_params(
+    columns: dict[str, Column], query_params, relationship_filters: dict[str, RelationshipFilter]
+) -> MultiDict[QueryParameter]:
+    decomposed_query_params = MultiDict()
+
+    for column_name, encoded_expression in query_params:
+
+        # Special handling for or operator and select, neither has operators
+        if column_name in ["or", "select"]:
+            decomposed_query_params.add(
+                column_name,
+                QueryParameter(column=column_name, operators=[], value=encoded_expression)
+            )
+            continue
+
+        operators, value = _decompose_encoded_expression(encoded_expression)
+        value = urllib.parse.unquote(value)
+
+        if "." in column_name:
+            decomposed_query_params.add(
+                column_name,
+                _decompose_relationship_query_param(relationship_filters, column_name, operators, value)
+            )
+            continue
+
+        col = columns.get(column_name, column_name)
+
+        if col == column_name:
+            log.warning(f"Column ({column_name}) not found in table, potential error")
+
+        decomposed_query_params.add(
+            column_name,
+            QueryParameter(column=col, operators=operators, value=value)
+        )
+
+    return decomposed_query_params
+
+
+@lru_cache(maxsize=COMPILED_QUERY_CACHE_SIZE)
+def compile_query(
+    columns: tuple[Column, ...],
+    query_params: tuple[tuple[str, str], ...],
+    relationship_filters: tuple[tuple[str, RelationshipFilter], ...] = (),
+) -> CompiledQuery:
+    """Parses the query params against the columns, parsing cost scales with distinct queries rather than requests"""
+
+    columns = {c.name: c for c in columns}
+    relationship_filters = dict(relationship_filters)
+
+    return CompiledQuery(
+        columns=columns,
+        decomposed_query_params=_decompose_query_params(columns, query_params, relationship_filters),
+        relationship_filters=relationship_filters,
+    )
+
+
+class QueryParser:
+    """Used to parse the query parameters from the request"""
+
+    VALID_OPERATORS = VALID_OPERATORS
+
+    def __init__(
+        self,
+        columns: list[Column],
+        query_params: list[dict] | None,
+        relationship_filters: dict[str, RelationshipFilter] | None = None,
+    ):
+
+        # If no query params, then set to empty list
+        if query_params is None:
+            query_params = []
+
+        self.columns = {c.name: c for c in columns}
+        self.query_params = query_params
+        self.relationship_filters = relationship_filters or {}
+
+    @cached_property
+    def compiled_query(self) -> CompiledQuery:
+        return compile_query(
+            tuple(self.columns.values()),
+            tuple(tuple(query_param) for query_param in self.query_params),
+            tuple(self.relationship_filters.items()),
+        )
+
+    @property
+    def decomposed_query_params(self) -> MultiDict[QueryParameter]:
+        return self.compiled_query.decomposed_query_params
+
+    def where_expressions(self):
+        """Returns the where expressions for the query"""
+
+        where_expressions = [where_filter.to_expression() for where_filter in self.compiled_query.where_filters]
+
+        if len(where_expressions) == 1:
+            return where_expressions[0]
+
+        else:
+            # true() is the identity for AND; it also keeps and_() valid (not
+            # deprecated) when where_expressions is empty.
+            return and_(true(), *where_expressions)
+
+    def get_group_by_column(self):
+        """Returns the group by expressions for the query"""
+
+        return self.compiled_query.group_by_column
+
     def get_select_columns(self) -> list[Column]:
         """Returns the group by expression which does a string aggregation of distinct values in the other columns"""
 
@@ -276,6 +527,19 @@ class QueryParser:
 
         order_by_columns = []
 
+        for column, direction in self.get_order_by_keys():
+            if direction == "asc":
+                order_by_columns.append(column.asc())
+            else:
+                order_by_columns.append(column.desc())
+
+        return order_by_columns
+
+    def get_order_by_keys(self) -> list[tuple[Column, str]]:
+        """Returns the (column, direction) pairs the query is ordered by"""
+
+        order_by_keys = []
+
         for query_param in self.decomposed_query_params.values():
 
             # If the column is not mapped to a column, then skip
@@ -290,72 +554,29 @@ class QueryParser:
                         detail=f"Query is invalid. Use asc or desc for order_by"
                     )
 
-                if query_param.value == "asc":
-                    order_by_columns.append(query_param.column.asc())
-                else:
-                    order_by_columns.append(query_param.column.desc())
+                order_by_keys.append((query_param.column, query_param.value))
 
-        return order_by_columns
+        return order_by_keys
 
-    @property
-    @lru_cache
-    def decomposed_query_params(self):
-        return self._decompose_query_params()
+    def get_projection_columns(self) -> list[Column] | None:
+        """Returns the columns requested in select=col1,col2 or None if the full row was requested"""
 
-    def _decompose_query_params(self) -> MultiDict[QueryParameter]:
-        decomposed_query_params = MultiDict()
-
-        for column_name, encoded_expression in self.query_params:
-
-            # Special handling for or operator
-            if column_name == "or":
-                decomposed_query_params.add(
-                    column_name,
-                    QueryParameter(column=column_name, operators=[], value=encoded_expression)
-                )
-                continue
-
-            operators, value = self._decompose_encoded_expression(encoded_expression)
-            value = urllib.parse.unquote(value)
-
-            col = self.columns.get(column_name, column_name)
-
-            if col == column_name:
-                log.warning(f"Column ({column_name}) not found in table, potential error")
-
-            decomposed_query_params.add(
-                column_name,
-                QueryParameter(column=col, operators=operators, value=value)
-            )
-
-        return decomposed_query_params
-
-    def _decompose_encoded_expression(self, encoded_expression) -> tuple:
-        encoded_expression_split = encoded_expression.split(".")
-
-        # If group_by or order_by, then there is no value
-        if len(encoded_expression_split) == 1:
-            if encoded_expression_split[0] not in ["group_by"]:
-                raise ParserException(f"Query is invalid.")
-
-            return encoded_expression_split[:1], ""
+        select_params = self.decomposed_query_params.getall("select", [])
+        if len(select_params) == 0:
+            return None
 
-        elif len(encoded_expression_split) == 2:
-            return encoded_expression_split[:1], encoded_expression_split[1]
+        projection_columns = []
+        for query_param in select_params:
+            for column_name in query_param.value.split(","):
+                column = self.columns.get(column_name.strip())
 
-        else:
-            if encoded_expression_split[0] == "not":
-                if encoded_expression_split[1] in self.VALID_OPERATORS:
-                    return encoded_expression_split[0:2], ".".join(
-                        encoded_expression_split[2:]
+                if column is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Query is invalid. Column ({column_name}) in select not found"
                     )
 
-                else:
-                    raise ParserException(
-                        f"Query is invalid. Use these Operators only {self.VALID_OPERATORS}"
-                    )
+                if column not in projection_columns:
+                    projection_columns.append(column)
 
-            elif encoded_expression_split[0] in self.VALID_OPERATORS:
-                return encoded_expression_split[:1], ".".join(
-                    encoded_expression_split[1:]
-                )
+        return projection_columns
@@ -0,0 +1,119 @@
+#
+# Server
+#
+# `python -m userapp serve` runs the app under uvicorn in SERVER_WORKERS processes, one by default, accepting
+# connections from one shared socket. uvicorn spawns its workers rather than forking them, and each creates its
+# own engines in the app's lifespan, so no connection pool is shared between processes. With N workers the
+# database sees up to N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections, which has to fit in max_connections.
+#
+# Everything else a worker keeps in memory is its own too: the /status pool and slow query views describe the
+# worker that answered. The response cache is only invalidated by its own worker's writes, so it is turned off
+# when there is more than one. /metrics is shared, the workers write their metrics to files in
+# METRICS_MULTIPROC_DIR, a temporary directory unless it is set, and any of them reports the totals.
+#
+# The uvloop event loop and httptools HTTP parser are used when installed, otherwise asyncio and h11.
+#
+# On SIGTERM each worker stops accepting connections, closes its idle keep-alive connections and waits up to
+# SERVER_GRACEFUL_SHUTDOWN_TIMEOUT seconds for the requests in flight before disposing of its engines.
+#
+
+import glob
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+APP = "userapp.main:create_app"
+
+
+class ServerSettings(BaseSettings):
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # Worker processes, size it to the container's CPU limit rather than the host's CPUs
+    SERVER_WORKERS: int = 1
+
+    # Connections the kernel queues while every worker is busy accepting
+    SERVER_BACKLOG: int = 2048
+    # Seconds an idle connection is kept open, longer than NGINX's upstream keepalive_timeout (60s) so that
+    # the proxy closes idle connections rather than reusing one the server is closing
+    SERVER_KEEPALIVE_TIMEOUT: int = 65
+    # Seconds to wait for requests in flight on SIGTERM, within Kubernetes' default grace period of 30
+    SERVER_GRACEFUL_SHUTDOWN_TIMEOUT: int = 25
+    # Connections per worker above which new requests get a 503, unlimited when unset
+    SERVER_LIMIT_CONCURRENCY: Optional[int] = None
+
+    # Addresses of the proxies trusted to set X-Forwarded-For and X-Forwarded-Proto
+    SERVER_FORWARDED_ALLOW_IPS: str = "*"
+    SERVER_LOG_LEVEL: str = "info"
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def event_loop() -> str:
+    return "uvloop" if _installed("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if _installed("httptools") else "h11"
+
+
+def uvicorn_options(settings: ServerSettings) -> dict:
+    """Keyword arguments of uvicorn.run serving the app with settings"""
+
+    return dict(
+        factory=True,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS,
+        loop=event_loop(),
+        http=http_protocol(),
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_TIMEOUT,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        log_level=settings.SERVER_LOG_LEVEL,
+    )
+
+
+def serve(settings: ServerSettings | None = None) -> None:
+    """Serves the app until SIGINT or SIGTERM"""
+    import uvicorn
+
+    options = uvicorn_options(settings or ServerSettings())
+
+    # The workers read their settings from the environment when they import the app
+    if options["workers"] > 1 and float(os.getenv("RESPONSE_CACHE_TTL", "0")) > 0:
+        logger.warning(f"Turning off the response cache, it can't be invalidated across {options['workers']} workers")
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+    temporary_metrics_dir = None
+    if options["workers"] > 1:
+        if os.getenv("METRICS_MULTIPROC_DIR"):
+            # Drop the metrics of a previous run, their workers are gone
+            os.makedirs(os.environ["METRICS_MULTIPROC_DIR"], exist_ok=True)
+            for path in glob.glob(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "*.json")):
+                os.remove(path)
+        else:
+            temporary_metrics_dir = tempfile.mkdtemp(prefix="userapp-metrics-")
+            os.environ["METRICS_MULTIPROC_DIR"] = temporary_metrics_dir
+
+    logger.info(
+        f"Serving on {options['host']}:{options['port']} with {options['workers']} workers, "
+        f"{options['loop']} and {options['http']}"
+    )
+
+    try:
+        uvicorn.run(APP, **options)
+    finally:
+        if temporary_metrics_dir is not None:
+            shutil.rmtree(temporary_metrics_dir, ignore_errors=True)